@@ -0,0 +1,236 @@
+import heapq
+import numpy as np
+from town_map import travel_time
+from pathfinding import _trace_edges
+
+def _cost_limit(optimum, max_stretch):
+    """Largest route cost allowed, with slack for rounding so the best route always passes"""
+    return optimum * max_stretch * (1 + 1e-9)
+
+def _node_bounds(graph, node_index, cost):
+    """
+    Straight-line lower bounds of the cost between every intersection and one
+    intersection, as a list so the searches index it instead of calling a heuristic
+    """
+    if cost == 'distance':
+        scale = 1
+    elif cost == 'time':
+        scale = travel_time(1, graph.max_speed)
+    else:
+        return [0.0] * graph.node_count
+    xs, ys = np.frombuffer(graph.x, dtype=np.float64), np.frombuffer(graph.y, dtype=np.float64)
+    return (np.hypot(xs - xs[node_index], ys - ys[node_index]) * scale).tolist()
+
+def _bounded_trees(graph, start_index, goal_index, costs, cost, max_stretch):
+    """
+    Grow a forward tree from the start and a backward tree to the goal over
+    edge states, both stopping at the cost limit of max_stretch times the
+    best route. Forward A* first finds the best route; then the two searches
+    take turns, the one with the smaller key going next. A state is dropped
+    when its cost so far plus a lower bound of the other half exceeds the
+    limit. The bound is the other tree's exact cost once it has settled the
+    state, and otherwise the larger of the straight-line bound and what the
+    other search's current key implies. States on a route within the limit
+    are never dropped, so their costs in both trees are exact, and forward
+    settling order still visits parents before their children.
+    :return: (forward edge -> cost in settling order, forward parents,
+              backward edge -> cost from arriving via it to the goal, backward next edges (-1 at the goal),
+              best route cost), or None if the goal is unreachable
+    """
+    offsets, sources, targets, turn_masks = graph.offsets, graph.sources, graph.targets, graph.turn_masks
+    in_offsets, in_edges = graph.in_offsets, graph.in_edges
+    to_goal = _node_bounds(graph, goal_index, cost)
+    to_start = _node_bounds(graph, start_index, cost)
+    heappush, heappop = heapq.heappush, heapq.heappop
+    inf = float('inf')
+
+    # Forward A* until the best route is known; its heap stays valid to continue from
+    forward = {}
+    parent = {}
+    forward_best = {}
+    forward_heap = []
+    mask = graph.departure_masks[start_index]
+    edge = offsets[start_index]
+    while mask:
+        if mask & 1:
+            forward_best[edge] = costs[edge]
+            parent[edge] = -1
+            forward_heap.append((costs[edge] + to_goal[targets[edge]], costs[edge], edge))
+        mask >>= 1
+        edge += 1
+    heapq.heapify(forward_heap)
+    optimum = None
+    while forward_heap:
+        _, cost_so_far, edge = heappop(forward_heap)
+        if edge in forward:
+            continue
+        forward[edge] = cost_so_far
+        current = targets[edge]
+        mask = turn_masks[edge]
+        next_edge = offsets[current]
+        while mask:
+            if mask & 1 and next_edge not in forward:
+                next_cost = cost_so_far + costs[next_edge]
+                if next_cost < forward_best.get(next_edge, inf):
+                    forward_best[next_edge] = next_cost
+                    parent[next_edge] = edge
+                    heappush(forward_heap, (next_cost + to_goal[targets[next_edge]], next_cost, next_edge))
+            mask >>= 1
+            next_edge += 1
+        if current == goal_index:
+            optimum = cost_so_far
+            break
+    if optimum is None:
+        return None
+    limit = _cost_limit(optimum, max_stretch)
+
+    # Keys are lower bounds of whole-route costs: cost so far plus the straight-line rest
+    backward = {}
+    following = {}
+    backward_best = {}
+    backward_heap = []
+    for edge in in_edges[in_offsets[goal_index]:in_offsets[goal_index + 1]]:
+        backward_best[edge] = 0
+        following[edge] = -1
+        backward_heap.append((costs[edge] + to_start[sources[edge]], 0, edge))
+    heapq.heapify(backward_heap)
+    forward_key = forward_heap[0][0] if forward_heap else inf
+    backward_key = backward_heap[0][0] if backward_heap else inf
+
+    while forward_key <= limit or backward_key <= limit:
+        if forward_key <= backward_key:
+            _, cost_so_far, edge = heappop(forward_heap)
+            forward_key = forward_heap[0][0] if forward_heap else inf
+            if edge in forward:
+                continue
+            rest = backward.get(edge)
+            if rest is None:
+                # Not settled backwards yet, so its backward key is at least backward_key
+                rest = max(to_goal[targets[edge]], backward_key - costs[edge] - to_start[sources[edge]])
+            if cost_so_far + rest > limit:
+                continue
+            forward[edge] = cost_so_far
+            current = targets[edge]
+            mask = turn_masks[edge]
+            next_edge = offsets[current]
+            while mask:
+                if mask & 1 and next_edge not in forward:
+                    next_cost = cost_so_far + costs[next_edge]
+                    if next_cost < forward_best.get(next_edge, inf):
+                        forward_best[next_edge] = next_cost
+                        parent[next_edge] = edge
+                        heappush(forward_heap, (next_cost + to_goal[targets[next_edge]], next_cost, next_edge))
+                mask >>= 1
+                next_edge += 1
+            if forward_heap:
+                forward_key = min(forward_key, forward_heap[0][0])
+        else:
+            _, cost_so_far, edge = heappop(backward_heap)
+            backward_key = backward_heap[0][0] if backward_heap else inf
+            if edge in backward:
+                continue
+            before = forward.get(edge)
+            if before is None:
+                # Not settled forwards yet, so its forward key is at least forward_key
+                before = max(costs[edge] + to_start[sources[edge]], forward_key - to_goal[targets[edge]])
+            if before + cost_so_far > limit:
+                continue
+            backward[edge] = cost_so_far
+            through = sources[edge]
+            step = cost_so_far + costs[edge]
+            bit = edge - offsets[through]
+            for previous in in_edges[in_offsets[through]:in_offsets[through + 1]]:
+                if (turn_masks[previous] >> bit & 1 and previous not in backward and
+                        step < backward_best.get(previous, inf)):
+                    backward_best[previous] = step
+                    following[previous] = edge
+                    heappush(backward_heap, (step + costs[previous] + to_start[sources[previous]], step, previous))
+            if backward_heap:
+                backward_key = min(backward_key, backward_heap[0][0])
+    return forward, parent, backward, following, optimum
+
+def find_alternatives(town_map, start, goal, k=3, max_overlap=0.5, max_stretch=1.4, cost='time', min_plateau=0.25):
+    """
+    Find up to k good, distinct routes with the via-node (plateau) method.
+
+    A forward tree from the start and a backward tree to the goal are grown
+    over edge states, so turn restrictions and one-way roads hold on both
+    halves and at the via edge where they join. Edges where the two trees
+    agree form plateaus, and every plateau yields one candidate route: the
+    forward tree path to it followed by the backward tree path from it.
+    The best route always comes first; other candidates are dropped unless
+    their plateau costs at least min_plateau times the best route, and the
+    rest are taken cheapest first if they visit no intersection twice, cost
+    at most max_stretch times the best route, and share at most max_overlap
+    of their cost with every route already chosen.
+    :param town_map: TownMap or CompiledMap object
+    :param start: Start node
+    :param goal: Goal node
+    :param k: Maximum number of routes, including the best one
+    :param max_overlap: Largest fraction of a route's cost that may be shared with another route
+    :param max_stretch: Largest allowed cost relative to the best route
+    :param cost: 'hops', 'distance' or 'time'
+    :param min_plateau: Shortest plateau an alternative needs, relative to the best route's cost
+    :return: List of paths, best first; empty if the goal is unreachable
+    """
+    if k < 1:
+        raise ValueError(f"k must be at least 1, got {k}")
+    if start == goal:
+        return [[start]]
+    graph = town_map.compile()
+    costs = graph.edge_costs(cost)
+    targets = graph.targets
+    start_index, goal_index = graph.node_index[start], graph.node_index[goal]
+
+    trees = _bounded_trees(graph, start_index, goal_index, costs, cost, max_stretch)
+    if trees is None:
+        return []
+    forward, parent, backward, following, optimum = trees
+    limit = _cost_limit(optimum, max_stretch)
+
+    # Group via edges into plateaus: an edge joins its forward parent's plateau if the
+    # backward tree takes the same step. Forward settling order visits parents first.
+    plateau = {}
+    plateau_costs = {}
+    totals = {}
+    for edge, forward_cost in forward.items():
+        if edge not in backward:
+            continue
+        total = forward_cost + backward[edge]
+        if total > limit:
+            continue
+        previous = parent[edge]
+        if previous != -1 and following.get(previous) == edge and previous in plateau:
+            via = plateau[edge] = plateau[previous]
+            plateau_costs[via] += costs[edge]
+        else:
+            plateau[edge] = edge
+            plateau_costs[edge] = costs[edge]
+            totals[edge] = total
+    # A route is only locally optimal along its plateau: one with a short plateau
+    # takes a detour right before or after it. Drop those before tracing any route.
+    # The best route is kept whatever its plateaus, since ties can split it into several.
+    shortest = min_plateau * optimum
+    best = min((total, via) for via, total in totals.items())[1]
+    candidates = sorted((total, via) for via, total in totals.items()
+                        if via == best or plateau_costs[via] >= shortest)
+
+    routes = []
+    for total, via in candidates:
+        edges = _trace_edges(parent, via)
+        edge = following[via]
+        while edge != -1:
+            edges.append(edge)
+            edge = following[edge]
+        nodes = [start_index] + [targets[edge] for edge in edges]
+        # The best route may need a loop to get around a turn restriction; alternatives may not
+        if routes and len(set(nodes)) != len(nodes):
+            continue
+        route_edges = set(edges)
+        if any(sum(costs[edge] for edge in route_edges & chosen) > max_overlap * total
+               for _, chosen in routes):
+            continue
+        routes.append((edges, route_edges))
+        if len(routes) == k:
+            break
+    return [graph.edge_path_to_nodes(start_index, edges) for edges, _ in routes]
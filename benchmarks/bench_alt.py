@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+A* with landmark (ALT) lower bounds against A* with straight-line bounds, on a city with one-way streets and turn bans.
+
+    python benchmarks/bench_alt.py [--size 100] [--landmarks 8] [--queries 100] [--cost time]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from pathfinding import astar_shortest_path_with_turns
+from landmarks import Landmarks
+from city_map import write_city_map
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=100)
+    parser.add_argument('--landmarks', type=int, default=8)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--cost', default='time', choices=['hops', 'distance', 'time'])
+    parser.add_argument('--one-way-ratio', type=float, default=0.4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        map_file = os.path.join(tmp, 'city.json')
+        write_city_map(map_file, args.size, one_way_ratio=args.one_way_ratio, restriction_density=0.2)
+        town = TownMap(map_file, streaming=True)
+    town.compile()
+
+    began = time.perf_counter()
+    landmarks = Landmarks.build(town, args.cost, 'farthest', args.landmarks)
+    build = time.perf_counter() - began
+    size_mib = (landmarks.forward.nbytes + landmarks.backward.nbytes) / (1 << 20)
+
+    rng = random.Random(42)
+    ids = town.get_all_intersections()
+    pairs = [rng.sample(ids, 2) for _ in range(args.queries)]
+    print(f"[MAP] {args.size}x{args.size} city, {len(ids)} intersections, cost={args.cost}")
+    print(f"   {len(landmarks.nodes)} landmarks in {build:.2f} s, {size_mib:.1f} MiB of float32 distances")
+    for name, options in (('A* (straight line)', {}), ('A* (landmarks)', {'landmarks': landmarks})):
+        times, expanded = [], []
+        for start, goal in pairs:
+            stats = {}
+            began = time.perf_counter()
+            astar_shortest_path_with_turns(town, start, goal, args.cost, stats, **options)
+            times.append((time.perf_counter() - began) * 1000)
+            expanded.append(stats['expanded'])
+        print(f"   {name:20s} median={statistics.median(times):8.2f} ms  "
+              f"mean={statistics.mean(times):8.2f} ms  expanded={statistics.mean(expanded):9.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Latency of find_alternatives (k routes) relative to a single A* query.
+
+    python benchmarks/bench_alternatives.py [--grid-size 60] [--queries 100] [--k 3] [--cost time]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from pathfinding import astar_shortest_path_with_turns
+from alternatives import find_alternatives
+from grid_map import write_grid_map
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grid-size', type=int, default=60)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--cost', default='time')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        map_file = os.path.join(tmp, 'grid.json')
+        write_grid_map(map_file, args.grid_size, arterial_every=5)
+        town = TownMap(map_file)
+    town.compile()
+
+    rng = random.Random(42)
+    ids = town.get_all_intersections()
+    queries = [tuple(rng.sample(ids, 2)) for _ in range(args.queries)]
+
+    single, alternative, found = [], [], []
+    for start, goal in queries:
+        began = time.perf_counter()
+        astar_shortest_path_with_turns(town, start, goal, args.cost)
+        single.append((time.perf_counter() - began) * 1000)
+        began = time.perf_counter()
+        routes = find_alternatives(town, start, goal, args.k, cost=args.cost)
+        alternative.append((time.perf_counter() - began) * 1000)
+        found.append(len(routes))
+
+    print(f"[MAP] {args.grid_size}x{args.grid_size} grid, {len(queries)} {args.cost} queries, k={args.k}")
+    print(f"   A* single route     median={statistics.median(single):7.2f} ms")
+    print(f"   find_alternatives   median={statistics.median(alternative):7.2f} ms  "
+          f"({statistics.median(alternative) / statistics.median(single):.1f}x), "
+          f"{statistics.mean(found):.2f} routes on average")
+
+if __name__ == "__main__":
+    main()
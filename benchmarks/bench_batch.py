@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for NavigationSystem.route_batch at 1/2/4/8 workers.
+
+    python benchmarks/bench_batch.py [--grid-size 60] [--queries 2000] [--cost time]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from navigation import NavigationSystem
+from grid_map import write_grid_map
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grid-size', type=int, default=60)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--cost', default='time')
+    parser.add_argument('--workers', default='1,2,4,8')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        grid_file = os.path.join(tmp, 'grid.json')
+        write_grid_map(grid_file, args.grid_size, arterial_every=5)
+        # No route cache, so every worker count does the same work
+        nav = NavigationSystem(grid_file, cache_size=0)
+    nav.town_map.compile()
+
+    rng = random.Random(42)
+    ids = nav.town_map.get_all_intersections()
+    pairs = [tuple(rng.sample(ids, 2)) for _ in range(args.queries)]
+    print(f"[MAP] {args.grid_size}x{args.grid_size} grid, {len(pairs)} {args.cost} queries, "
+          f"{os.cpu_count()} CPUs")
+
+    baseline = None
+    for workers in (int(count) for count in args.workers.split(',')):
+        began = time.perf_counter()
+        routed = sum(1 for _ in nav.route_batch(pairs, args.cost, workers=workers))
+        elapsed = time.perf_counter() - began
+        throughput = routed / elapsed
+        baseline = baseline or throughput
+        print(f"   workers={workers}  {throughput:9.1f} routes/s  speedup={throughput / baseline:4.2f}x")
+
+if __name__ == "__main__":
+    main()
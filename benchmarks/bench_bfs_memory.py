@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for turn-aware BFS path reconstruction.
+
+Compares peak allocation of the previous approach, where every queue entry
+carries its own copy of the path, against the parent-pointer search in
+pathfinding.bfs_shortest_path_with_turns. Runs on large_map_data.json and on
+a synthetic grid (500x500 by default).
+
+    python benchmarks/bench_bfs_memory.py [--grid-size 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from pathfinding import bfs_shortest_path_with_turns
+from grid_map import write_grid_map
+
+def bfs_with_path_copies(town_map, start, goal):
+    """The previous BFS: each queue entry holds path + [neighbor]"""
+    if start == goal:
+        return [start]
+
+    graph = town_map.compile()
+    offsets, targets, turn_masks = graph.offsets, graph.targets, graph.turn_masks
+    start_index = graph.node_index[start]
+    goal_index = graph.node_index[goal]
+
+    queue = deque()
+    visited = set()
+    mask = graph.departure_masks[start_index]
+    for edge in range(offsets[start_index], offsets[start_index + 1]):
+        allowed = mask & 1
+        mask >>= 1
+        if not allowed:
+            continue
+        if targets[edge] == goal_index:
+            return graph.edge_path_to_nodes(start_index, [edge])
+        visited.add(edge)
+        queue.append((edge, [edge]))
+
+    while queue:
+        edge, path = queue.popleft()
+        current = targets[edge]
+        mask = turn_masks[edge]
+        for next_edge in range(offsets[current], offsets[current + 1]):
+            allowed = mask & 1
+            mask >>= 1
+            if not allowed:
+                continue
+            if targets[next_edge] == goal_index:
+                return graph.edge_path_to_nodes(start_index, path + [next_edge])
+            if next_edge not in visited:
+                visited.add(next_edge)
+                queue.append((next_edge, path + [next_edge]))
+    return None
+
+def measure(search, town_map, start, goal):
+    """
+    Run one search and return (path length, peak bytes, seconds). The time
+    comes from a separate untraced run, since tracemalloc slows down every
+    allocation and would mostly measure its own overhead.
+    """
+    began = time.perf_counter()
+    path = search(town_map, start, goal)
+    elapsed = time.perf_counter() - began
+    tracemalloc.start()
+    search(town_map, start, goal)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(path) if path else 0, peak, elapsed
+
+def compare(name, town_map, start, goal):
+    town_map.compile()
+    print(f"\n[{name}] {start} -> {goal}")
+    results = {}
+    for label, search in (('path copies', bfs_with_path_copies),
+                          ('parent pointers', bfs_shortest_path_with_turns)):
+        length, peak, elapsed = measure(search, town_map, start, goal)
+        results[label] = peak
+        print(f"   {label:16s} path={length:5d}  peak={peak / 1024 / 1024:9.2f} MiB  time={elapsed:7.3f} s")
+    ratio = results['path copies'] / max(results['parent pointers'], 1)
+    print(f"   peak allocation reduced {ratio:.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grid-size', type=int, default=500)
+    args = parser.parse_args()
+
+    compare('large_map_data.json', TownMap(os.path.join(ROOT, 'large_map_data.json')), '0', '99')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        grid_file = os.path.join(tmp, 'grid.json')
+        write_grid_map(grid_file, args.grid_size)
+        grid = TownMap(grid_file)
+    last = str(args.grid_size * args.grid_size - 1)
+    compare(f"{args.grid_size}x{args.grid_size} grid", grid, '0', last)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Cost of the turn-aware SCC analysis, and of answering unreachable pairs with it instead of a search.
+
+    python benchmarks/bench_connectivity.py [--grid-size 100] [--closed 0.15] [--queries 200]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from pathfinding import find_path
+from connectivity import Connectivity
+from grid_map import write_grid_map
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grid-size', type=int, default=100)
+    parser.add_argument('--closed', type=float, default=0.15, help='Fraction of roads to close')
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        map_file = os.path.join(tmp, 'grid.json')
+        write_grid_map(map_file, args.grid_size, arterial_every=5)
+        town = TownMap(map_file)
+    rng = random.Random(42)
+    roads = town.get_all_roads()
+    town.update_traffic(closed=[f"{a}-{b}" for a, b in rng.sample(roads, int(len(roads) * args.closed))])
+    town.compile()
+
+    began = time.perf_counter()
+    connectivity = Connectivity(town)
+    build = (time.perf_counter() - began) * 1000
+    report = connectivity.report()
+
+    # Pairs with no route, found by search
+    ids = town.get_all_intersections()
+    cut_off = [node for area in report['isolated'] for node in area]
+    searched, answered, detected = [], [], 0
+    for _ in range(args.queries):
+        start, goal = rng.choice(ids), rng.choice(cut_off) if cut_off else rng.choice(ids)
+        began = time.perf_counter()
+        path = find_path(town, start, goal, 'time')
+        searched.append((time.perf_counter() - began) * 1000)
+        began = time.perf_counter()
+        unreachable = connectivity.unreachable(start, goal)
+        answered.append((time.perf_counter() - began) * 1000)
+        detected += unreachable
+        assert not (unreachable and path is not None)
+
+    print(f"[MAP] {args.grid_size}x{args.grid_size} grid, {args.closed:.0%} of roads closed")
+    print(f"   SCC analysis: {build:.0f} ms for {report['states']} states, {report['components']} components, "
+          f"{len(report['isolated'])} isolated areas")
+    print(f"   Queries to cut-off intersections: {detected}/{len(searched)} ruled out in O(1)")
+    print(f"   A* search         median={statistics.median(searched):8.3f} ms")
+    print(f"   unreachable()     median={statistics.median(answered):8.3f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Query latency benchmark: Contraction Hierarchy vs. the BFS baseline.
+
+Builds a hierarchy for a synthetic grid with faster arterial roads, round-trips it through disk and
+times the same random queries with bfs_shortest_path_with_turns, A* and
+the hierarchy.
+
+    python benchmarks/bench_contraction.py [--grid-size 30] [--arterial-every 5] [--queries 200]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from pathfinding import bfs_shortest_path_with_turns, astar_shortest_path_with_turns
+from contraction import ContractionHierarchy
+from grid_map import write_grid_map
+
+def time_queries(label, route, queries):
+    latencies = []
+    for start, goal in queries:
+        began = time.perf_counter()
+        route(start, goal)
+        latencies.append((time.perf_counter() - began) * 1000)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"   {label:22s} median={statistics.median(latencies):8.3f} ms  p99={p99:8.3f} ms")
+    return statistics.median(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grid-size', type=int, default=30)
+    parser.add_argument('--arterial-every', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--cost', default='time')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        grid_file = os.path.join(tmp, 'grid.json')
+        write_grid_map(grid_file, args.grid_size, args.arterial_every)
+        town = TownMap(grid_file)
+        graph = town.compile()
+        print(f"[MAP] {args.grid_size}x{args.grid_size} grid: {graph.node_count} intersections, "
+              f"{graph.edge_count} directed roads")
+
+        began = time.perf_counter()
+        hierarchy = ContractionHierarchy.build(town, args.cost)
+        print(f"[BUILD] {time.perf_counter() - began:.1f} s, {len(hierarchy.middles)} shortcuts")
+
+        ch_file = os.path.join(tmp, 'grid.ch.npz')
+        hierarchy.save(ch_file)
+        began = time.perf_counter()
+        hierarchy = ContractionHierarchy.load(ch_file, town)
+        print(f"[LOAD] {(time.perf_counter() - began) * 1000:.1f} ms, {os.path.getsize(ch_file) / 1024:.0f} KiB on disk")
+
+    rng = random.Random(42)
+    ids = town.get_all_intersections()
+    queries = [tuple(rng.sample(ids, 2)) for _ in range(args.queries)]
+
+    print(f"\n[QUERIES] {len(queries)} random pairs")
+    baseline = time_queries('BFS (hops)', lambda s, g: bfs_shortest_path_with_turns(town, s, g), queries)
+    astar_median = time_queries(f'A* ({args.cost})',
+                                lambda s, g: astar_shortest_path_with_turns(town, s, g, args.cost), queries)
+    ch_median = time_queries(f'CH ({args.cost})', hierarchy.query, queries)
+    print(f"\n   CH median is {baseline / ch_median:.1f}x faster than BFS, {astar_median / ch_median:.1f}x faster than A*")
+
+if __name__ == "__main__":
+    main()
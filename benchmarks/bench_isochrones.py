@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Latency of one multi-budget isochrone search against routing to every intersection.
+
+    python benchmarks/bench_isochrones.py [--grid-size 60] [--sources 10] [--budgets 2 5 10]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from pathfinding import astar_shortest_path_with_turns
+from isochrones import Isochrones
+from grid_map import write_grid_map
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grid-size', type=int, default=60)
+    parser.add_argument('--sources', type=int, default=10)
+    parser.add_argument('--budgets', type=float, nargs='+', default=[2, 5, 10])
+    parser.add_argument('--baseline-goals', type=int, default=200,
+                        help='Goals routed per source for the per-intersection baseline, scaled up to the whole map')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        map_file = os.path.join(tmp, 'grid.json')
+        write_grid_map(map_file, args.grid_size, arterial_every=5)
+        town = TownMap(map_file)
+    town.compile()
+
+    rng = random.Random(42)
+    ids = town.get_all_intersections()
+    sources = rng.sample(ids, args.sources)
+
+    bounded, per_node, reached = [], [], []
+    for start in sources:
+        began = time.perf_counter()
+        isochrones = Isochrones(town, start, args.budgets)
+        bounded.append((time.perf_counter() - began) * 1000)
+        reached.append(len(isochrones.reachable()))
+
+        goals = rng.sample(ids, min(args.baseline_goals, len(ids)))
+        began = time.perf_counter()
+        for goal in goals:
+            astar_shortest_path_with_turns(town, start, goal, 'time')
+        per_node.append((time.perf_counter() - began) * 1000 * len(ids) / len(goals))
+
+    print(f"[MAP] {args.grid_size}x{args.grid_size} grid, {len(sources)} sources, budgets {args.budgets} minutes")
+    print(f"   A* to every intersection (est.)  median={statistics.median(per_node):9.1f} ms")
+    print(f"   Isochrones, one pass             median={statistics.median(bounded):9.1f} ms  "
+          f"({statistics.median(per_node) / statistics.median(bounded):.0f}x faster), "
+          f"{statistics.mean(reached):.0f} intersections reached on average")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Peak memory and load time of TownMap loading: json.load vs. the streaming loader.
+
+Each loader runs in a fresh process so tracemalloc only sees its own allocations.
+
+    python benchmarks/bench_map_loading.py [--grid-size 300] [--map-file city.json]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from grid_map import write_grid_map
+
+def measure(map_file, streaming):
+    """Load a map in this process and print 'seconds peak_bytes intersections roads'"""
+    import time
+    import tracemalloc
+    from town_map import TownMap
+
+    # Time without tracemalloc, which slows allocation-heavy code down severalfold
+    began = time.perf_counter()
+    town = TownMap(map_file, streaming=streaming)
+    elapsed = time.perf_counter() - began
+    del town
+
+    tracemalloc.start()
+    town = TownMap(map_file, streaming=streaming)
+    _, peak = tracemalloc.get_traced_memory()
+    print(elapsed, peak, len(town.intersections), len(town.roads))
+
+def run(map_file, streaming):
+    output = subprocess.run(
+        [sys.executable, __file__, '--measure', map_file] + (['--streaming'] if streaming else []),
+        check=True, capture_output=True, text=True).stdout.split()
+    return float(output[0]), int(output[1]), int(output[2]), int(output[3])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grid-size', type=int, default=300)
+    parser.add_argument('--map-file', help='Benchmark an existing map instead of a synthetic grid')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--streaming', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.streaming)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        map_file = args.map_file
+        if map_file is None:
+            map_file = os.path.join(tmp, 'grid.json')
+            write_grid_map(map_file, args.grid_size, arterial_every=5)
+        print(f"[MAP] {map_file}: {os.path.getsize(map_file) / 2**20:.1f} MiB on disk")
+
+        results = {}
+        for label, streaming in (('json.load', False), ('streaming', True)):
+            elapsed, peak, intersections, roads = run(map_file, streaming)
+            results[label] = peak
+            print(f"   {label:10s} {elapsed:7.2f} s  peak={peak / 2**20:7.1f} MiB  "
+                  f"({intersections} intersections, {roads} roads)")
+    print(f"\n   Streaming peak is {results['json.load'] / results['streaming']:.2f}x lower")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Multi-level overlay against Contraction Hierarchies under changing speeds: preprocessing, re-customization and query latency.
+
+The partition is built once. Each round changes the speed limits of some
+roads and closes a few, then re-customizes only the overlay cells those
+roads touch; a Contraction Hierarchy would have to be rebuilt instead.
+--with-ch times that rebuild too; it is off by default because it takes
+far longer than the rest of the run on larger cities.
+
+    python benchmarks/bench_overlay.py [--size 100] [--rounds 5] [--changes 20] [--queries 100] [--with-ch]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from pathfinding import astar_shortest_path_with_turns
+from contraction import ContractionHierarchy
+from overlay import Partition, Overlay
+from city_map import write_city_map
+
+def time_queries(label, route, queries):
+    latencies = []
+    for start, goal in queries:
+        began = time.perf_counter()
+        route(start, goal)
+        latencies.append((time.perf_counter() - began) * 1000)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"   {label:22s} median={statistics.median(latencies):8.3f} ms  p99={p99:8.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=5, help='Traffic updates')
+    parser.add_argument('--changes', type=int, default=20, help='Speed changes per update (plus a few closures)')
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--cell-sizes', type=int, nargs='+', default=None)
+    parser.add_argument('--with-ch', action='store_true', help='Also time building a Contraction Hierarchy')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        map_file = os.path.join(tmp, 'city.json')
+        write_city_map(map_file, args.size)
+        town = TownMap(map_file, streaming=True)
+    graph = town.compile()
+    print(f"[MAP] {args.size}x{args.size} city: {graph.node_count} intersections, {graph.edge_count} directed roads")
+
+    began = time.perf_counter()
+    partition = Partition.build(town, args.cell_sizes)
+    print(f"[PARTITION] {(time.perf_counter() - began) * 1000:.0f} ms, cells per level {partition.cell_counts}, "
+          f"boundary roads per level {[sum(map(len, entries)) for entries in partition.entries]}")
+    began = time.perf_counter()
+    overlay = Overlay(partition, 'time')
+    print(f"[CUSTOMIZE] {time.perf_counter() - began:.2f} s for every cell")
+    if args.with_ch:
+        began = time.perf_counter()
+        ContractionHierarchy.build(town, 'time')
+        print(f"[CH BUILD] {time.perf_counter() - began:.2f} s (needed again after every speed change)")
+
+    rng = random.Random(42)
+    roads = ["%s-%s" % road[:2] for road in town.get_all_roads()]
+    ids = town.get_all_intersections()
+    timings, cells = [], []
+    for _ in range(args.rounds):
+        speed_limits = {road: rng.choice((10, 20, 30, 50, 80)) for road in rng.sample(roads, args.changes)}
+        changes = town.update_traffic(speed_limits, closed=rng.sample(roads, max(1, args.changes // 10)))
+        began = time.perf_counter()
+        cells.append(overlay.customize(changes))
+        timings.append((time.perf_counter() - began) * 1000)
+    print(f"[UPDATE] {args.changes} speed changes per update: re-customized {statistics.mean(cells):.0f} cells "
+          f"in median {statistics.median(timings):.1f} ms")
+
+    queries = [tuple(rng.sample(ids, 2)) for _ in range(args.queries)]
+    print(f"\n[QUERIES] {len(queries)} random pairs on the updated map")
+    time_queries('A* (time)', lambda s, g: astar_shortest_path_with_turns(town, s, g, 'time'), queries)
+    time_queries('Overlay (time)', overlay.query, queries)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Bulk route analytics: per-path TownMap loops vs. the vectorized path_metrics.
+
+    python benchmarks/bench_path_metrics.py [--grid-size 100] [--trips 100000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from pathfinding import bfs_shortest_path_with_turns
+from path_metrics import path_metrics
+from grid_map import write_grid_map
+
+def loop_metrics(town, path):
+    """What the demo and visualizer did per path before path_metrics"""
+    road_types = {}
+    traffic_lights = 0
+    for i in range(len(path) - 1):
+        road_type_name = town.get_road_type(path[i], path[i+1])['type']
+        road_types[road_type_name] = road_types.get(road_type_name, 0) + 1
+        if town.has_traffic_light(path[i+1]):
+            traffic_lights += 1
+    return town.get_path_distance(path), town.get_path_time(path), road_types, traffic_lights
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grid-size', type=int, default=100)
+    parser.add_argument('--trips', type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        map_file = os.path.join(tmp, 'grid.json')
+        write_grid_map(map_file, args.grid_size, arterial_every=5)
+        town = TownMap(map_file)
+
+    # Historical trips: a pool of distinct routes, repeated
+    rng = random.Random(42)
+    ids = town.get_all_intersections()
+    routes = [bfs_shortest_path_with_turns(town, *rng.sample(ids, 2)) for _ in range(200)]
+    trips = [routes[i % len(routes)] for i in range(args.trips)]
+    print(f"[TRIPS] {len(trips)} trips, {sum(len(trip) for trip in trips)} intersections visited")
+
+    sample = trips[:max(1, len(trips) // 20)]
+    began = time.perf_counter()
+    for trip in sample:
+        loop_metrics(town, trip)
+    loop = (time.perf_counter() - began) / len(sample) * len(trips)
+    began = time.perf_counter()
+    path_metrics(town, trips)
+    vectorized = time.perf_counter() - began
+    print(f"   per-path loops {loop:7.2f} s (extrapolated)   path_metrics {vectorized:6.2f} s   ({loop / vectorized:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Load generator for routing_server.py: requests/sec and latency with many concurrent clients.
+
+By default it starts the server in a subprocess on a Unix socket for a
+synthetic city and drives it with pipelined JSON-lines clients. Requests
+come from a small set of popular starts, so the server can coalesce them.
+
+    python benchmarks/bench_server.py [--size 32] [--connections 8] [--in-flight 16] [--requests 4000]
+                                      [--sources 20] [--cost time] [--tcp HOST:PORT | --unix PATH]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from city_map import write_city_map
+
+async def open_connection(args):
+    if args.tcp:
+        host, port = args.tcp.rsplit(':', 1)
+        return await asyncio.open_connection(host, int(port))
+    return await asyncio.open_unix_connection(args.unix)
+
+async def wait_for_server(args, process, timeout=120):
+    """Retry connecting until the server listens"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await open_connection(args)
+            writer.close()
+            return
+        except OSError:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError("Server exited during start-up")
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+async def client(args, requests, latencies):
+    """Send requests keeping up to args.in_flight outstanding, and time each answer"""
+    reader, writer = await open_connection(args)
+    sent_at = {}
+    window = asyncio.Semaphore(args.in_flight)
+    errors = 0
+
+    async def read_responses():
+        nonlocal errors
+        for _ in range(len(requests)):
+            response = json.loads(await reader.readline())
+            latencies.append((time.perf_counter() - sent_at.pop(response['id'])) * 1000)
+            errors += 'error' in response
+            window.release()
+
+    reading = asyncio.create_task(read_responses())
+    for request in requests:
+        await window.acquire()
+        sent_at[request['id']] = time.perf_counter()
+        writer.write((json.dumps(request) + '\n').encode())
+        await writer.drain()
+    await reading
+    writer.close()
+    return errors
+
+async def metrics(args):
+    reader, writer = await open_connection(args)
+    writer.write(b'{"op": "metrics"}\n')
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    writer.close()
+    return response['metrics']
+
+async def run(args, ids):
+    rng = random.Random(42)
+    sources = rng.sample(ids, min(args.sources, len(ids)))
+    requests = [{'id': index, 'start': rng.choice(sources), 'goal': rng.choice(ids), 'cost': args.cost}
+                for index in range(args.requests)]
+    shares = [requests[index::args.connections] for index in range(args.connections)]
+
+    latencies = []
+    began = time.perf_counter()
+    errors = sum(await asyncio.gather(*(client(args, share, latencies) for share in shares)))
+    elapsed = time.perf_counter() - began
+    server = await metrics(args)
+
+    latencies.sort()
+    print(f"[LOAD] {args.requests} requests over {args.connections} connections, "
+          f"{args.in_flight} in flight each, {len(sources)} distinct starts")
+    print(f"   Throughput:  {args.requests / elapsed:8.0f} requests/s ({elapsed:.2f} s)")
+    print(f"   Latency:     p50={statistics.median(latencies):.2f} ms  "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1]:.2f} ms  errors={errors}")
+    print(f"   Server:      {server['searches']} searches, {server['coalesced']} requests coalesced, "
+          f"batch p50={server['batch_size']['p50']}, cache hit rate={server['route_cache']['hit_rate']:.0%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=32, help='Synthetic city side when starting a server')
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--in-flight', type=int, default=16, help='Outstanding requests per connection')
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--sources', type=int, default=20, help='Distinct start intersections')
+    parser.add_argument('--cost', default='time', choices=['hops', 'distance', 'time'])
+    parser.add_argument('--tcp', default=None, help='Load a running server at HOST:PORT')
+    parser.add_argument('--unix', default=None, help='Load a running server on this Unix socket')
+    parser.add_argument('--map-file', default=None, help='Map of the running server (for picking intersections)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        process = None
+        map_file = args.map_file
+        if not (args.tcp or args.unix):
+            map_file = os.path.join(tmp, 'city.json')
+            write_city_map(map_file, args.size)
+            args.unix = os.path.join(tmp, 'navigator.sock')
+            process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'routing_server.py'), map_file,
+                                        '--unix', args.unix], stdout=subprocess.DEVNULL)
+        elif map_file is None:
+            parser.error('--map-file is needed with --tcp/--unix')
+        ids = TownMap(map_file).get_all_intersections()
+        try:
+            asyncio.run(wait_for_server(args, process))
+            asyncio.run(run(args, ids))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+if __name__ == "__main__":
+    main()
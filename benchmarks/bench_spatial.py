@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Nearest-intersection and road snapping latency: linear scan vs. the grid index.
+
+    python benchmarks/bench_spatial.py [--grid-size 200] [--queries 2000] [--snap-points 100000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from grid_map import write_grid_map
+
+def linear_nearest(town, x, y):
+    """The scan the visualizers used before the index"""
+    min_dist = float('inf')
+    nearest_point = None
+    for intersection_id in town.get_all_intersections():
+        pos = town.get_position(intersection_id)
+        dist = (pos[0] - x) ** 2 + (pos[1] - y) ** 2
+        if dist < min_dist:
+            min_dist = dist
+            nearest_point = intersection_id
+    return nearest_point
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grid-size', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--snap-points', type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        map_file = os.path.join(tmp, 'grid.json')
+        write_grid_map(map_file, args.grid_size)
+        town = TownMap(map_file)
+
+    began = time.perf_counter()
+    index = town.spatial_index()
+    print(f"[INDEX] {len(index.node_ids)} intersections, {len(index.roads)} roads, "
+          f"{index.cols}x{index.rows} cells, built in {(time.perf_counter() - began) * 1000:.0f} ms")
+
+    rng = np.random.default_rng(42)
+    points = rng.uniform(0, args.grid_size - 1, (max(args.queries, args.snap_points), 2))
+    queries = points[:args.queries]
+
+    scan_queries = queries[:max(1, args.queries // 20)]
+    began = time.perf_counter()
+    for x, y in scan_queries:
+        linear_nearest(town, x, y)
+    scan = (time.perf_counter() - began) / len(scan_queries) * 1e6
+    began = time.perf_counter()
+    for x, y in queries:
+        index.nearest(x, y)
+    indexed = (time.perf_counter() - began) / len(queries) * 1e6
+    print(f"   nearest     linear scan {scan:9.1f} us/query   index {indexed:7.1f} us/query   ({scan / indexed:.0f}x)")
+
+    began = time.perf_counter()
+    for x, y in queries:
+        index.snap(x, y)
+    single = (time.perf_counter() - began) / len(queries) * 1e6
+    began = time.perf_counter()
+    index.snap_many(points[:args.snap_points])
+    bulk = (time.perf_counter() - began) / args.snap_points * 1e6
+    print(f"   snap        one at a time {single:7.1f} us/point   snap_many {bulk:5.1f} us/point")
+
+if __name__ == "__main__":
+    main()
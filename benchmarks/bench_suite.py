@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark of the routing engines on synthetic cities, reported as JSON.
+
+Every engine answers the same fixed, seeded query set on cities of about
+1k, 10k, 100k and 1M intersections (benchmarks/city_map.py). For each
+size and engine the report has p50/p99 latency, states expanded and the
+peak memory allocated by a query, so runs can be diffed to catch regressions.
+
+    python benchmarks/bench_suite.py [--sizes 1k 10k 100k 1m] [--engines bfs astar ...]
+                                     [--queries N] [--map-dir DIR] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from pathfinding import (bfs_shortest_path_with_turns, bidirectional_bfs_with_turns,
+                         dijkstra_shortest_path_with_turns, astar_shortest_path_with_turns,
+                         bidirectional_dijkstra_with_turns, time_dependent_shortest_path)
+from contraction import ContractionHierarchy
+from landmarks import Landmarks
+from overlay import Partition, Overlay
+from city_map import write_city_map
+
+# Label -> grid side; the cities also get a few percent extra cul-de-sacs
+SIZES = {'1k': 32, '10k': 100, '100k': 316, '1m': 1000}
+
+# Default number of queries per size, so the whole suite finishes in reasonable time
+DEFAULT_QUERIES = {'1k': 200, '10k': 100, '100k': 30, '1m': 10}
+
+# Engine name -> function(town_map, start, goal, stats)
+ENGINES = {
+    'bfs': lambda town, start, goal, stats: bfs_shortest_path_with_turns(town, start, goal, stats),
+    'bidirectional_bfs': lambda town, start, goal, stats: bidirectional_bfs_with_turns(town, start, goal, stats),
+    'dijkstra': lambda town, start, goal, stats: dijkstra_shortest_path_with_turns(town, start, goal, 'time', stats),
+    'astar': lambda town, start, goal, stats: astar_shortest_path_with_turns(town, start, goal, 'time', stats),
+    'bidirectional_dijkstra': lambda town, start, goal, stats:
+        bidirectional_dijkstra_with_turns(town, start, goal, 'time', stats),
+    'time_dependent': lambda town, start, goal, stats:
+        time_dependent_shortest_path(town, start, goal, '08:00', stats),
+}
+
+# Engines that need preprocessing (not run by default: building is slow on big maps)
+PREPROCESSED = {
+    'contraction_hierarchy': lambda town: ContractionHierarchy.build(town, 'time'),
+    'alt': lambda town: Landmarks.build(town, 'time', 'farthest'),
+    'overlay': lambda town: Overlay(Partition.build(town), 'time'),
+}
+
+DEFAULT_ENGINES = ['bfs', 'bidirectional_bfs', 'dijkstra', 'astar', 'bidirectional_dijkstra']
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def max_rss_mib():
+    """Peak resident memory of this process so far (Linux reports KiB, macOS bytes)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024
+
+def run_engine(query, town, queries, memory_queries):
+    """Time a query function over a query set, then measure allocation peaks on a few of them untimed"""
+    latencies, expanded, found = [], [], 0
+    for start, goal in queries:
+        stats = {}
+        began = time.perf_counter()
+        path = query(town, start, goal, stats)
+        latencies.append((time.perf_counter() - began) * 1000)
+        expanded.append(stats.get('expanded', 0))
+        found += path is not None
+
+    peaks = []
+    tracemalloc.start()
+    for start, goal in queries[:memory_queries]:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        query(town, start, goal, {})
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return {
+        'queries': len(queries),
+        'found': found,
+        'p50_ms': round(percentile(latencies, 0.5), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p50_expanded': percentile(expanded, 0.5),
+        'p99_expanded': percentile(expanded, 0.99),
+        'peak_query_mib': round(max(peaks) / (1 << 20), 3) if peaks else None,
+    }
+
+def bench_size(label, args, engines, log):
+    size = SIZES[label]
+    map_file = os.path.join(args.map_dir, f'city_{size}_seed{args.seed}.json')
+    if not os.path.exists(map_file):
+        log(f"[{label}] generating {map_file}")
+        write_city_map(map_file, size, args.seed)
+
+    log(f"[{label}] loading")
+    began = time.perf_counter()
+    town = TownMap(map_file, streaming=True)
+    load_seconds = time.perf_counter() - began
+    began = time.perf_counter()
+    graph = town.compile()
+    compile_seconds = time.perf_counter() - began
+
+    rng = random.Random(args.seed)
+    ids = town.get_all_intersections()
+    count = args.queries or DEFAULT_QUERIES[label]
+    queries = [tuple(rng.sample(ids, 2)) for _ in range(count)]
+
+    result = {
+        'size': label,
+        'intersections': len(ids),
+        'roads': len(town.get_all_roads()),
+        'states': len(graph.targets),
+        'load_s': round(load_seconds, 3),
+        'compile_s': round(compile_seconds, 3),
+        'engines': {},
+    }
+    for name in engines:
+        log(f"[{label}] {name}: {count} queries")
+        if name in PREPROCESSED:
+            began = time.perf_counter()
+            prepared = PREPROCESSED[name](town)
+            preprocess_seconds = time.perf_counter() - began
+            stats = run_engine(lambda town, start, goal, stats: prepared.query(start, goal, stats),
+                               town, queries, args.memory_queries)
+            stats['preprocess_s'] = round(preprocess_seconds, 3)
+        else:
+            stats = run_engine(ENGINES[name], town, queries, args.memory_queries)
+        result['engines'][name] = stats
+    result['max_rss_mib'] = round(max_rss_mib(), 1)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES))
+    parser.add_argument('--engines', nargs='+', default=DEFAULT_ENGINES, choices=list(ENGINES) + list(PREPROCESSED))
+    parser.add_argument('--queries', type=int, default=None,
+                        help='Queries per size (default: ' + ', '.join(f'{k}={v}' for k, v in DEFAULT_QUERIES.items()) + ')')
+    parser.add_argument('--memory-queries', type=int, default=3, help='Queries re-run under tracemalloc for peak memory')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--map-dir', default=None, help='Keep generated cities here and reuse them (default: temporary)')
+    parser.add_argument('--output', default=None, help='Write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.map_dir is None:
+            args.map_dir = tmp
+        os.makedirs(args.map_dir, exist_ok=True)
+        results = [bench_size(label, args, args.engines, log) for label in args.sizes]
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
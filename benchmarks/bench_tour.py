@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Multi-stop tour planning on a synthetic city: cost matrix, ordering and stitching times, and tour cost against the given order.
+
+With --hierarchy the cost matrix is a many-to-many search over a Contraction
+Hierarchy (built once, timed separately) instead of one search per point.
+
+    python benchmarks/bench_tour.py [--size 32] [--stops 50] [--tours 5] [--cost time] [--round-trip] [--hierarchy]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from town_map import TownMap
+from tour import cost_matrix, order_stops, stitch_tour
+from contraction import ContractionHierarchy
+from city_map import write_city_map
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=32)
+    parser.add_argument('--stops', type=int, default=50)
+    parser.add_argument('--tours', type=int, default=5)
+    parser.add_argument('--cost', default='time', choices=['hops', 'distance', 'time'])
+    parser.add_argument('--time-limit', type=float, default=0.5, help='Seconds for the ordering local search')
+    parser.add_argument('--round-trip', action='store_true', help='Finish back at the start')
+    parser.add_argument('--hierarchy', action='store_true', help='Build the cost matrix over a Contraction Hierarchy')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        map_file = os.path.join(tmp, 'city.json')
+        write_city_map(map_file, args.size, one_way_ratio=0.2, restriction_density=0.2)
+        town = TownMap(map_file, streaming=True)
+    town.compile()
+    report = town.connectivity().report()
+    cut_off = set(report['unreachable']) | set(report['stranded'])
+
+    rng = random.Random(42)
+    ids = [node for node in town.get_all_intersections() if node not in cut_off]
+    print(f"[MAP] {args.size}x{args.size} city, {len(ids)} well-connected intersections, "
+          f"{args.stops} stops, cost={args.cost}")
+    hierarchy = None
+    if args.hierarchy:
+        began = time.perf_counter()
+        hierarchy = ContractionHierarchy.build(town, args.cost)
+        print(f"   hierarchy built in {time.perf_counter() - began:.1f} s")
+    timings = {'matrix': [], 'order': [], 'stitch': []}
+    savings = []
+    for _ in range(args.tours):
+        points = rng.sample(ids, args.stops + 1)
+        if args.round_trip:
+            points.append(points[0])
+        began = time.perf_counter()
+        matrix = cost_matrix(town, points, args.cost, hierarchy)
+        timings['matrix'].append(time.perf_counter() - began)
+        began = time.perf_counter()
+        order = order_stops(matrix, args.round_trip, args.time_limit)
+        timings['order'].append(time.perf_counter() - began)
+        began = time.perf_counter()
+        _, planned = stitch_tour(town, [points[index] for index in order], args.cost)
+        timings['stitch'].append(time.perf_counter() - began)
+        _, given = stitch_tour(town, points, args.cost)
+        savings.append(1 - planned / given)
+    for name, values in timings.items():
+        print(f"   {name:8s} median={statistics.median(values) * 1000:9.1f} ms  max={max(values) * 1000:9.1f} ms")
+    print(f"   Planned tours cost {statistics.mean(savings):.0%} less than visiting the stops in the given order")
+
+if __name__ == "__main__":
+    main()
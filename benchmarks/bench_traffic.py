@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Update + query latency under a stream of live traffic updates.
+
+Simulates --rate updates per second delivered in batches every --interval
+seconds: each batch changes speed limits and opens/closes a few roads through
+NavigationSystem.update_traffic, which patches the compiled map and queues the
+changes for the cached shortest-path trees, and is followed by route queries
+(route_tree repairs each tree once for all batches since it was last used). The same stream
+is replayed with the trees rebuilt from scratch for comparison.
+
+    python benchmarks/bench_traffic.py [--grid-size 60] [--rate 1000] [--seconds 5] [--trees 8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from navigation import NavigationSystem
+from grid_map import write_grid_map
+
+def make_stream(nav, args):
+    """Deterministic list of (speed_limits, closed, reopened, queries) batches"""
+    rng = random.Random(42)
+    roads = [f"{a}-{b}" for a, b in nav.town_map.get_all_roads()]
+    ids = nav.town_map.get_all_intersections()
+    sources = rng.sample(ids, args.trees)
+    per_batch = max(1, round(args.rate * args.interval))
+    closed_now = []
+    batches = []
+    for _ in range(int(args.seconds / args.interval)):
+        closures = per_batch // 50
+        speed_limits = {road: rng.choice((10, 20, 30, 40, 50)) for road in rng.sample(roads, per_batch - 2 * closures)}
+        closed = rng.sample(roads, closures)
+        reopened = [closed_now.pop(rng.randrange(len(closed_now))) for _ in range(min(closures, len(closed_now)))]
+        closed_now.extend(closed)
+        queries = [(rng.choice(sources), rng.choice(ids)) for _ in range(args.queries)]
+        batches.append((speed_limits, closed, reopened, queries))
+    return sources, batches
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def replay(map_file, args, repair):
+    nav = NavigationSystem(map_file, cache_size=0, tree_cache_size=args.trees)
+    sources, batches = make_stream(nav, args)
+    for source in sources:
+        nav.route_tree(source, args.cost)
+
+    update_ms, query_ms = [], []
+    for speed_limits, closed, reopened, queries in batches:
+        began = time.perf_counter()
+        nav.update_traffic(speed_limits, closed, reopened)
+        if not repair:
+            nav.trees.clear()
+        for source in sources:
+            nav.route_tree(source, args.cost)
+        update_ms.append((time.perf_counter() - began) * 1000)
+        for start, goal in queries:
+            began = time.perf_counter()
+            nav.find_route(start, goal, args.cost)
+            query_ms.append((time.perf_counter() - began) * 1000)
+
+    busy = (sum(update_ms) + sum(query_ms)) / 1000
+    label = 'repair' if repair else 'rebuild'
+    print(f"   {label:8s} update+trees p50={percentile(update_ms, 0.5):8.2f} ms  p99={percentile(update_ms, 0.99):8.2f} ms  "
+          f"query p50={percentile(query_ms, 0.5):6.3f} ms  p99={percentile(query_ms, 0.99):6.3f} ms  "
+          f"load={busy / args.seconds:5.1%} of real time")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--grid-size', type=int, default=60)
+    parser.add_argument('--rate', type=int, default=1000, help='Updates per second')
+    parser.add_argument('--interval', type=float, default=0.1, help='Seconds between batches')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--trees', type=int, default=8, help='Cached shortest-path trees')
+    parser.add_argument('--queries', type=int, default=20, help='Queries per batch')
+    parser.add_argument('--cost', default='time')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        map_file = os.path.join(tmp, 'grid.json')
+        write_grid_map(map_file, args.grid_size, arterial_every=5)
+        print(f"[MAP] {args.grid_size}x{args.grid_size} grid, {args.rate} updates/s in batches every "
+              f"{args.interval * 1000:.0f} ms, {args.trees} cached {args.cost} trees")
+        replay(map_file, args, repair=True)
+        replay(map_file, args, repair=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic cities in the TownMap JSON schema.
+
+The city is a size x size street grid. Every street (a whole row or column)
+gets one road type from the mix, so arterials run across the city as in a
+real town. Some inner streets are one-way. Cul-de-sacs hang off corners into
+the blocks, and random turn restrictions go on busy intersections. The same
+arguments always produce the same file. Intersections are written one at a
+time, so a 1000 x 1000 city does not have to fit in memory as JSON objects.
+
+    python benchmarks/city_map.py city.json --size 100 [--seed 0] [--one-way-ratio 0.2]
+"""
+
+import argparse
+import json
+import random
+
+# (type, speed limit, lanes) of each road class
+ROAD_CLASSES = {
+    'highway': (80, 3),
+    'main_road': (50, 2),
+    'secondary_road': (40, 1),
+    'local_road': (30, 1),
+}
+
+# Fraction of streets of each road type
+DEFAULT_ROAD_MIX = {'highway': 0.03, 'main_road': 0.12, 'secondary_road': 0.2, 'local_road': 0.65}
+
+# Direction names of the grid (y grows downwards, as in complex_town_map.json)
+STEPS = (('left', -1, 0), ('right', 1, 0), ('up', 0, -1), ('down', 0, 1))
+
+def _turn_side(from_xy, through_xy, to_xy):
+    """'left', 'right', 'straight' or 'u' for a turn, with y growing downwards"""
+    dx1, dy1 = through_xy[0] - from_xy[0], through_xy[1] - from_xy[1]
+    dx2, dy2 = to_xy[0] - through_xy[0], to_xy[1] - through_xy[1]
+    cross = dx1 * dy2 - dy1 * dx2
+    if cross < 0:
+        return 'left'
+    if cross > 0:
+        return 'right'
+    return 'straight' if dx1 * dx2 + dy1 * dy2 > 0 else 'u'
+
+def write_city_map(path, size, seed=0, one_way_ratio=0.2, restriction_density=0.1, dead_end_ratio=0.05,
+                   road_mix=None, spacing=1.0):
+    """
+    Write a synthetic city in the TownMap JSON schema
+    :param path: Output file
+    :param size: Streets per side; the grid has size * size intersections plus cul-de-sacs
+    :param seed: Random seed; the same arguments always give the same map
+    :param one_way_ratio: Fraction of inner streets that are one-way, in alternating directions
+    :param restriction_density: Fraction of grid intersections with a random turn restriction
+    :param dead_end_ratio: Fraction of blocks with a cul-de-sac off their top-left corner
+    :param road_mix: Dict of road type -> fraction of streets (default DEFAULT_ROAD_MIX)
+    :param spacing: Distance between neighbouring intersections in map units (1 unit = 100 m)
+    :return: Dict with the number of intersections, roads and restrictions written
+    """
+    rng = random.Random(seed)
+    road_mix = road_mix or DEFAULT_ROAD_MIX
+    types, weights = list(road_mix), list(road_mix.values())
+    unknown = [name for name in types if name not in ROAD_CLASSES]
+    if unknown:
+        raise ValueError(f"Unknown road types: {unknown}")
+
+    # Street attributes: rows run left-right, columns up-down. Direction +1 or -1 for
+    # one-way streets, 0 for two-way. Border streets stay two-way so nothing is a trap.
+    row_types = rng.choices(types, weights, k=size)
+    col_types = rng.choices(types, weights, k=size)
+    row_ways, col_ways = [0] * size, [0] * size
+    for ways, street_types in ((row_ways, row_types), (col_ways, col_types)):
+        direction = 1
+        for line in range(1, size - 1):
+            if street_types[line] != 'highway' and rng.random() < one_way_ratio:
+                ways[line] = direction
+                direction = -direction
+
+    blocks = (size - 1) * (size - 1)
+    stubs = sorted(rng.sample(range(blocks), int(blocks * dead_end_ratio))) if blocks else []
+    stub_of = {(block % (size - 1)) + (block // (size - 1)) * size: index for index, block in enumerate(stubs)}
+    stub_start = size * size
+
+    def road(x, y, dx, dy):
+        """(type, one-way direction as +1/-1 along the step or 0) of the road from (x, y) one step on"""
+        if dy == 0:
+            return row_types[y], row_ways[y] * dx
+        return col_types[x], col_ways[x] * dy
+
+    road_types = {}
+    restrictions = {'no_left_turn': [], 'no_right_turn': [], 'no_u_turn': [], 'only_straight': [], 'blocked_roads': []}
+    roads = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"intersections": {')
+        first = True
+        for y in range(size):
+            for x in range(size):
+                node = y * size + x
+                turns = {}
+                approaches = []
+                for name, dx, dy in STEPS:
+                    nx, ny = x + dx, y + dy
+                    if not (0 <= nx < size and 0 <= ny < size):
+                        continue
+                    road_type, way = road(x, y, dx, dy)
+                    neighbor = str(ny * size + nx)
+                    if way >= 0:
+                        turns[name] = neighbor
+                    if way <= 0:
+                        approaches.append(neighbor)
+                    # Record each road once, from its left or upper end
+                    if dx + dy > 0:
+                        roads += 1
+                        if road_type != 'local_road' or way:
+                            speed_limit, lanes = ROAD_CLASSES[road_type]
+                            key = f"{node}-{neighbor}" if way >= 0 else f"{neighbor}-{node}"
+                            road_types[key] = {'type': road_type, 'speed_limit': speed_limit,
+                                               'lanes': lanes, 'one_way': way != 0}
+                if node in stub_of:
+                    turns['down_right'] = str(stub_start + stub_of[node])
+                    roads += 1
+
+                # Lights where two major streets cross, and at some junctions of a major and a local one
+                major = (row_types[y] != 'local_road') + (col_types[x] != 'local_road')
+                data = {'x': x * spacing, 'y': y * spacing, 'type': 'intersection', 'turns': turns,
+                        'traffic_light': major == 2 or (major == 1 and rng.random() < 0.3)}
+
+                # A turn restriction on one approach of an intersection with a real choice
+                if len(turns) >= 3 and approaches and rng.random() < restriction_density:
+                    from_id = rng.choice(approaches)
+                    through_id = str(node)
+                    from_xy = (int(from_id) % size, int(from_id) // size)
+                    options = {}
+                    for name, dx, dy in STEPS:
+                        if name in turns:
+                            options[_turn_side(from_xy, (x, y), (x + dx, y + dy))] = turns[name]
+                    kind = rng.choice(['no_left_turn', 'no_right_turn', 'no_u_turn', 'only_straight'])
+                    side = {'no_left_turn': 'left', 'no_right_turn': 'right',
+                            'no_u_turn': 'u', 'only_straight': 'straight'}[kind]
+                    if side in options:
+                        restrictions[kind].append(f"{from_id}-{through_id}-{options[side]}")
+
+                f.write(('' if first else ', ') + json.dumps(str(node)) + ': ' + json.dumps(data))
+                first = False
+
+        for index, block in enumerate(stubs):
+            bx, by = block % (size - 1), block // (size - 1)
+            data = {'x': (bx + 0.5) * spacing, 'y': (by + 0.5) * spacing, 'type': 'dead_end',
+                    'turns': {'up_left': str(by * size + bx)}, 'traffic_light': False}
+            f.write(', ' + json.dumps(str(stub_start + index)) + ': ' + json.dumps(data))
+
+        f.write('}, "road_types": ' + json.dumps(road_types))
+        f.write(', "traffic_restrictions": ' + json.dumps(restrictions))
+        # Metadata goes last, once the counts are known
+        metadata = {'name': f'Synthetic City {size}x{size}',
+                    'description': 'Generated by benchmarks/city_map.py',
+                    'intersections_count': size * size + len(stubs), 'roads_count': roads,
+                    'generator': {'size': size, 'seed': seed, 'one_way_ratio': one_way_ratio,
+                                  'restriction_density': restriction_density, 'dead_end_ratio': dead_end_ratio,
+                                  'road_mix': road_mix, 'spacing': spacing}}
+        f.write(', "landmarks": {}, "metadata": ' + json.dumps(metadata) + '}')
+
+    return {'intersections': size * size + len(stubs), 'roads': roads,
+            'restrictions': sum(len(turns) for turns in restrictions.values())}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('output')
+    parser.add_argument('--size', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--one-way-ratio', type=float, default=0.2)
+    parser.add_argument('--restriction-density', type=float, default=0.1)
+    parser.add_argument('--dead-end-ratio', type=float, default=0.05)
+    parser.add_argument('--spacing', type=float, default=1.0)
+    args = parser.parse_args()
+    counts = write_city_map(args.output, args.size, args.seed, args.one_way_ratio,
+                            args.restriction_density, args.dead_end_ratio, spacing=args.spacing)
+    print(f"Wrote {args.output}: {counts['intersections']} intersections, {counts['roads']} roads, "
+          f"{counts['restrictions']} turn restrictions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Synthetic grid maps in the TownMap JSON schema for benchmarks"""
+
+import json
+
+def write_grid_map(path, size, arterial_every=0):
+    """
+    Write a size x size two-way grid in the TownMap JSON schema
+    :param arterial_every: If set, every n-th row and column is a 50 km/h main road
+    """
+    intersections = {}
+    road_types = {}
+    for y in range(size):
+        for x in range(size):
+            node = y * size + x
+            turns = {}
+            if x > 0:
+                turns['left'] = str(node - 1)
+            if x < size - 1:
+                turns['right'] = str(node + 1)
+                if arterial_every and y % arterial_every == 0:
+                    road_types[f"{node}-{node + 1}"] = {'type': 'main_road', 'speed_limit': 50,
+                                                        'lanes': 2, 'one_way': False}
+            if y > 0:
+                turns['up'] = str(node - size)
+            if y < size - 1:
+                turns['down'] = str(node + size)
+                if arterial_every and x % arterial_every == 0:
+                    road_types[f"{node}-{node + size}"] = {'type': 'main_road', 'speed_limit': 50,
+                                                           'lanes': 2, 'one_way': False}
+            intersections[str(node)] = {'x': x, 'y': y, 'turns': turns}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'intersections': intersections, 'road_types': road_types}, f)
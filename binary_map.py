@@ -0,0 +1,225 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from compiled_map import CompiledMap
+from traffic_profiles import SpeedProfiles
+
+# File layout (little-endian, every section 8-byte aligned):
+#
+#     MAGIC | u64 header length | JSON header | sections... | ID string blob
+#
+# The JSON header holds the node/edge counts, max speed, metadata, speed
+# profiles and the byte offset of every section relative to the end of the
+# header. Intersection IDs are stored UTF-8 encoded back to back in the blob,
+# with id_offsets delimiting them and id_order listing node indices sorted by
+# ID for binary search.
+
+MAGIC = b'NAVMAP02'
+
+# Fixed-width sections of a binary map, named after the CompiledMap arrays: (name, typecode)
+SECTIONS = (
+    ('x', 'd'),
+    ('y', 'd'),
+    ('offsets', 'q'),
+    ('sources', 'q'),
+    ('targets', 'q'),
+    ('lengths', 'd'),
+    ('speeds', 'd'),
+    ('times', 'd'),
+    ('unit', 'd'),
+    ('one_way', 'b'),
+    ('road_class', 'b'),
+    ('signals', 'b'),
+    ('in_offsets', 'q'),
+    ('in_edges', 'q'),
+    ('departure_masks', 'Q'),
+    ('turn_masks', 'Q'),
+    ('id_offsets', 'q'),
+    ('id_order', 'q'),
+)
+
+def _align(position):
+    return (position + 7) & ~7
+
+def export_binary(town_map, path):
+    """
+    Write a map in the binary format
+    :param town_map: TownMap, CompiledMap, or path to a map JSON file
+    :param path: Output file
+    """
+    metadata = {}
+    if isinstance(town_map, str):
+        from town_map import TownMap
+        town_map = TownMap(town_map)
+    if hasattr(town_map, 'metadata'):
+        metadata = town_map.metadata
+    graph = town_map.compile()
+
+    encoded_ids = [str(node_id).encode('utf-8') for node_id in graph.node_ids]
+    id_offsets = [0]
+    for encoded in encoded_ids:
+        id_offsets.append(id_offsets[-1] + len(encoded))
+    id_order = sorted(range(len(encoded_ids)), key=encoded_ids.__getitem__)
+
+    arrays = {name: getattr(graph, name) for name, _ in SECTIONS if hasattr(graph, name)}
+    arrays['id_offsets'] = array('q', id_offsets)
+    arrays['id_order'] = array('q', id_order)
+
+    layout = {}
+    position = 0
+    for name, typecode in SECTIONS:
+        data = arrays[name]
+        layout[name] = [position, len(data)]
+        position = _align(position + len(data) * data.itemsize)
+    layout['id_blob'] = [position, id_offsets[-1]]
+
+    header = {
+        'node_count': graph.node_count,
+        'edge_count': graph.edge_count,
+        'max_speed': graph.max_speed,
+        'metadata': metadata,
+        'speed_profiles': graph.profiles.points,
+        'signal_wait': graph.profiles.signal_wait,
+        'sections': layout,
+    }
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\0' * (data_start - f.tell()))
+        for name, typecode in SECTIONS:
+            data = arrays[name]
+            if not isinstance(data, array) or data.typecode != typecode:
+                data = array(typecode, data)
+            if sys.byteorder != 'little':
+                data = array(typecode, data)
+                data.byteswap()
+            f.write(data.tobytes())
+            f.write(b'\0' * (data_start + _align(f.tell() - data_start) - f.tell()))
+        f.write(b''.join(encoded_ids))
+
+class _NodeIds:
+    """Sequence view of the ID string table: node index -> intersection ID"""
+
+    def __init__(self, blob, id_offsets):
+        self._blob = blob
+        self._offsets = id_offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return str(self._blob[self._offsets[index]:self._offsets[index + 1]], 'utf-8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+class _NodeIndex:
+    """Mapping view of the ID string table: intersection ID -> node index, by binary search"""
+
+    def __init__(self, blob, id_offsets, id_order):
+        self._blob = blob
+        self._offsets = id_offsets
+        self._order = id_order
+
+    def __len__(self):
+        return len(self._order)
+
+    def _find(self, node_id):
+        key = str(node_id).encode('utf-8')
+        low, high = 0, len(self._order)
+        while low < high:
+            middle = (low + high) // 2
+            index = self._order[middle]
+            if bytes(self._blob[self._offsets[index]:self._offsets[index + 1]]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._order):
+            index = self._order[low]
+            if bytes(self._blob[self._offsets[index]:self._offsets[index + 1]]) == key:
+                return index
+        return -1
+
+    def __getitem__(self, node_id):
+        index = self._find(node_id)
+        if index == -1:
+            raise KeyError(node_id)
+        return index
+
+    def __contains__(self, node_id):
+        return self._find(node_id) != -1
+
+    def get(self, node_id, default=None):
+        index = self._find(node_id)
+        return default if index == -1 else index
+
+class MappedMap(CompiledMap):
+    """
+    CompiledMap whose arrays are views into a memory-mapped binary map file.
+    Opening only maps the file, so processes that open the same file share its
+    pages. Pickling reopens the file instead of copying the arrays. The mapping
+    is released when the map is garbage collected.
+    """
+
+    def __reduce__(self):
+        return load_binary, (self.path,)
+
+
+def load_binary(path):
+    """
+    Memory-map a binary map written by export_binary
+    :param path: Binary map file
+    :return: MappedMap, usable anywhere a CompiledMap is
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(MAGIC)] != MAGIC:
+        mapped.close()
+        raise ValueError(f"{path} is not a binary map file")
+    header_length, = struct.unpack_from('<Q', mapped, len(MAGIC))
+    header = json.loads(mapped[len(MAGIC) + 8:len(MAGIC) + 8 + header_length])
+    data_start = _align(len(MAGIC) + 8 + header_length)
+    if sys.byteorder != 'little':
+        mapped.close()
+        raise ValueError("Binary maps can only be memory-mapped on little-endian machines")
+
+    view = memoryview(mapped)
+    fields = {}
+    for name, typecode in SECTIONS:
+        offset, length = header['sections'][name]
+        start = data_start + offset
+        size = struct.calcsize(typecode)
+        fields[name] = view[start:start + length * size].cast(typecode)
+    blob_offset, blob_length = header['sections']['id_blob']
+    blob = view[data_start + blob_offset:data_start + blob_offset + blob_length]
+
+    return MappedMap.from_arrays(
+        path=path,
+        version=0,
+        metadata=header['metadata'],
+        max_speed=header['max_speed'],
+        profiles=SpeedProfiles(header['speed_profiles'], header['signal_wait']),
+        node_ids=_NodeIds(blob, fields['id_offsets']),
+        node_index=_NodeIndex(blob, fields['id_offsets'], fields.pop('id_order')),
+        **{name: data for name, data in fields.items() if name != 'id_offsets'},
+    )
+
+# Example usage
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python binary_map.py <map.json> <map.navmap>")
+        sys.exit(1)
+    export_binary(sys.argv[1], sys.argv[2])
+    graph = load_binary(sys.argv[2])
+    print(f"Wrote {sys.argv[2]}: {graph.node_count} intersections, {graph.edge_count} directed roads")
@@ -0,0 +1,238 @@
+import hashlib
+from array import array
+from town_map import travel_time
+
+class TrafficChanges:
+    """
+    What a CompiledMap.update_roads call changed, with the values before it:
+    edge -> old travel time, node -> old departure mask, edge -> old turn mask
+    """
+
+    def __init__(self):
+        self.times = {}
+        self.departure_masks = {}
+        self.turn_masks = {}
+
+    def __bool__(self):
+        return bool(self.times or self.departure_masks or self.turn_masks)
+
+    def affects(self, cost):
+        """Whether route costs or turns under a cost mode ('hops', 'distance' or 'time') changed"""
+        return bool(self.departure_masks or self.turn_masks or (cost == 'time' and self.times))
+
+    def merge(self, later):
+        """
+        Fold a later batch into this one, keeping the values from before both,
+        so several batches can be repaired at once
+        :return: self
+        """
+        for edge, old in later.times.items():
+            self.times.setdefault(edge, old)
+        for node, old in later.departure_masks.items():
+            self.departure_masks.setdefault(node, old)
+        for edge, old in later.turn_masks.items():
+            self.turn_masks.setdefault(edge, old)
+        return self
+
+class CompiledMap:
+    """
+    Integer-indexed snapshot of a TownMap for the search hot path.
+
+    Intersections are interned to integers 0..N-1 (node_ids / node_index) and
+    roads are stored as directed edges in CSR form: the out-edges of node v are
+    offsets[v]..offsets[v+1]-1, in the same order as TownMap.get_neighbors(v).
+    A search state is an edge id e, meaning "arrived at targets[e] via e", which
+    is the integer form of the (node, previous node) pairs used by the searches.
+    in_offsets / in_edges are the reverse view used by backward searches: the
+    edges entering v, so a backward step from e considers in_edges of sources[e].
+    Bit k of turn_masks[e] says whether edge offsets[targets[e]] + k may follow e,
+    and bit k of departure_masks[v] whether a route starting at v may use edge
+    offsets[v] + k. Both come from TownMap.is_turn_allowed / is_road_blocked, so
+    the restriction semantics live in TownMap alone.
+
+    The snapshot is read-only except for live traffic: update_roads patches
+    speeds, times and masks in place, so everything holding it routes on the
+    new weights immediately.
+    """
+
+    MAX_DEGREE = 64
+
+    def __init__(self, town_map):
+        self.version = town_map.version
+        self.node_ids = town_map.get_all_intersections()
+        self.node_index = {node_id: index for index, node_id in enumerate(self.node_ids)}
+        node_count = len(self.node_ids)
+
+        self.x = array('d', bytes(8 * node_count))
+        self.y = array('d', bytes(8 * node_count))
+        self.offsets = array('q', [0])
+        self.sources = array('q')
+        self.targets = array('q')
+        self.lengths = array('d')
+        self.speeds = array('d')
+        self.one_way = array('b')
+        # Time-of-day speed profiles: a class index per edge and a traffic light flag per node
+        self.profiles = town_map.profiles
+        self.road_class = array('b')
+        self.signals = array('b', (1 if town_map.has_traffic_light(node_id) else 0 for node_id in self.node_ids))
+
+        # Build CSR adjacency with per-edge attributes
+        for index, node_id in enumerate(self.node_ids):
+            self.x[index], self.y[index] = town_map.get_position(node_id)
+            neighbors = town_map.get_neighbors(node_id)
+            if len(neighbors) > self.MAX_DEGREE:
+                raise ValueError(f"Intersection {node_id} has more than {self.MAX_DEGREE} neighbors")
+            for neighbor in neighbors:
+                road_type = town_map.get_road_type(node_id, neighbor)
+                self.sources.append(index)
+                self.targets.append(self.node_index[neighbor])
+                self.lengths.append(town_map.get_road_distance(node_id, neighbor))
+                self.speeds.append(road_type['speed_limit'])
+                self.one_way.append(1 if road_type.get('one_way', False) else 0)
+                self.road_class.append(self.profiles.class_of(road_type.get('type', 'local_road')))
+            self.offsets.append(len(self.targets))
+
+        # Reverse adjacency: the edges entering node v are in_edges[in_offsets[v]:in_offsets[v+1]]
+        in_degree = array('q', bytes(8 * (node_count + 1)))
+        for target in self.targets:
+            in_degree[target + 1] += 1
+        for index in range(node_count):
+            in_degree[index + 1] += in_degree[index]
+        self.in_offsets = array('q', in_degree)
+        self.in_edges = array('q', bytes(8 * len(self.targets)))
+        for edge, target in enumerate(self.targets):
+            self.in_edges[in_degree[target]] = edge
+            in_degree[target] += 1
+
+        self.times = array('d', (travel_time(length, speed) for length, speed in zip(self.lengths, self.speeds)))
+        self.unit = array('d', [1.0]) * len(self.targets)
+        self.max_speed = max(self.speeds) if self.speeds else 30
+
+        # Precompute which out-edges a route may start on and which may follow each in-edge
+        self.departure_masks = array('Q', bytes(8 * node_count))
+        for index in range(node_count):
+            self.departure_masks[index] = self._departure_mask(town_map, index)
+        self.turn_masks = array('Q', bytes(8 * len(self.targets)))
+        for edge in range(len(self.targets)):
+            self.turn_masks[edge] = self._turn_mask(town_map, edge)
+
+    def _departure_mask(self, town_map, index):
+        node_id = self.node_ids[index]
+        mask = 0
+        for k, edge in enumerate(range(self.offsets[index], self.offsets[index + 1])):
+            if not town_map.is_road_blocked(node_id, self.node_ids[self.targets[edge]]):
+                mask |= 1 << k
+        return mask
+
+    def _turn_mask(self, town_map, edge):
+        from_id = self.node_ids[self.sources[edge]]
+        through = self.targets[edge]
+        through_id = self.node_ids[through]
+        mask = 0
+        for k, next_edge in enumerate(range(self.offsets[through], self.offsets[through + 1])):
+            if town_map.is_turn_allowed(from_id, through_id, self.node_ids[self.targets[next_edge]]):
+                mask |= 1 << k
+        return mask
+
+    def update_roads(self, town_map, roads):
+        """
+        Patch speeds, travel times and turn masks in place after live traffic
+        changes to some roads, instead of recompiling the whole map
+        :param town_map: The TownMap this map was compiled from, already updated
+        :param roads: Iterable of (from_intersection, to_intersection) that changed
+        :return: TrafficChanges describing the previous costs and masks
+        """
+        changes = TrafficChanges()
+        nodes = set()
+        for from_id, to_id in roads:
+            from_index, to_index = self.node_index[from_id], self.node_index[to_id]
+            nodes.update((from_index, to_index))
+            # Each direction takes its own road type, as in __init__
+            for edge, a, b in ((self.find_edge(from_index, to_index), from_id, to_id),
+                               (self.find_edge(to_index, from_index), to_id, from_id)):
+                if edge == -1:
+                    continue
+                speed = town_map.get_road_type(a, b)['speed_limit']
+                if self.speeds[edge] != speed:
+                    changes.times.setdefault(edge, self.times[edge])
+                    self.speeds[edge] = speed
+                    self.times[edge] = travel_time(self.lengths[edge], speed)
+                    # Keep the A* time heuristic admissible
+                    self.max_speed = max(self.max_speed, speed)
+
+        # A closed road changes what may start at either end, follow into it, or follow from it
+        for index in nodes:
+            mask = self._departure_mask(town_map, index)
+            if mask != self.departure_masks[index]:
+                changes.departure_masks[index] = self.departure_masks[index]
+                self.departure_masks[index] = mask
+            for edge in self.in_edges[self.in_offsets[index]:self.in_offsets[index + 1]]:
+                mask = self._turn_mask(town_map, edge)
+                if mask != self.turn_masks[edge]:
+                    changes.turn_masks[edge] = self.turn_masks[edge]
+                    self.turn_masks[edge] = mask
+
+        self.version = town_map.version
+        return changes
+
+    @classmethod
+    def from_arrays(cls, **fields):
+        """Build a compiled map directly from its arrays (e.g. views into a binary map file)"""
+        graph = cls.__new__(cls)
+        graph.__dict__.update(fields)
+        return graph
+
+    def compile(self):
+        """A compiled map is already compiled; lets searches accept either form"""
+        return self
+
+    @property
+    def node_count(self):
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    def is_turn_allowed(self, edge, next_edge):
+        """Check in O(1) if next_edge may follow edge"""
+        return bool(self.turn_masks[edge] >> (next_edge - self.offsets[self.targets[edge]]) & 1)
+
+    def edge_costs(self, cost):
+        """Get the per-edge cost array for a cost mode ('hops', 'distance' or 'time')"""
+        if cost == 'hops':
+            return self.unit
+        if cost == 'distance':
+            return self.lengths
+        if cost == 'time':
+            return self.times
+        raise ValueError(f"Unknown cost mode: {cost}")
+
+    def fingerprint(self, cost=None):
+        """
+        Hash of what preprocessed data built from this map depends on, so saved
+        files can tell whether they still match it
+        :param cost: Cost mode whose metric to include: its edge costs and the
+                     turn and departure masks. None hashes only the road graph
+                     (intersection IDs, positions and roads).
+        :return: Hex digest
+        """
+        digest = hashlib.sha256()
+        digest.update('\0'.join(self.node_ids[index] for index in range(self.node_count)).encode())
+        arrays = [self.x, self.y, self.offsets, self.targets]
+        if cost is not None:
+            arrays += [self.edge_costs(cost), self.turn_masks, self.departure_masks]
+        for values in arrays:
+            digest.update(memoryview(values).cast('B'))
+        return digest.hexdigest()
+
+    def find_edge(self, from_index, to_index):
+        """Get the edge id from one node to another, or -1 if there is no such road"""
+        for edge in range(self.offsets[from_index], self.offsets[from_index + 1]):
+            if self.targets[edge] == to_index:
+                return edge
+        return -1
+
+    def edge_path_to_nodes(self, start, edges):
+        """Convert a start node and a sequence of edge ids to a list of intersection IDs"""
+        return [self.node_ids[start]] + [self.node_ids[self.targets[edge]] for edge in edges]
@@ -0,0 +1,269 @@
+from array import array
+from collections import deque
+
+def _low_bit(mask):
+    """Position of the lowest set bit of a non-zero mask"""
+    return (mask & -mask).bit_length() - 1
+
+class Connectivity:
+    """
+    Strongly connected components of the turn-expanded graph.
+
+    States are directed road segments (edges of the compiled map) and a state
+    leads to another if the turn between them is allowed, so one-way roads,
+    closures and turn bans all shape the components. Tarjan's algorithm runs
+    iteratively in linear time, and components are numbered in topological
+    order: a route can only move to components with the same or a higher
+    number. Each component also records the highest component reachable from
+    it and the lowest one it can be reached from, which gives every
+    intersection a range of components a route from it can end in, and a
+    range a route to it can start in. Comparing those ranges rules out most
+    unreachable pairs in O(1).
+    """
+
+    def __init__(self, town_map):
+        """
+        :param town_map: TownMap or CompiledMap object
+        """
+        self.graph = graph = town_map.compile()
+        self.version = graph.version
+        offsets, targets, turn_masks = graph.offsets, graph.targets, graph.turn_masks
+        node_count = graph.node_count
+        state_count = len(targets)
+
+        # Iterative Tarjan: each frame is (state, successors left as a turn mask, edge of the next bit)
+        order = array('q', [-1]) * state_count
+        low = array('q', [0]) * state_count
+        component = array('q', [-1]) * state_count
+        stack = []
+        counter = 0
+        found = 0
+        for root in range(state_count):
+            if order[root] != -1:
+                continue
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            frames = [(root, turn_masks[root], offsets[targets[root]])]
+            while frames:
+                edge, mask, next_edge = frames[-1]
+                if mask:
+                    skip = _low_bit(mask)
+                    next_edge += skip
+                    frames[-1] = (edge, mask >> skip + 1, next_edge + 1)
+                    if order[next_edge] == -1:
+                        order[next_edge] = low[next_edge] = counter
+                        counter += 1
+                        stack.append(next_edge)
+                        frames.append((next_edge, turn_masks[next_edge], offsets[targets[next_edge]]))
+                    elif component[next_edge] == -1 and order[next_edge] < low[edge]:
+                        # Still on the stack, so part of the current component
+                        low[edge] = order[next_edge]
+                    continue
+                frames.pop()
+                if low[edge] == order[edge]:
+                    while True:
+                        member = stack.pop()
+                        component[member] = found
+                        if member == edge:
+                            break
+                    found += 1
+                if frames:
+                    parent = frames[-1][0]
+                    if low[edge] < low[parent]:
+                        low[parent] = low[edge]
+
+        # Tarjan finishes components sinks first; reverse that for topological numbering
+        last = found - 1
+        for edge in range(state_count):
+            component[edge] = last - component[edge]
+        self.component = component
+        self.component_count = found
+
+        # Highest component reachable from each component, filled in reverse topological order
+        members = [[] for _ in range(found)]
+        for edge in range(state_count):
+            members[component[edge]].append(edge)
+        reach = array('q', range(found))
+        for index in range(found - 1, -1, -1):
+            best = index
+            for edge in members[index]:
+                mask = turn_masks[edge]
+                next_edge = offsets[targets[edge]]
+                while mask:
+                    skip = _low_bit(mask)
+                    next_edge += skip
+                    if reach[component[next_edge]] > best:
+                        best = reach[component[next_edge]]
+                    mask >>= skip + 1
+                    next_edge += 1
+            reach[index] = best
+        self.reach = reach
+
+        # Lowest component each component can be reached from, filled in topological order
+        source = array('q', range(found))
+        for index in range(found):
+            lowest = source[index]
+            for edge in members[index]:
+                mask = turn_masks[edge]
+                next_edge = offsets[targets[edge]]
+                while mask:
+                    skip = _low_bit(mask)
+                    next_edge += skip
+                    if lowest < source[component[next_edge]]:
+                        source[component[next_edge]] = lowest
+                    mask >>= skip + 1
+                    next_edge += 1
+        self.source = source
+        self.sizes = array('q', (len(states) for states in members))
+
+        # Per intersection, as (low, high) ranges of components that are empty as (n, -1):
+        # the components a route starts in and can end in, and the ones it arrives
+        # in and can have started from
+        self.start_low = array('q', [found]) * node_count
+        self.start_top = array('q', [-1]) * node_count
+        self.start_high = array('q', [-1]) * node_count
+        self.arrive_bottom = array('q', [found]) * node_count
+        self.arrive_low = array('q', [found]) * node_count
+        self.arrive_high = array('q', [-1]) * node_count
+        for index in range(node_count):
+            mask = graph.departure_masks[index]
+            edge = offsets[index]
+            while mask:
+                skip = _low_bit(mask)
+                edge += skip
+                self.start_low[index] = min(self.start_low[index], component[edge])
+                self.start_top[index] = max(self.start_top[index], component[edge])
+                self.start_high[index] = max(self.start_high[index], reach[component[edge]])
+                mask >>= skip + 1
+                edge += 1
+        for edge in range(state_count):
+            target = targets[edge]
+            self.arrive_bottom[target] = min(self.arrive_bottom[target], source[component[edge]])
+            self.arrive_low[target] = min(self.arrive_low[target], component[edge])
+            self.arrive_high[target] = max(self.arrive_high[target], component[edge])
+
+    def unreachable(self, start, goal):
+        """
+        Check in O(1) whether no route from start to goal can exist. True is
+        always exact; False means a route may exist and a search is needed.
+        """
+        graph = self.graph
+        start_index, goal_index = graph.node_index[start], graph.node_index[goal]
+        if start_index == goal_index:
+            return False
+        return (self.start_low[start_index] > self.arrive_high[goal_index] or
+                self.start_high[start_index] < self.arrive_low[goal_index] or
+                self.start_top[start_index] < self.arrive_bottom[goal_index])
+
+    def main_component(self):
+        """Get the number of the largest component, or -1 on a map without roads"""
+        if not self.component_count:
+            return -1
+        return max(range(self.component_count), key=self.sizes.__getitem__)
+
+    def report(self):
+        """
+        Summarize how well the map holds together. Intersections that cannot
+        be reached from the largest component, or cannot reach it, are grouped
+        into isolated areas of intersections joined by roads.
+        :return: Dict with 'states', 'components', 'main_component_states',
+                 'unreachable' (intersections no route from the main component enters),
+                 'stranded' (intersections no route leaves towards the main component)
+                 and 'isolated' (list of lists of intersection IDs)
+        """
+        graph = self.graph
+        offsets, sources, targets, turn_masks = graph.offsets, graph.sources, graph.targets, graph.turn_masks
+        in_offsets, in_edges = graph.in_offsets, graph.in_edges
+        component = self.component
+        main = self.main_component()
+        main_states = [edge for edge in range(len(targets)) if component[edge] == main]
+
+        # States reachable from the main component
+        forward = set(main_states)
+        queue = deque(main_states)
+        while queue:
+            edge = queue.popleft()
+            mask = turn_masks[edge]
+            next_edge = offsets[targets[edge]]
+            while mask:
+                skip = _low_bit(mask)
+                next_edge += skip
+                if next_edge not in forward:
+                    forward.add(next_edge)
+                    queue.append(next_edge)
+                mask >>= skip + 1
+                next_edge += 1
+
+        # States that can reach the main component
+        backward = set(main_states)
+        queue = deque(main_states)
+        while queue:
+            edge = queue.popleft()
+            through = sources[edge]
+            bit = edge - offsets[through]
+            for previous in in_edges[in_offsets[through]:in_offsets[through + 1]]:
+                if previous not in backward and turn_masks[previous] >> bit & 1:
+                    backward.add(previous)
+                    queue.append(previous)
+
+        entered = {targets[edge] for edge in forward}
+        left = set()
+        for index in range(graph.node_count):
+            mask = graph.departure_masks[index]
+            edge = offsets[index]
+            while mask:
+                skip = _low_bit(mask)
+                edge += skip
+                if edge in backward:
+                    left.add(index)
+                    break
+                mask >>= skip + 1
+                edge += 1
+
+        node_ids = graph.node_ids
+        unreachable = [index for index in range(graph.node_count) if index not in entered]
+        stranded = [index for index in range(graph.node_count) if index not in left]
+
+        # Group the affected intersections by the roads between them
+        affected = set(unreachable) | set(stranded)
+        isolated = []
+        seen = set()
+        for index in sorted(affected):
+            if index in seen:
+                continue
+            seen.add(index)
+            group = [index]
+            queue = deque(group)
+            while queue:
+                current = queue.popleft()
+                neighbors = list(targets[offsets[current]:offsets[current + 1]])
+                neighbors += [sources[edge] for edge in in_edges[in_offsets[current]:in_offsets[current + 1]]]
+                for neighbor in neighbors:
+                    if neighbor in affected and neighbor not in seen:
+                        seen.add(neighbor)
+                        group.append(neighbor)
+                        queue.append(neighbor)
+            isolated.append([node_ids[member] for member in sorted(group)])
+
+        return {
+            'states': len(targets),
+            'components': self.component_count,
+            'main_component_states': len(main_states),
+            'unreachable': [node_ids[index] for index in unreachable],
+            'stranded': [node_ids[index] for index in stranded],
+            'isolated': isolated,
+        }
+
+# Example usage
+if __name__ == "__main__":
+    from town_map import TownMap
+    town = TownMap('complex_town_map.json')
+    connectivity = Connectivity(town)
+    report = connectivity.report()
+    print(f"{report['states']} road states in {report['components']} components, "
+          f"{report['main_component_states']} in the largest")
+    print(f"Cannot be reached: {report['unreachable']}")
+    print(f"Cannot get back out: {report['stranded']}")
+    print(f"Isolated areas: {report['isolated']}")
+    print(f"0 -> 44 ruled out in O(1): {connectivity.unreachable('0', '44')}")
@@ -0,0 +1,433 @@
+import heapq
+import numpy as np
+from search_stats import SearchProbe
+
+class ContractionHierarchy:
+    """
+    Contraction Hierarchy over the turn-expanded graph of a TownMap.
+
+    The nodes being contracted are edge states of the CompiledMap (a directed
+    road, "arrived at targets[e] via e") and the arcs are allowed turns e -> f
+    weighted by the cost of f. Contracting this graph is edge-based
+    contraction of the road network, so every turn restriction stays exact.
+    Roads from which every turn at their end is allowed share one junction
+    node per intersection instead of an arc to each road leaving it; only
+    roads with restricted turns keep arcs of their own. Without junctions every
+    intersection is a complete in x out set of arcs, and contracting any road
+    would add a shortcut for nearly every pair.
+    A query seeds the forward upward search with the open roads leaving the
+    start and the backward upward search with the roads entering the goal.
+    """
+
+    # Witness searches give up after settling this many nodes or following this many
+    # arcs (two per road through a junction); giving up only adds a shortcut that
+    # might not be needed, which never affects correctness. The same search prices
+    # every candidate for the ordering.
+    WITNESS_SETTLE_LIMIT = 1000
+    WITNESS_HOP_LIMIT = 12
+
+    def __init__(self, graph, cost, rank, up_arcs, down_arcs, middles):
+        self.graph = graph
+        # Map version the hierarchy matches; it is stale once the map changes
+        self.version = graph.version
+        self.cost = cost
+        self.rank = rank
+        # up_arcs[u] = [(w, weight)] with rank[w] > rank[u], searched forwards
+        self.up_arcs = up_arcs
+        # down_arcs[w] = [(u, weight)] for arcs u -> w with rank[u] > rank[w], searched backwards
+        self.down_arcs = down_arcs
+        # middles[(u, w)] = v for shortcut arcs u -> v -> w
+        self.middles = middles
+
+    @classmethod
+    def build(cls, town_map, cost='time'):
+        """
+        Contract the turn-expanded graph of a map
+        :param town_map: TownMap or CompiledMap object
+        :param cost: 'hops', 'distance' or 'time'
+        :return: ContractionHierarchy
+        """
+        graph = town_map.compile()
+        costs = graph.edge_costs(cost)
+        offsets, targets, turn_masks = graph.offsets, graph.targets, graph.turn_masks
+        state_count = graph.edge_count
+        # Junction of intersection n is node state_count + n
+        node_count = state_count + graph.node_count
+
+        # Arcs of the nodes that are not contracted yet: node -> {neighbor: weight}
+        out_arcs = [{} for _ in range(node_count)]
+        in_arcs = [{} for _ in range(node_count)]
+        for edge in range(state_count):
+            current = targets[edge]
+            mask = turn_masks[edge]
+            turn_count = offsets[current + 1] - offsets[current]
+            if turn_count and mask == (1 << turn_count) - 1:
+                junction = state_count + current
+                out_arcs[edge][junction] = 0
+                in_arcs[junction][edge] = 0
+                continue
+            for next_edge in range(offsets[current], offsets[current + 1]):
+                allowed = mask & 1
+                mask >>= 1
+                if allowed and next_edge != edge:
+                    out_arcs[edge][next_edge] = costs[next_edge]
+                    in_arcs[next_edge][edge] = costs[next_edge]
+        for junction in range(state_count, node_count):
+            if in_arcs[junction]:
+                current = junction - state_count
+                for next_edge in range(offsets[current], offsets[current + 1]):
+                    out_arcs[junction][next_edge] = costs[next_edge]
+                    in_arcs[next_edge][junction] = costs[next_edge]
+
+        middles = {}
+        contracted = bytearray(node_count)
+        deleted_neighbors = [0] * node_count
+        settle_limit, hop_limit = cls.WITNESS_SETTLE_LIMIT, cls.WITNESS_HOP_LIMIT
+        infinity = float('inf')
+
+        def witness_costs(source, excluded, goals, limit):
+            """
+            Bounded Dijkstra from source in the remaining graph, skipping excluded,
+            until every node in goals is settled or nothing cheaper than limit is left
+            """
+            best = {source: 0}
+            hops = {source: 0}
+            heap = [(0, source)]
+            remaining = len(goals)
+            settled = 0
+            while heap:
+                distance, node = heapq.heappop(heap)
+                if distance > best[node]:
+                    continue
+                if distance > limit or settled == settle_limit:
+                    break
+                if node in goals:
+                    remaining -= 1
+                    if not remaining:
+                        break
+                settled += 1
+                hop = hops[node] + 1
+                if hop > hop_limit:
+                    continue
+                for neighbor, weight in out_arcs[node].items():
+                    if neighbor == excluded:
+                        continue
+                    next_distance = distance + weight
+                    if next_distance < best.get(neighbor, infinity):
+                        best[neighbor] = next_distance
+                        hops[neighbor] = hop
+                        heapq.heappush(heap, (next_distance, neighbor))
+            return best
+
+        def simulate(node):
+            """
+            Contract node on trial
+            :return: (priority, shortcuts [(u, w, weight)] contracting it now would add)
+            """
+            shortcuts = []
+            outgoing = out_arcs[node]
+            incoming = in_arcs[node]
+            for source, in_weight in incoming.items():
+                goals = {target: out_weight for target, out_weight in outgoing.items() if target != source}
+                if not goals:
+                    continue
+                best = witness_costs(source, node, goals, in_weight + max(goals.values()))
+                for target, out_weight in goals.items():
+                    via = in_weight + out_weight
+                    if best.get(target, infinity) > via:
+                        shortcuts.append((source, target, via))
+            # Edge difference, plus deleted neighbors to spread contraction evenly over the map
+            return len(shortcuts) - len(incoming) - len(outgoing) + deleted_neighbors[node], shortcuts
+
+        # Simulations stay valid until a neighbor is contracted, which changes the
+        # node's arcs; only then is a node simulated again, when it next comes up
+        simulations = [simulate(node) for node in range(node_count)]
+        heap = [(simulation[0], node) for node, simulation in enumerate(simulations)]
+        heapq.heapify(heap)
+        rank = [0] * node_count
+        up_arcs = [None] * node_count
+        down_arcs = [None] * node_count
+        next_rank = 0
+
+        while heap:
+            queued_priority, node = heapq.heappop(heap)
+            if contracted[node]:
+                continue
+            # Lazy update: re-queue if the priority got worse since it was queued
+            if simulations[node] is None:
+                simulations[node] = simulate(node)
+            priority, shortcuts = simulations[node]
+            if priority > queued_priority and heap and priority > heap[0][0]:
+                heapq.heappush(heap, (priority, node))
+                continue
+
+            for source, target, weight in shortcuts:
+                if weight < out_arcs[source].get(target, infinity):
+                    out_arcs[source][target] = weight
+                    in_arcs[target][source] = weight
+                    middles[(source, target)] = node
+
+            # Every arc left on this node leads to a node contracted later
+            rank[node] = next_rank
+            next_rank += 1
+            contracted[node] = 1
+            simulations[node] = None
+            up_arcs[node] = list(out_arcs[node].items())
+            down_arcs[node] = list(in_arcs[node].items())
+            for target in out_arcs[node]:
+                del in_arcs[target][node]
+            for source in in_arcs[node]:
+                del out_arcs[source][node]
+            for neighbor in set(out_arcs[node]) | set(in_arcs[node]):
+                deleted_neighbors[neighbor] += 1
+                simulations[neighbor] = None
+            out_arcs[node] = {}
+            in_arcs[node] = {}
+
+        return cls(graph, cost, rank, up_arcs, down_arcs, middles)
+
+    def save(self, path):
+        """Write the hierarchy to a .npz file"""
+        up_offsets, up_targets, up_weights = _flatten(self.up_arcs)
+        down_offsets, down_targets, down_weights = _flatten(self.down_arcs)
+        middle_items = sorted(self.middles.items())
+        np.savez_compressed(
+            path,
+            cost=np.array(self.cost),
+            fingerprint=np.array(self.graph.fingerprint(self.cost)),
+            rank=np.array(self.rank, dtype=np.int64),
+            up_offsets=up_offsets, up_targets=up_targets, up_weights=up_weights,
+            down_offsets=down_offsets, down_targets=down_targets, down_weights=down_weights,
+            middle_arcs=np.array([arc for arc, _ in middle_items], dtype=np.int64).reshape(-1, 2),
+            middle_nodes=np.array([node for _, node in middle_items], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path, town_map):
+        """
+        Read a hierarchy written by save()
+        :param path: .npz file
+        :param town_map: The TownMap or CompiledMap it was built from
+        :raises ValueError: If the map's roads, turn rules or costs differ from those it was built on
+        :return: ContractionHierarchy
+        """
+        graph = town_map.compile()
+        with np.load(path) as data:
+            if 'fingerprint' not in data or str(data['fingerprint']) != graph.fingerprint(str(data['cost'])):
+                raise ValueError(f"{path} was built for a different map or different traffic")
+            middles = {(int(source), int(target)): int(node) for (source, target), node
+                       in zip(data['middle_arcs'].tolist(), data['middle_nodes'].tolist())}
+            return cls(graph, str(data['cost']), data['rank'].tolist(),
+                       _unflatten(data['up_offsets'], data['up_targets'], data['up_weights']),
+                       _unflatten(data['down_offsets'], data['down_targets'], data['down_weights']),
+                       middles)
+
+    def query(self, start, goal, stats=None):
+        """
+        Find the cheapest path between two intersections
+        :param start: Start node
+        :param goal: Goal node
+        :param stats: Optional dict, receives the number of expanded states under 'expanded'
+                      and the SearchProbe frontier counters; shortcut arcs are not turns,
+                      so the turn counters are left out
+        :return: Cheapest path list, or None if unreachable
+        """
+        probe = SearchProbe(stats, 'hierarchy') if stats is not None else None
+        if start == goal:
+            if probe:
+                probe.finish(None, 0, turns=False)
+            return [start]
+
+        graph = self.graph
+        costs = graph.edge_costs(self.cost)
+        offsets = graph.offsets
+        start_index = graph.node_index[start]
+        goal_index = graph.node_index[goal]
+
+        push, pop = (probe.heappush, probe.heappop) if probe else (heapq.heappush, heapq.heappop)
+        forward_cost, forward_parent, forward_heap = {}, {}, []
+        mask = graph.departure_masks[start_index]
+        for edge in range(offsets[start_index], offsets[start_index + 1]):
+            allowed = mask & 1
+            mask >>= 1
+            if allowed:
+                forward_cost[edge] = costs[edge]
+                forward_parent[edge] = -1
+                push(forward_heap, (costs[edge], edge))
+
+        backward_cost, backward_parent, backward_heap = {}, {}, []
+        for edge in graph.in_edges[graph.in_offsets[goal_index]:graph.in_offsets[goal_index + 1]]:
+            backward_cost[edge] = 0
+            backward_parent[edge] = -1
+            push(backward_heap, (0, edge))
+
+        best_cost = float('inf')
+        meeting = -1
+        for edge, edge_cost in forward_cost.items():
+            if edge in backward_cost and edge_cost < best_cost:
+                best_cost, meeting = edge_cost, edge
+        expanded = 0
+        if probe:
+            probe.phase('setup')
+
+        # Both upward searches run until their queues cannot improve the best meeting cost.
+        # A state is stalled (not expanded) when a higher state already reaches it more
+        # cheaply; those arcs are the ones the other direction searches.
+        forward = (forward_heap, forward_cost, forward_parent, self.up_arcs, self.down_arcs, backward_cost)
+        backward = (backward_heap, backward_cost, backward_parent, self.down_arcs, self.up_arcs, forward_cost)
+        infinity = float('inf')
+        while True:
+            forward_open = forward_heap and forward_heap[0][0] < best_cost
+            backward_open = backward_heap and backward_heap[0][0] < best_cost
+            if not forward_open and not backward_open:
+                break
+            if forward_open and (not backward_open or forward_heap[0][0] <= backward_heap[0][0]):
+                heap, labels, parents, arcs, stall_arcs, other_labels = forward
+            else:
+                heap, labels, parents, arcs, stall_arcs, other_labels = backward
+            distance, node = pop(heap)
+            if distance > labels[node]:
+                continue
+            for higher, weight in stall_arcs[node]:
+                if higher in labels and labels[higher] + weight < distance:
+                    break
+            else:
+                higher = -1
+            if higher != -1:
+                continue
+            expanded += 1
+            for neighbor, weight in arcs[node]:
+                next_distance = distance + weight
+                if next_distance < labels.get(neighbor, infinity):
+                    labels[neighbor] = next_distance
+                    parents[neighbor] = node
+                    push(heap, (next_distance, neighbor))
+                    if neighbor in other_labels and next_distance + other_labels[neighbor] < best_cost:
+                        best_cost = next_distance + other_labels[neighbor]
+                        meeting = neighbor
+
+        if probe:
+            probe.phase('search')
+        if meeting == -1:
+            if probe:
+                probe.finish(graph, expanded, turns=False)
+            return None
+
+        # Hierarchy path: seed ... meeting ... goal in-edge, then unpack every shortcut
+        states = []
+        node = meeting
+        while node != -1:
+            states.append(node)
+            node = forward_parent[node]
+        states.reverse()
+        node = backward_parent[meeting]
+        while node != -1:
+            states.append(node)
+            node = backward_parent[node]
+
+        edges = [states[0]]
+        for source, target in zip(states, states[1:]):
+            self._unpack(source, target, edges)
+        edge_count = graph.edge_count
+        path = graph.edge_path_to_nodes(start_index, [edge for edge in edges if edge < edge_count])
+        if probe:
+            probe.finish(graph, expanded, turns=False)
+        return path
+
+    def _upward_search(self, seeds, arcs, stall_arcs):
+        """
+        Exhaustive upward search with stall-on-demand
+        :param seeds: Dict of state -> starting cost
+        :return: Dict of every node settled without stalling -> cost
+        """
+        labels = dict(seeds)
+        heap = [(distance, node) for node, distance in seeds.items()]
+        heapq.heapify(heap)
+        settled = {}
+        infinity = float('inf')
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if distance > labels[node] or node in settled:
+                continue
+            for higher, weight in stall_arcs[node]:
+                if higher in labels and labels[higher] + weight < distance:
+                    break
+            else:
+                settled[node] = distance
+                for neighbor, weight in arcs[node]:
+                    next_distance = distance + weight
+                    if next_distance < labels.get(neighbor, infinity):
+                        labels[neighbor] = next_distance
+                        heapq.heappush(heap, (next_distance, neighbor))
+        return settled
+
+    def cost_matrix(self, sources, targets):
+        """
+        Route costs between every source and every target with bucket-based
+        many-to-many search: one backward upward search per target leaves its
+        costs in buckets at the nodes it settles, and one forward upward search
+        per source scans the buckets of the nodes it settles. Each search only
+        climbs the hierarchy, so the whole matrix costs about as much as
+        len(sources) + len(targets) point-to-point queries.
+        :param sources: Source nodes
+        :param targets: Target nodes
+        :return: numpy array of shape (len(sources), len(targets)) with inf for unreachable pairs
+        """
+        graph = self.graph
+        costs = graph.edge_costs(self.cost)
+        offsets, in_offsets, in_edges = graph.offsets, graph.in_offsets, graph.in_edges
+        buckets = {}
+        for column, target in enumerate(targets):
+            goal_index = graph.node_index[target]
+            seeds = dict.fromkeys(in_edges[in_offsets[goal_index]:in_offsets[goal_index + 1]], 0)
+            for node, distance in self._upward_search(seeds, self.down_arcs, self.up_arcs).items():
+                buckets.setdefault(node, []).append((column, distance))
+
+        matrix = np.full((len(sources), len(targets)), np.inf)
+        columns = {}
+        for column, target in enumerate(targets):
+            columns.setdefault(target, []).append(column)
+        for row, source in enumerate(sources):
+            start_index = graph.node_index[source]
+            seeds = {}
+            mask = graph.departure_masks[start_index]
+            for edge in range(offsets[start_index], offsets[start_index + 1]):
+                allowed = mask & 1
+                mask >>= 1
+                if allowed:
+                    seeds[edge] = costs[edge]
+            best = matrix[row].tolist()
+            for node, distance in self._upward_search(seeds, self.up_arcs, self.down_arcs).items():
+                for column, remaining in buckets.get(node, ()):
+                    if distance + remaining < best[column]:
+                        best[column] = distance + remaining
+            for column in columns.get(source, ()):
+                best[column] = 0.0
+            matrix[row] = best
+        return matrix
+
+    def _unpack(self, source, target, edges):
+        """Append the states strictly after source up to target, expanding shortcuts"""
+        stack = [(source, target)]
+        while stack:
+            source, target = stack.pop()
+            middle = self.middles.get((source, target))
+            if middle is None:
+                edges.append(target)
+            else:
+                stack.append((middle, target))
+                stack.append((source, middle))
+
+def _flatten(arc_lists):
+    """Pack per-node [(neighbor, weight)] lists into CSR arrays"""
+    offsets = np.zeros(len(arc_lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(arcs) for arcs in arc_lists])
+    neighbors = np.array([neighbor for arcs in arc_lists for neighbor, _ in arcs], dtype=np.int64)
+    weights = np.array([weight for arcs in arc_lists for _, weight in arcs], dtype=np.float64)
+    return offsets, neighbors, weights
+
+def _unflatten(offsets, neighbors, weights):
+    """Unpack CSR arrays into per-node [(neighbor, weight)] lists"""
+    offsets = offsets.tolist()
+    pairs = list(zip(neighbors.tolist(), weights.tolist()))
+    return [pairs[offsets[node]:offsets[node + 1]] for node in range(len(offsets) - 1)]
@@ -7,6 +7,7 @@ including complex traffic patterns, turn restrictions, and detailed path analysi
 """
 
 from navigation import NavigationSystem
+from path_metrics import path_metrics, road_type_counts
 import json
 
 def demo_complex_navigation():
@@ -43,17 +44,18 @@ def demo_complex_navigation():
     print(f"\n[ROUTE ANALYSIS]:")
     print("-"*60)
 
-    for start, goal, description in test_routes:
+    # Find all paths in one batch, then measure them together
+    routes = list(nav_system.route_batch([(start, goal) for start, goal, _ in test_routes]))
+    metrics = path_metrics(town_map, [path for _, _, path in routes])
+
+    for row, ((start, goal, description), (_, _, path)) in enumerate(zip(test_routes, routes)):
         print(f"\n[ROUTE] {description}")
         print(f"   From: {start} ({town_map.get_landmark(start)['name'] if town_map.get_landmark(start) else 'Unknown'})")
         print(f"   To: {goal} ({town_map.get_landmark(goal)['name'] if town_map.get_landmark(goal) else 'Unknown'})")
 
-        # Find path
-        path = nav_system.find_route(start, goal)
-
         if path:
-            distance = town_map.get_path_distance(path)
-            time_estimate = town_map.get_path_time(path)
+            distance = metrics['distance'][row]
+            time_estimate = metrics['time'][row]
 
             print(f"   [SUCCESS] Path found: {' -> '.join(path[:8])}{'...' if len(path) > 8 else ''}")
             print(f"   [DISTANCE] {distance:.2f} units")
@@ -61,14 +63,8 @@ def demo_complex_navigation():
             print(f"   [COMPLEXITY] Route complexity: {len(path)} intersections")
 
             # Analyze road types
-            road_types = {}
-            for i in range(len(path) - 1):
-                road_type = town_map.get_road_type(path[i], path[i+1])
-                road_type_name = road_type['type']
-                road_types[road_type_name] = road_types.get(road_type_name, 0) + 1
-
             print(f"   [ROAD TYPES] Used:")
-            for road_type, count in road_types.items():
+            for road_type, count in road_type_counts(metrics, row).items():
                 print(f"      - {road_type.replace('_', ' ').title()}: {count} segments")
 
         else:
@@ -163,6 +159,17 @@ def analyze_connectivity():
 
     print(f"   One-way roads: {one_way_roads}")
 
+    # Which intersections routes cannot get to or away from, under one-way roads and turn rules
+    report = town_map.validate()
+    print(f"\n   Turn-aware Connectivity:")
+    print(f"      - Road states: {report['states']} in {report['components']} strongly connected components")
+    print(f"      - Largest component: {report['main_component_states']} states")
+    if report['isolated']:
+        for area in report['isolated']:
+            print(f"      - Cut off: {', '.join(area)}")
+    else:
+        print(f"      - Every intersection can reach every other")
+
 if __name__ == "__main__":
     demo_complex_navigation()
     analyze_connectivity()
\ No newline at end of file
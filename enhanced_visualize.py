@@ -1,17 +1,56 @@
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+from matplotlib.collections import LineCollection
 from matplotlib.path import Path
 import numpy as np
 from navigation import NavigationSystem
+from path_metrics import path_metrics, road_type_counts
 
 class EnhancedMapVisualizer:
+    """
+    Interactive map with route analysis.
+
+    The map is drawn with a few batched artists (a LineCollection per road
+    type, a scatter per marker class) so large maps stay responsive. The
+    selection markers, route and stats text are animated artists: clicks
+    restore the saved background and blit only those, instead of redrawing
+    the whole figure. Intersection labels are only created for the visible
+    part of the map once few enough intersections are in view.
+    """
+
+    # Road type -> (color, line width, alpha)
+    ROAD_STYLES = {
+        'highway': ('red', 4, 0.8),
+        'main_road': ('blue', 3, 0.7),
+        'secondary_road': ('green', 2, 0.6),
+        'local_road': ('gray', 1.5, 0.5),
+    }
+
+    # Landmark type -> (marker, color)
+    LANDMARK_MARKERS = {
+        'government': ('s', 'purple'),
+        'commercial': ('D', 'orange'),
+        'industrial': ('^', 'brown'),
+        'residential': ('v', 'green'),
+        'recreation': ('o', 'darkgreen'),
+        'transport': ('*', 'red')
+    }
+
+    # Intersection labels are drawn once at most this many intersections are in view
+    LABEL_LIMIT = 150
+
     def __init__(self, map_file):
         self.nav_system = NavigationSystem(map_file)
         self.fig, (self.ax_map, self.ax_stats) = plt.subplots(1, 2, figsize=(16, 8))
         self.start_point = None
         self.goal_point = None
-        self.path_line = None
+        self.isochrone_patches = []
+        self.labels = []
+        self.background = None
         self.setup_plot()
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+        # Press "i" to show what is reachable from the selected start point
+        self.fig.canvas.mpl_connect('key_press_event', self.on_key)
 
     def setup_plot(self):
         """Set up the enhanced map drawing elements"""
@@ -19,24 +58,18 @@ class EnhancedMapVisualizer:
         self.ax_map.grid(True, alpha=0.3)
         self.ax_map.set_title(f"Enhanced Town Navigation: {self.nav_system.town_map.metadata.get('name', 'Unknown Town')}", fontsize=14, fontweight='bold')
 
-        # Draw roads with different styles based on type
-        for road in self.nav_system.town_map.get_all_roads():
-            start_id, end_id = road
-            start_pos = self.nav_system.town_map.get_position(start_id)
-            end_pos = self.nav_system.town_map.get_position(end_id)
-
-            road_type = self.nav_system.town_map.get_road_type(start_id, end_id)
-            self.draw_road(start_pos, end_pos, road_type)
-
-        # Draw intersections with enhanced styling
-        for intersection_id in self.nav_system.town_map.get_all_intersections():
-            pos = self.nav_system.town_map.get_position(intersection_id)
-            self.draw_intersection(intersection_id, pos)
+        self.draw_roads()
+        self.draw_intersections()
+        self.draw_landmarks()
+        self.ax_map.autoscale_view()
 
-        # Draw landmarks
-        for intersection_id, landmark in self.nav_system.town_map.landmarks.items():
-            pos = self.nav_system.town_map.get_position(intersection_id)
-            self.draw_landmark(pos, landmark)
+        # Selection and route are redrawn by blitting, without the rest of the map
+        marker_style = dict(markersize=15, markeredgecolor='black', markeredgewidth=2, animated=True)
+        self.start_marker, = self.ax_map.plot([], [], 'go', label='Start', **marker_style)
+        self.goal_marker, = self.ax_map.plot([], [], 'mo', label='Goal', **marker_style)
+        self.path_line, = self.ax_map.plot([], [], 'purple', linewidth=3, marker='o', markersize=4,
+                                           alpha=0.8, markeredgecolor='black', markeredgewidth=1, animated=True)
+        self.ax_map.legend(handles=[self.start_marker, self.goal_marker], loc='upper right', fontsize=8)
 
         # Set up statistics panel
         self.setup_stats_panel()
@@ -44,94 +77,105 @@ class EnhancedMapVisualizer:
         # Initialize with instruction text
         self.update_stats("Click on the map to select a starting point (green)")
 
-        # Connect mouse click event
+        # Connect mouse click event, and relabel when the view changes
         self.fig.canvas.mpl_connect('button_press_event', self.on_click)
-
-    def draw_road(self, start_pos, end_pos, road_type):
-        """Draw road with style based on type"""
-        x_coords = [start_pos[0], end_pos[0]]
-        y_coords = [start_pos[1], end_pos[1]]
-
-        # Road styling based on type
-        if road_type['type'] == 'highway':
-            color = 'red'
-            linewidth = 4
-            alpha = 0.8
-        elif road_type['type'] == 'main_road':
-            color = 'blue'
-            linewidth = 3
-            alpha = 0.7
-        elif road_type['type'] == 'secondary_road':
-            color = 'green'
-            linewidth = 2
-            alpha = 0.6
-        else:  # local_road
-            color = 'gray'
-            linewidth = 1.5
-            alpha = 0.5
-
-        self.ax_map.plot(x_coords, y_coords, color=color, linewidth=linewidth, alpha=alpha)
-
-        # Draw one-way arrow if applicable
-        if road_type.get('one_way', False):
-            mid_x = (start_pos[0] + end_pos[0]) / 2
-            mid_y = (start_pos[1] + end_pos[1]) / 2
-            dx = end_pos[0] - start_pos[0]
-            dy = end_pos[1] - start_pos[1]
-            self.ax_map.arrow(mid_x - dx*0.1, mid_y - dy*0.1, dx*0.2, dy*0.2,
-                            head_width=0.2, head_length=0.1, fc='black', ec='black', alpha=0.7)
-
-    def draw_intersection(self, intersection_id, pos):
-        """Draw intersection with enhanced styling"""
-        intersection_type = self.nav_system.town_map.get_intersection_type(intersection_id)
-        has_traffic_light = self.nav_system.town_map.has_traffic_light(intersection_id)
-
-        # Choose marker based on intersection type
-        if intersection_type == 'dead_end':
-            marker = 's'
-            color = 'orange'
-            size = 8
-        else:
-            marker = 'o'
-            color = 'red' if has_traffic_light else 'darkblue'
-            size = 10 if has_traffic_light else 8
-
-        self.ax_map.plot(pos[0], pos[1], marker=marker, color=color, markersize=size,
-                        markeredgecolor='black', markeredgewidth=1)
-
-        # Add intersection ID label
-        self.ax_map.text(pos[0], pos[1]+0.3, intersection_id, fontsize=8, ha='center',
-                        fontweight='bold', bbox=dict(boxstyle="round,pad=0.2", facecolor='white', alpha=0.8))
-
-        # Add traffic light indicator
-        if has_traffic_light:
-            circle = plt.Circle((pos[0]+0.3, pos[1]+0.3), 0.1, color='yellow', alpha=0.8)
-            self.ax_map.add_patch(circle)
-
-    def draw_landmark(self, pos, landmark):
-        """Draw landmark on the map"""
-        # Choose marker based on landmark type
-        landmark_markers = {
-            'government': ('s', 'purple'),
-            'commercial': ('D', 'orange'),
-            'industrial': ('^', 'brown'),
-            'residential': ('v', 'green'),
-            'recreation': ('o', 'darkgreen'),
-            'transport': ('*', 'red')
+        self.ax_map.callbacks.connect('xlim_changed', self.update_labels)
+        self.ax_map.callbacks.connect('ylim_changed', self.update_labels)
+        self.update_labels()
+
+    def draw_roads(self):
+        """Draw all roads as one LineCollection per road type, with one-way arrows as a single quiver"""
+        town_map = self.nav_system.town_map
+        segments = {road_type: [] for road_type in self.ROAD_STYLES}
+        one_way = []
+        for start_id, end_id in town_map.get_all_roads():
+            start_pos = town_map.get_position(start_id)
+            end_pos = town_map.get_position(end_id)
+            road_type = town_map.get_road_type(start_id, end_id)
+            kind = road_type['type'] if road_type['type'] in self.ROAD_STYLES else 'local_road'
+            segments[kind].append((start_pos, end_pos))
+            if road_type.get('one_way', False):
+                one_way.append((start_pos, end_pos))
+
+        for road_type, lines in segments.items():
+            if lines:
+                color, linewidth, alpha = self.ROAD_STYLES[road_type]
+                self.ax_map.add_collection(LineCollection(lines, colors=color, linewidths=linewidth, alpha=alpha))
+
+        if one_way:
+            ends = np.array(one_way, dtype=float)
+            delta = ends[:, 1] - ends[:, 0]
+            middle = (ends[:, 0] + ends[:, 1]) / 2
+            self.ax_map.quiver(middle[:, 0] - delta[:, 0] * 0.1, middle[:, 1] - delta[:, 1] * 0.1,
+                               delta[:, 0] * 0.2, delta[:, 1] * 0.2, angles='xy', scale_units='xy', scale=1,
+                               color='black', alpha=0.7, width=0.003, zorder=3)
+
+    def draw_intersections(self):
+        """Draw intersections with one scatter per marker class"""
+        town_map = self.nav_system.town_map
+        # Class -> (marker, color, size, points)
+        classes = {
+            'dead_end': ('s', 'orange', 8, []),
+            'traffic_light': ('o', 'red', 10, []),
+            'intersection': ('o', 'darkblue', 8, []),
         }
-
-        marker, color = landmark_markers.get(landmark['type'], ('h', 'gray'))
-        self.ax_map.plot(pos[0]-0.5, pos[1]+0.5, marker=marker, color=color, markersize=8,
-                        markeredgecolor='black', markeredgewidth=1)
-        self.ax_map.text(pos[0]-0.5, pos[1]+0.8, landmark['name'], fontsize=6, ha='center',
-                        style='italic', color='darkgreen', fontweight='bold')
+        for intersection_id in town_map.get_all_intersections():
+            pos = town_map.get_position(intersection_id)
+            if town_map.get_intersection_type(intersection_id) == 'dead_end':
+                classes['dead_end'][3].append(pos)
+            elif town_map.has_traffic_light(intersection_id):
+                classes['traffic_light'][3].append(pos)
+            else:
+                classes['intersection'][3].append(pos)
+
+        for marker, color, size, points in classes.values():
+            if points:
+                points = np.array(points, dtype=float)
+                self.ax_map.scatter(points[:, 0], points[:, 1], s=size ** 2, marker=marker, c=color,
+                                    edgecolors='black', linewidths=1, zorder=4)
+        # Traffic light indicators next to the intersection
+        lights = np.array(classes['traffic_light'][3], dtype=float).reshape(-1, 2)
+        if len(lights):
+            self.ax_map.scatter(lights[:, 0] + 0.3, lights[:, 1] + 0.3, s=30, c='yellow', alpha=0.8, zorder=4)
+
+    def draw_landmarks(self):
+        """Draw landmarks with one scatter per landmark type"""
+        town_map = self.nav_system.town_map
+        by_type = {}
+        for intersection_id, landmark in town_map.landmarks.items():
+            pos = town_map.get_position(intersection_id)
+            by_type.setdefault(landmark['type'], []).append((pos[0] - 0.5, pos[1] + 0.5))
+            self.ax_map.text(pos[0]-0.5, pos[1]+0.8, landmark['name'], fontsize=6, ha='center',
+                             style='italic', color='darkgreen', fontweight='bold', clip_on=True)
+        for landmark_type, points in by_type.items():
+            marker, color = self.LANDMARK_MARKERS.get(landmark_type, ('h', 'gray'))
+            points = np.array(points, dtype=float)
+            self.ax_map.scatter(points[:, 0], points[:, 1], s=64, marker=marker, c=color,
+                                edgecolors='black', linewidths=1, zorder=5)
+
+    def update_labels(self, ax=None):
+        """Label the intersections in view, or none if there are too many to read"""
+        for label in self.labels:
+            label.remove()
+        self.labels = []
+        graph = self.nav_system.town_map.compile()
+        xs, ys = np.frombuffer(graph.x), np.frombuffer(graph.y)
+        (x_low, x_high), (y_low, y_high) = sorted(self.ax_map.get_xlim()), sorted(self.ax_map.get_ylim())
+        visible = np.flatnonzero((xs >= x_low) & (xs <= x_high) & (ys >= y_low) & (ys <= y_high))
+        if len(visible) > self.LABEL_LIMIT:
+            return
+        for index in visible.tolist():
+            self.labels.append(self.ax_map.text(xs[index], ys[index]+0.3, graph.node_ids[index], fontsize=8,
+                                                ha='center', fontweight='bold', clip_on=True,
+                                                bbox=dict(boxstyle="round,pad=0.2", facecolor='white', alpha=0.8)))
 
     def setup_stats_panel(self):
         """Set up the statistics panel"""
         self.ax_stats.axis('off')
         self.ax_stats.set_title('Path Analysis', fontsize=12, fontweight='bold')
         self.stats_text = self.ax_stats.text(0.1, 0.9, '', transform=self.ax_stats.transAxes,
-                                            fontsize=10, verticalalignment='top', fontfamily='monospace')
+                                            fontsize=10, verticalalignment='top', fontfamily='monospace',
+                                            animated=True)
 
         # Add legend
         self.add_legend()
@@ -153,24 +197,40 @@ class EnhancedMapVisualizer:
 
         self.ax_stats.legend(handles=legend_elements, loc='lower left', fontsize=8)
 
+    def on_draw(self, event):
+        """After a full redraw, keep the static map as the blitting background"""
+        canvas = self.fig.canvas
+        if not getattr(canvas, 'supports_blit', False):
+            return
+        self.background = canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_animated()
+
+    def draw_animated(self):
+        for artist in (self.start_marker, self.goal_marker, self.path_line, self.stats_text):
+            artist.axes.draw_artist(artist)
+
+    def refresh(self):
+        """Redraw the selection, route and stats only, falling back to a full redraw"""
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self.background)
+        self.draw_animated()
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
     def find_nearest_intersection(self, x, y):
         """Find the nearest intersection to the click position"""
-        min_dist = float('inf')
-        nearest_point = None
-
-        for intersection_id in self.nav_system.town_map.get_all_intersections():
-            pos = self.nav_system.town_map.get_position(intersection_id)
-            dist = (pos[0] - x) ** 2 + (pos[1] - y) ** 2
-            if dist < min_dist:
-                min_dist = dist
-                nearest_point = intersection_id
-
-        return nearest_point
+        return self.nav_system.town_map.spatial_index().nearest(x, y)
 
     def on_click(self, event):
         """Handle mouse click events"""
         if event.inaxes != self.ax_map:
             return
+        # Clicks that end a zoom or pan do not select anything
+        if self.fig.canvas.toolbar is not None and self.fig.canvas.toolbar.mode:
+            return
 
         # Find the nearest intersection
         point_id = self.find_nearest_intersection(event.xdata, event.ydata)
@@ -179,33 +239,56 @@ class EnhancedMapVisualizer:
 
         point_pos = self.nav_system.town_map.get_position(point_id)
 
-        if self.start_point is None:
-            # Set start point
+        if self.start_point is None or self.goal_point is not None or point_id == self.start_point:
+            # Set (or restart with) a start point
+            if self.start_point is not None:
+                self.reset_selection()
             self.start_point = point_id
-            self.ax_map.plot(point_pos[0], point_pos[1], 'go', markersize=15,
-                           label='Start', markeredgecolor='black', markeredgewidth=2)
-            self.ax_map.legend(loc='upper right', fontsize=8)
-            self.update_stats(f"Start Point: {point_id}\n\nNow click to select a goal point (purple)")
-            self.fig.canvas.draw_idle()
-        elif self.goal_point is None and point_id != self.start_point:
+            self.start_marker.set_data([point_pos[0]], [point_pos[1]])
+            self.update_stats(f"Start Point: {point_id}\n\nNow click to select a goal point (purple),\nor press 'i' to show the reachable area")
+        else:
             # Set goal point
             self.goal_point = point_id
-            self.ax_map.plot(point_pos[0], point_pos[1], 'mo', markersize=15,
-                           label='Goal', markeredgecolor='black', markeredgewidth=2)
-            self.ax_map.legend(loc='upper right', fontsize=8)
-            self.fig.canvas.draw_idle()
+            self.goal_marker.set_data([point_pos[0]], [point_pos[1]])
 
             # Calculate and draw path
             self.calculate_and_draw_path()
-        else:
-            # Reset selection
-            self.reset_selection()
-            self.start_point = point_id
-            self.ax_map.plot(point_pos[0], point_pos[1], 'go', markersize=15,
-                           label='Start', markeredgecolor='black', markeredgewidth=2)
-            self.ax_map.legend(loc='upper right', fontsize=8)
-            self.update_stats(f"Start Point: {point_id}\n\nNow click to select a goal point (purple)")
-            self.fig.canvas.draw_idle()
+
+    def on_key(self, event):
+        """Handle key presses"""
+        if event.key == 'i' and self.start_point is not None:
+            self.draw_isochrones(self.start_point)
+
+    def draw_isochrones(self, start, budgets=(2, 5, 10), cost="time"):
+        """
+        Shade the convex outline of the area reachable from start within each
+        budget, largest first; the stats panel lists the exact reachable counts
+        :param start: Start point ID
+        :param budgets: Cost budgets (minutes for "time")
+        :param cost: What to measure: "hops", "distance" or "time"
+        """
+        self.clear_isochrones()
+
+        isochrones = self.nav_system.isochrones(start, budgets, cost)
+        colors = plt.cm.YlOrRd(np.linspace(0.25, 0.85, len(isochrones.budgets)))
+        for budget, color in zip(reversed(isochrones.budgets), reversed(colors)):
+            outline = isochrones.polygon(budget)
+            if len(outline) < 3:
+                continue
+            patch = patches.Polygon(outline, closed=True, facecolor=color, edgecolor=color,
+                                    alpha=0.3, zorder=0, label=f'Within {budget} ({cost})')
+            self.ax_map.add_patch(patch)
+            self.isochrone_patches.append(patch)
+        self.ax_map.legend(handles=[self.start_marker, self.goal_marker] + self.isochrone_patches,
+                           loc='upper right', fontsize=8)
+        # The shaded areas are part of the background, so this needs a full redraw
+        self.fig.canvas.draw_idle()
+
+        unit = ' min' if cost == "time" else ''
+        stats_text = f"[REACHABLE FROM {start}]\n{'='*25}\n\n"
+        for budget, nodes in isochrones.bands():
+            stats_text += f"Within {budget}{unit}: +{len(nodes)} intersections\n"
+        self.update_stats(stats_text)
 
     def calculate_and_draw_path(self):
         """Calculate and draw the path with detailed analysis"""
@@ -216,35 +299,30 @@ class EnhancedMapVisualizer:
         path = self.nav_system.find_route(self.start_point, self.goal_point)
 
         if path is None:
-            self.update_stats("[FAILED] No path found!\n\nThis could be due to:\n- Turn restrictions\n- One-way streets\n- Disconnected areas")
+            report = self.nav_system.town_map.validate()
+            reasons = []
+            if self.start_point in report['stranded']:
+                reasons.append(f"- {self.start_point} cannot get back to the main road network")
+            if self.goal_point in report['unreachable']:
+                reasons.append(f"- {self.goal_point} cannot be reached from the main road network")
+            if not reasons:
+                reasons.append("- Turn restrictions or one-way streets rule out every route")
+            self.update_stats("[FAILED] No path found!\n\n" + "\n".join(reasons))
             return
 
         # Draw path
-        if self.path_line:
-            self.path_line.remove()
-
         x_coords = [self.nav_system.town_map.get_position(point)[0] for point in path]
         y_coords = [self.nav_system.town_map.get_position(point)[1] for point in path]
-        self.path_line, = self.ax_map.plot(x_coords, y_coords, 'purple', linewidth=3,
-                                         marker='o', markersize=4, alpha=0.8,
-                                         markeredgecolor='black', markeredgewidth=1)
+        self.path_line.set_data(x_coords, y_coords)
 
         # Calculate path statistics
-        distance = self.nav_system.town_map.get_path_distance(path)
-        time_estimate = self.nav_system.town_map.get_path_time(path)
+        metrics = path_metrics(self.nav_system.town_map, [path])
+        distance = metrics['distance'][0]
+        time_estimate = metrics['time'][0]
 
         # Analyze path composition
-        road_types = {}
-        turns = 0
-        traffic_lights = 0
-
-        for i in range(len(path) - 1):
-            road_type = self.nav_system.town_map.get_road_type(path[i], path[i+1])
-            road_type_name = road_type['type']
-            road_types[road_type_name] = road_types.get(road_type_name, 0) + 1
-
-            if self.nav_system.town_map.has_traffic_light(path[i+1]):
-                traffic_lights += 1
+        road_types = road_type_counts(metrics, 0)
+        traffic_lights = metrics['traffic_lights'][0]
 
         turns = len(path) - 2  # Number of turns = waypoints - start - end
 
@@ -280,36 +358,27 @@ class EnhancedMapVisualizer:
 
     def update_stats(self, text):
         """Update statistics panel"""
-        # Clear the statistics axes
-        self.ax_stats.clear()
-        self.ax_stats.axis('off')
-        self.ax_stats.set_title('Path Analysis', fontsize=12, fontweight='bold')
+        self.stats_text.set_text(text)
+        self.refresh()
 
-        # Recreate the text object
-        self.stats_text = self.ax_stats.text(0.1, 0.9, text, transform=self.ax_stats.transAxes,
-                                            fontsize=10, verticalalignment='top', fontfamily='monospace')
-
-        # Re-add legend
-        self.add_legend()
-
-        # Redraw
+    def clear_isochrones(self):
+        """Remove the reachable areas, if shown"""
+        if not self.isochrone_patches:
+            return
+        for patch in self.isochrone_patches:
+            patch.remove()
+        self.isochrone_patches = []
+        self.ax_map.legend(handles=[self.start_marker, self.goal_marker], loc='upper right', fontsize=8)
         self.fig.canvas.draw_idle()
 
     def reset_selection(self):
         """Reset selection"""
         self.start_point = None
         self.goal_point = None
-
-        # Remove path line
-        if self.path_line:
-            self.path_line.remove()
-            self.path_line = None
-
-        # Redraw map
-        self.ax_map.clear()
-        self.setup_plot()
+        self.clear_isochrones()
+        for artist in (self.start_marker, self.goal_marker, self.path_line):
+            artist.set_data([], [])
         self.update_stats("Click on the map to select a starting point (green)")
-        self.fig.canvas.draw_idle()
 
     def show(self):
         """Show the map"""
@@ -0,0 +1,196 @@
+import bisect
+import heapq
+import numpy as np
+from search_stats import SearchProbe
+
+def _convex_hull(xs, ys):
+    """Convex hull of points by the monotone chain method, counter-clockwise without repeating the first point"""
+    order = np.lexsort((ys, xs))
+    points = list(dict.fromkeys(zip(xs[order].tolist(), ys[order].tolist())))
+    if len(points) < 3:
+        return points
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower, upper = [], []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    return lower[:-1] + upper[:-1]
+
+class Isochrones:
+    """
+    Everything reachable from a start within one or more cost budgets.
+
+    A single turn-aware Dijkstra over edge states runs until the largest
+    budget, so turn restrictions and one-way roads limit the reachable area
+    just as they limit routes. Intersections are settled in cost order, so the
+    reachable set for any smaller budget is a prefix of the same search.
+    Roads that are entered but not finished within a budget are kept with
+    their entry cost, so the boundary can follow the point along the road
+    where the budget runs out rather than stopping at the last intersection.
+    """
+
+    def __init__(self, town_map, start, budgets, cost='time', stats=None):
+        """
+        :param town_map: TownMap or CompiledMap object
+        :param start: Start node
+        :param budgets: Cost budgets (minutes for 'time'); one search covers all of them
+        :param cost: 'hops', 'distance' or 'time'
+        :param stats: Optional dict, receives the number of expanded states under 'expanded'
+                      and the other SearchProbe counters
+        """
+        self.budgets = sorted(set(budgets))
+        if not self.budgets or self.budgets[0] < 0:
+            raise ValueError("Budgets must be a non-empty list of non-negative costs")
+        probe = SearchProbe(stats, 'isochrones') if stats is not None else None
+        self.graph = graph = town_map.compile()
+        self.version = graph.version
+        self.start = start
+        self.cost = cost
+        self.costs = costs = graph.edge_costs(cost)
+        limit = self.budgets[-1]
+        start_index = graph.node_index[start]
+        offsets, targets, turn_masks = graph.offsets, graph.targets, graph.turn_masks
+
+        # Intersections in the order they are reached, with their arrival costs
+        self.order = [start_index]
+        self.order_costs = [0]
+        reached = {start_index}
+        # Edge -> cheapest cost at which it is entered from a settled state
+        self.entered = entered = {}
+        settled = set()
+        best_cost = {}
+        heap = []
+        push, pop = (probe.heappush, probe.heappop) if probe else (heapq.heappush, heapq.heappop)
+        mask = graph.departure_masks[start_index]
+        for edge in range(offsets[start_index], offsets[start_index + 1]):
+            allowed = mask & 1
+            mask >>= 1
+            if allowed:
+                entered[edge] = 0
+                if costs[edge] <= limit:
+                    best_cost[edge] = costs[edge]
+                    push(heap, (costs[edge], edge))
+        expanded = 0
+        if probe:
+            probe.phase('setup')
+
+        while heap:
+            cost_so_far, edge = pop(heap)
+            if edge in settled:
+                continue
+            settled.add(edge)
+            expanded += 1
+            current = targets[edge]
+            if current not in reached:
+                reached.add(current)
+                self.order.append(current)
+                self.order_costs.append(cost_so_far)
+            if cost_so_far >= limit:
+                continue
+
+            mask = turn_masks[edge]
+            for next_edge in range(offsets[current], offsets[current + 1]):
+                allowed = mask & 1
+                mask >>= 1
+                if not allowed or next_edge in settled:
+                    continue
+                if cost_so_far < entered.get(next_edge, float('inf')):
+                    entered[next_edge] = cost_so_far
+                next_cost = cost_so_far + costs[next_edge]
+                if next_cost <= limit and next_cost < best_cost.get(next_edge, float('inf')):
+                    best_cost[next_edge] = next_cost
+                    push(heap, (next_cost, next_edge))
+
+        if probe:
+            probe.phase('search')
+            # States at the largest budget are settled but their turns are never looked at
+            probe.finish(graph, expanded, (edge for edge in settled if best_cost[edge] < limit))
+
+    def _check_budget(self, budget):
+        if budget > self.budgets[-1]:
+            raise ValueError(f"Budget {budget} is beyond the largest searched budget {self.budgets[-1]}")
+
+    def reachable(self, budget=None):
+        """
+        Get the intersections reachable within a budget
+        :param budget: Cost budget, at most the largest searched one (default: the largest)
+        :return: Dict of intersection ID -> cheapest arrival cost, in order of cost
+        """
+        if budget is None:
+            budget = self.budgets[-1]
+        self._check_budget(budget)
+        count = bisect.bisect_right(self.order_costs, budget)
+        node_ids = self.graph.node_ids
+        return {node_ids[index]: cost for index, cost in zip(self.order[:count], self.order_costs[:count])}
+
+    def bands(self):
+        """
+        Split the reachable intersections by budget
+        :return: List of (budget, {intersection ID: cost}) with each intersection in the smallest budget that reaches it
+        """
+        result = []
+        low = 0
+        node_ids = self.graph.node_ids
+        for budget in self.budgets:
+            high = bisect.bisect_right(self.order_costs, budget)
+            result.append((budget, {node_ids[index]: cost for index, cost in
+                                    zip(self.order[low:high], self.order_costs[low:high])}))
+            low = high
+        return result
+
+    def boundary_points(self, budget):
+        """
+        Get the points reachable within a budget: the start, every reachable
+        intersection and, on roads entered but not finished, the point where
+        the budget runs out
+        :return: (xs, ys) arrays
+        """
+        self._check_budget(budget)
+        graph = self.graph
+        xs = np.frombuffer(graph.x, dtype=np.float64)
+        ys = np.frombuffer(graph.y, dtype=np.float64)
+        edges = np.fromiter(self.entered.keys(), dtype=np.int64, count=len(self.entered))
+        entry = np.fromiter(self.entered.values(), dtype=np.float64, count=len(self.entered))
+        inside = entry < budget
+        edges, entry = edges[inside], entry[inside]
+        edge_costs = np.frombuffer(self.costs, dtype=np.float64)[edges]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(edge_costs > 0, (budget - entry) / edge_costs, 1.0)
+        fraction = np.clip(fraction, 0.0, 1.0)
+        sources = np.frombuffer(graph.sources, dtype=np.int64)[edges]
+        targets = np.frombuffer(graph.targets, dtype=np.int64)[edges]
+        start_index = graph.node_index[self.start]
+        return (np.append(xs[sources] + fraction * (xs[targets] - xs[sources]), xs[start_index]),
+                np.append(ys[sources] + fraction * (ys[targets] - ys[sources]), ys[start_index]))
+
+    def polygon(self, budget=None):
+        """
+        Get a convex outline around the area reachable within a budget, for plotting.
+        This is the convex hull of boundary_points(budget), not the exact reachable
+        shape: it also covers unreachable pockets between reachable roads, such as
+        the far side of a closed road or a one-way street. Use reachable(budget)
+        to test whether an intersection can actually be reached.
+        :param budget: Cost budget, at most the largest searched one (default: the largest)
+        :return: Convex hull of boundary_points(budget) as a counter-clockwise list of (x, y)
+        """
+        if budget is None:
+            budget = self.budgets[-1]
+        return _convex_hull(*self.boundary_points(budget))
+
+# Example usage
+if __name__ == "__main__":
+    from town_map import TownMap
+    town = TownMap('complex_town_map.json')
+    start = next(node_id for node_id, landmark in town.landmarks.items() if landmark['name'] == 'Highway Entrance')
+    isochrones = Isochrones(town, start, [2, 5])
+    for budget, nodes in isochrones.bands():
+        print(f"Within {budget} minutes: {sorted(nodes, key=int)}")
+    print(f"5 minute outline (convex hull): {[(round(x, 2), round(y, 2)) for x, y in isochrones.polygon(5)]}")
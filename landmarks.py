@@ -0,0 +1,253 @@
+import heapq
+from array import array
+import numpy as np
+from pathfinding import astar_shortest_path_with_turns
+
+def _state_distances(graph, costs, node, backward=False):
+    """
+    Turn-aware Dijkstra over every edge state from or to one intersection
+    :param node: Intersection index
+    :param backward: Cost from each state to arriving at node, instead of from node to each state
+    :return: float64 array over edge states, inf where there is no route
+    """
+    offsets, sources, targets, turn_masks = graph.offsets, graph.sources, graph.targets, graph.turn_masks
+    in_offsets, in_edges = graph.in_offsets, graph.in_edges
+    dist = array('d', [float('inf')]) * graph.edge_count
+    heap = []
+    if backward:
+        # Arriving at node by any road costs nothing more
+        for edge in in_edges[in_offsets[node]:in_offsets[node + 1]]:
+            dist[edge] = 0.0
+            heap.append((0.0, edge))
+    else:
+        mask = graph.departure_masks[node]
+        edge = offsets[node]
+        while mask:
+            if mask & 1:
+                dist[edge] = costs[edge]
+                heap.append((costs[edge], edge))
+            mask >>= 1
+            edge += 1
+    heapq.heapify(heap)
+    heappush, heappop = heapq.heappush, heapq.heappop
+
+    while heap:
+        distance, edge = heappop(heap)
+        if distance > dist[edge]:
+            continue
+        if backward:
+            # Every state that may turn into this one reaches node through it
+            through = sources[edge]
+            bit = edge - offsets[through]
+            previous_distance = distance + costs[edge]
+            for previous in in_edges[in_offsets[through]:in_offsets[through + 1]]:
+                if turn_masks[previous] >> bit & 1 and previous_distance < dist[previous]:
+                    dist[previous] = previous_distance
+                    heappush(heap, (previous_distance, previous))
+        else:
+            mask = turn_masks[edge]
+            next_edge = offsets[targets[edge]]
+            while mask:
+                if mask & 1:
+                    next_distance = distance + costs[next_edge]
+                    if next_distance < dist[next_edge]:
+                        dist[next_edge] = next_distance
+                        heappush(heap, (next_distance, next_edge))
+                mask >>= 1
+                next_edge += 1
+    return np.frombuffer(dist, dtype=np.float64)
+
+# A query's bounds are computed lazily, for blocks of 2 ** BOUND_BLOCK_BITS consecutive edge states
+BOUND_BLOCK_BITS = 9
+BOUND_BLOCK_MASK = (1 << BOUND_BLOCK_BITS) - 1
+
+class Landmarks:
+    """
+    ALT preprocessing: turn-aware distances from and to a few landmarks, for
+    A* lower bounds from the triangle inequality.
+
+    Distances are kept per edge state, so the bounds know about one-way roads,
+    closures and turn bans, and are much tighter than straight-line distance
+    where those force detours. For a state e, a goal t and a landmark L, the
+    route from e to t cannot be cheaper than dist(e -> L) minus the most it
+    can cost to get from t to L, or dist(L -> t) minus dist(L -> e). The
+    larger of these over the landmarks is a consistent A* heuristic.
+
+    The bounds stay valid while roads only get slower or close, but a speed
+    increase or a reopened road can make them overestimate, so the landmarks
+    must be rebuilt after such updates (version tells which map they match).
+    """
+
+    # Landmarks used per query, picked by the bound they give at the start
+    ACTIVE = 4
+
+    def __init__(self, graph, cost, nodes, forward, backward):
+        self.graph = graph
+        # Map version the distances match
+        self.version = graph.version
+        self.cost = cost
+        # Landmark intersection indices
+        self.nodes = list(nodes)
+        # float32 arrays of shape (landmarks, edge states): cost from each landmark to
+        # the state, and from the state to arriving at the landmark
+        self.forward = forward
+        self.backward = backward
+        # Absolute error the float32 rounding can add to a bound
+        finite = np.concatenate([forward[np.isfinite(forward)], backward[np.isfinite(backward)]])
+        self.slack = float(finite.max()) * 2 * np.finfo(np.float32).eps if len(finite) else 0.0
+
+    @classmethod
+    def build(cls, town_map, cost='time', landmarks=None, count=8):
+        """
+        Compute landmark distances for a map
+        :param town_map: TownMap or CompiledMap object
+        :param cost: 'hops', 'distance' or 'time'
+        :param landmarks: Intersection IDs to use, 'farthest' to pick count of them by
+                          farthest-point selection, or None for the map's own landmarks
+                          (farthest-point selection if it has none)
+        :param count: Number of landmarks picked by farthest-point selection
+        :return: Landmarks
+        """
+        graph = town_map.compile()
+        costs = graph.edge_costs(cost)
+        if landmarks is None:
+            landmarks = [node for node in getattr(town_map, 'landmarks', {}) if node in graph.node_index]
+            if not landmarks:
+                landmarks = 'farthest'
+
+        forward, backward = [], []
+        if landmarks == 'farthest':
+            nodes = []
+            targets = np.frombuffer(graph.targets, dtype=np.int64)
+
+            def round_trip(node):
+                """Distances from and to node, and the cheapest round trip from it to each intersection"""
+                from_node = _state_distances(graph, costs, node)
+                to_node = _state_distances(graph, costs, node, backward=True)
+                trip = np.full(graph.node_count, np.inf)
+                np.minimum.at(trip, targets, from_node + to_node)
+                trip[node] = 0
+                return from_node, to_node, trip
+
+            # Start from the intersection farthest from an arbitrary one, then keep adding
+            # the one farthest from all landmarks so far, among those they can reach
+            nearest = round_trip(0)[2]
+            while len(nodes) < min(count, graph.node_count):
+                candidates = np.where(np.isfinite(nearest), nearest, -1)
+                node = int(np.argmax(candidates))
+                if candidates[node] <= 0:
+                    break
+                from_node, to_node, trip = round_trip(node)
+                nodes.append(node)
+                forward.append(from_node)
+                backward.append(to_node)
+                nearest = trip if len(nodes) == 1 else np.minimum(nearest, trip)
+        else:
+            nodes = [graph.node_index[node] for node in landmarks]
+            for node in nodes:
+                forward.append(_state_distances(graph, costs, node))
+                backward.append(_state_distances(graph, costs, node, backward=True))
+
+        shape = (len(nodes), graph.edge_count)
+        return cls(graph, cost, nodes,
+                   np.array(forward, dtype=np.float32).reshape(shape),
+                   np.array(backward, dtype=np.float32).reshape(shape))
+
+    def save(self, path):
+        """Write the landmark distances to a .npz file"""
+        np.savez_compressed(path, cost=np.array(self.cost), fingerprint=np.array(self.graph.fingerprint(self.cost)),
+                            nodes=np.array(self.nodes, dtype=np.int64),
+                            forward=self.forward, backward=self.backward)
+
+    @classmethod
+    def load(cls, path, town_map):
+        """
+        Read landmark distances written by save()
+        :param path: .npz file
+        :param town_map: The TownMap or CompiledMap they were built from
+        :raises ValueError: If the map's roads, turn rules or costs differ from those they were built on
+        :return: Landmarks
+        """
+        graph = town_map.compile()
+        with np.load(path) as data:
+            if 'fingerprint' not in data or str(data['fingerprint']) != graph.fingerprint(str(data['cost'])):
+                raise ValueError(f"{path} was built for a different map or different traffic")
+            return cls(graph, str(data['cost']), data['nodes'].tolist(), data['forward'], data['backward'])
+
+    def landmark_ids(self):
+        """Get the landmark intersection IDs"""
+        return [self.graph.node_ids[node] for node in self.nodes]
+
+    def _goal_columns(self, goal_index):
+        """
+        The most the goal can cost to leave for each landmark, and the least it costs to reach from it
+        :return: (to_landmark, from_landmark) float64 arrays of shape (landmarks, 1)
+        """
+        graph = self.graph
+        entering = np.frombuffer(graph.in_edges, dtype=np.int64)[graph.in_offsets[goal_index]:
+                                                                 graph.in_offsets[goal_index + 1]]
+        to_landmark = self.backward[:, entering].astype(np.float64).max(axis=1, keepdims=True)
+        from_landmark = self.forward[:, entering].astype(np.float64).min(axis=1, keepdims=True)
+        return to_landmark, from_landmark
+
+    def _bounds(self, columns, rows, states):
+        """Lower bounds towards the goal from some states, per landmark row, given the goal's columns for those rows"""
+        to_landmark, from_landmark = columns
+        with np.errstate(invalid='ignore'):
+            # inf - inf says nothing; fmax skips those NaNs
+            return np.fmax(self.backward[rows, states] - to_landmark, from_landmark - self.forward[rows, states])
+
+    def heuristic(self, start, goal):
+        """
+        Build the A* heuristic for one query from the landmarks that bound it best
+        :param start: Start node
+        :param goal: Goal node
+        :return: Function edge state -> lower bound of the remaining cost
+        """
+        graph = self.graph
+        start_index, goal_index = graph.node_index[start], graph.node_index[goal]
+        if not self.nodes or graph.in_offsets[goal_index] == graph.in_offsets[goal_index + 1]:
+            return lambda edge: 0
+        to_landmark, from_landmark = self._goal_columns(goal_index)
+        departing = slice(graph.offsets[start_index], graph.offsets[start_index + 1])
+        at_start = np.nan_to_num(self._bounds((to_landmark, from_landmark), slice(None), departing),
+                                 nan=0.0, posinf=0.0)
+        rows = np.argsort(-at_start.max(axis=1, initial=0.0), kind='stable')[:self.ACTIVE]
+        columns = (to_landmark[rows], from_landmark[rows])
+        slack = self.slack
+        # Bounds are worked out only for the blocks of states the search reaches,
+        # never for the whole map
+        blocks = {}
+
+        def heuristic(edge):
+            block = edge >> BOUND_BLOCK_BITS
+            bounds = blocks.get(block)
+            if bounds is None:
+                states = slice(block << BOUND_BLOCK_BITS, (block + 1) << BOUND_BLOCK_BITS)
+                bounds = np.fmax.reduce(self._bounds(columns, rows, states), axis=0)
+                bounds = blocks[block] = np.fmax(bounds - slack, 0.0)
+            return bounds.item(edge & BOUND_BLOCK_MASK)
+        return heuristic
+
+    def query(self, start, goal, stats=None):
+        """
+        Find the cheapest path with A* over these landmark bounds
+        :param start: Start node
+        :param goal: Goal node
+        :param stats: Optional dict, receives the number of expanded states under 'expanded'
+                      and the other SearchProbe counters
+        :return: Cheapest path list, or None if unreachable
+        """
+        return astar_shortest_path_with_turns(self.graph, start, goal, self.cost, stats, self)
+
+# Example usage
+if __name__ == "__main__":
+    from town_map import TownMap
+    town = TownMap('complex_town_map.json')
+    landmarks = Landmarks.build(town, 'time')
+    print(f"Landmarks: {landmarks.landmark_ids()}")
+    for name, search in (('A*', lambda stats: astar_shortest_path_with_turns(town, '0', '44', 'time', stats)),
+                         ('ALT', lambda stats: landmarks.query('0', '44', stats))):
+        stats = {}
+        path = search(stats)
+        print(f"{name}: {path} ({stats['expanded']} states expanded)")
@@ -0,0 +1,86 @@
+import json
+
+_WHITESPACE = ' \t\n\r'
+
+class _ChunkedReader:
+    """Incremental JSON tokenizer over a text file read in fixed-size chunks"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Drop consumed text and append the next chunk"""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        """Get the next non-whitespace character without consuming it ('' at end of file)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Malformed map JSON: expected {char!r} near {self.buffer[self.pos:self.pos + 20]!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode one complete JSON value, reading more of the file until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number or literal touching the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+def iter_map_sections(map_file, chunk_size=1 << 16):
+    """
+    Stream a map JSON file without holding the whole document in memory.
+    Top-level objects (intersections, road_types, traffic_restrictions,
+    landmarks, metadata) are yielded one member at a time; other values whole.
+    :param map_file: Path to a map JSON file
+    :param chunk_size: Characters read per chunk
+    :return: Generator of (section, key, value); key is None for non-object sections
+    """
+    with open(map_file, 'r', encoding='utf-8') as f:
+        reader = _ChunkedReader(f, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            section = reader.value()
+            reader.expect(':')
+            if reader.peek() == '{':
+                reader.expect('{')
+                if reader.peek() != '}':
+                    while True:
+                        key = reader.value()
+                        reader.expect(':')
+                        yield section, key, reader.value()
+                        if reader.peek() != ',':
+                            break
+                        reader.expect(',')
+                reader.expect('}')
+            else:
+                yield section, None, reader.value()
+            if reader.peek() != ',':
+                break
+            reader.expect(',')
+        reader.expect('}')
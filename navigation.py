@@ -1,21 +1,487 @@
 import random
+import time
+import warnings
+from collections import OrderedDict
+import numpy as np
 from town_map import TownMap
-from pathfinding import bfs_shortest_path_with_turns
+from traffic_profiles import minutes_of_day
+from pathfinding import COST_MODES, find_path, ShortestPathTree
+from alternatives import find_alternatives
+from isochrones import Isochrones
+from contraction import ContractionHierarchy
+from landmarks import Landmarks
+from overlay import Partition, Overlay
+from tour import plan_tour
+from route_cache import RouteCache
+from compiled_map import TrafficChanges
+from search_stats import SearchProfiler
+import worker_pool
 
 class NavigationSystem:
-    def __init__(self, map_file):
+    def __init__(self, map_file, cache_size=1024, cache_ttl=None, tree_cache_size=16, validate=True,
+                 profile=False):
         self.town_map = TownMap(map_file)
-        
-    def find_route(self, start, goal):
+        # Connectivity report from load time; warns about areas routes cannot get in or out of
+        self.connectivity_report = None
+        # Whether route queries first rule out unreachable pairs with the connectivity
+        # analysis, which update_traffic then keeps current
+        self.connectivity_checks = validate
+        if validate:
+            self.connectivity_report = self.town_map.validate()
+            if self.connectivity_report['isolated']:
+                areas = '; '.join(', '.join(area) for area in self.connectivity_report['isolated'])
+                warnings.warn(f"{map_file}: intersections cut off from the main road network: {areas}")
+        # Contraction Hierarchies by cost mode, used by find_route when present
+        self.hierarchies = {}
+        # ALT landmark distances by cost mode, used by find_route when there is no hierarchy
+        self.landmarks = {}
+        # Multi-level overlays by cost mode over one partition of the map, re-customized
+        # after traffic updates so find_route keeps using them
+        self.partition = None
+        self.overlays = {}
+        self.route_cache = RouteCache(cache_size, cache_ttl)
+        # Map version each cost mode's routes last changed at, so cached routes, trees and
+        # preprocessing survive updates that cannot affect them; synced_version is the map
+        # version these were last brought up to date for
+        self.route_versions = dict.fromkeys(COST_MODES, self.town_map.version)
+        self.synced_version = self.town_map.version
+        # Shortest-path trees by (start, cost mode), kept current across traffic updates
+        self.tree_cache_size = tree_cache_size
+        self.trees = OrderedDict()
+        # Traffic changes not yet repaired into a cached tree, merged per tree key, so a
+        # tree is repaired once when next used however many batches arrived meanwhile
+        self.tree_changes = {}
+        # Per-engine histograms of find_route searches, kept only when profiling
+        self.profiler = SearchProfiler() if profile else None
+
+    def update_traffic(self, speed_limits=None, closed=None, reopened=None):
+        """
+        Apply a batch of live speed changes and road closures. Routing uses the
+        new weights right away. Cached routes, trees, hierarchies and landmarks
+        for cost modes the batch cannot affect (speed changes only matter to
+        "time") stay valid. Affected shortest-path trees are repaired
+        incrementally the next time they are used, once for all the batches
+        since, instead of being rebuilt.
+        :param speed_limits: Dict of road key ("from-to") -> new speed limit
+        :param closed: Road keys to close
+        :param reopened: Road keys to reopen
+        :return: Number of cached trees waiting for a repair
+        """
+        self._sync_versions()
+        version = self.town_map.version
+        changes = self.town_map.update_traffic(speed_limits, closed, reopened)
+        new_version = self.town_map.version
+        if new_version == version:
+            return 0
+        if self.connectivity_checks:
+            # Rebuilt once per batch here rather than by the next route query
+            self.town_map.connectivity()
+        graph = self.town_map.compile() if changes is not None else None
+        affected = {cost for cost in COST_MODES if changes is None or changes.affects(cost)}
+        for cost in affected:
+            self.route_versions[cost] = new_version
+        self.synced_version = new_version
+
+        for key, tree in list(self.trees.items()):
+            pending = self.tree_changes.get(key)
+            if graph is None or tree.graph is not graph or (tree.version != version and pending is None):
+                del self.trees[key]
+                self.tree_changes.pop(key, None)
+            elif pending is not None:
+                pending.merge(changes)
+            elif key[1] in affected:
+                self.tree_changes[key] = TrafficChanges().merge(changes)
+            else:
+                tree.version = new_version
+        for overlay in self.overlays.values():
+            if changes is not None and overlay.version == version and overlay.graph is graph:
+                overlay.customize(changes)
+        for prepared in (self.hierarchies, self.landmarks):
+            for cost, structure in prepared.items():
+                if cost not in affected and structure.version == version:
+                    structure.version = new_version
+        return len(self.tree_changes)
+
+    def _sync_versions(self):
+        """Treat every cost mode as changed if the map changed other than through update_traffic"""
+        version = self.town_map.version
+        if version != self.synced_version:
+            self.route_versions = dict.fromkeys(COST_MODES, version)
+            self.synced_version = version
+            self.tree_changes.clear()
+
+    def _cached_tree(self, start, cost):
+        """
+        Get the cached tree for (start, cost) if it is current, repairing it
+        first if traffic changed since it was last used
+        :return: ShortestPathTree, or None
+        """
+        self._sync_versions()
+        key = (start, cost)
+        tree = self.trees.get(key)
+        if tree is None:
+            return None
+        changes = self.tree_changes.pop(key, None)
+        if changes is not None:
+            tree.repair(changes)
+        return tree if tree.version == self.town_map.version else None
+
+    def route_tree(self, start, cost="time"):
+        """
+        Get the shortest-path tree from start to every intersection, cached so
+        find_route from the same start is a lookup
+        :param start: Start point ID
+        :param cost: What to minimize: "hops", "distance" or "time"
+        :return: ShortestPathTree
+        """
+        if cost not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {cost}")
+        key = (start, cost)
+        tree = self._cached_tree(start, cost)
+        if tree is None:
+            tree = self.trees[key] = ShortestPathTree(self.town_map, start, cost)
+            self.tree_changes.pop(key, None)
+        self.trees.move_to_end(key)
+        while len(self.trees) > self.tree_cache_size:
+            self.tree_changes.pop(self.trees.popitem(last=False)[0], None)
+        return tree
+
+    def build_hierarchy(self, cost="time", path=None):
+        """
+        Preprocess a Contraction Hierarchy so find_route can answer this cost mode quickly
+        :param cost: "hops", "distance" or "time"
+        :param path: Optional .npz file to save the hierarchy to
+        :return: ContractionHierarchy
+        """
+        hierarchy = ContractionHierarchy.build(self.town_map, cost)
+        if path is not None:
+            hierarchy.save(path)
+        self.hierarchies[cost] = hierarchy
+        return hierarchy
+
+    def load_hierarchy(self, path):
+        """
+        Load a Contraction Hierarchy saved by build_hierarchy
+        :param path: .npz file
+        :return: ContractionHierarchy
+        """
+        hierarchy = ContractionHierarchy.load(path, self.town_map)
+        self.hierarchies[hierarchy.cost] = hierarchy
+        return hierarchy
+
+    def build_landmarks(self, cost="time", landmarks=None, count=8, path=None):
+        """
+        Precompute landmark distances so find_route can run A* with ALT bounds for this cost mode
+        :param cost: "hops", "distance" or "time"
+        :param landmarks: Intersection IDs, "farthest", or None for the map's own landmarks
+        :param count: Number of landmarks for farthest-point selection
+        :param path: Optional .npz file to save the distances to
+        :return: Landmarks
+        """
+        if cost not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {cost}")
+        table = Landmarks.build(self.town_map, cost, landmarks, count)
+        if path is not None:
+            table.save(path)
+        self.landmarks[cost] = table
+        return table
+
+    def load_landmarks(self, path):
+        """
+        Load landmark distances saved by build_landmarks
+        :param path: .npz file
+        :return: Landmarks
+        """
+        table = Landmarks.load(path, self.town_map)
+        self.landmarks[table.cost] = table
+        return table
+
+    def build_overlay(self, cost="time", cell_sizes=None, path=None):
+        """
+        Customize a multi-level overlay so find_route can answer this cost mode
+        quickly, partitioning the map first unless a partition of it exists
+        :param cost: "hops", "distance" or "time"
+        :param cell_sizes: Largest cell per level, smallest first; a new value partitions again
+        :param path: Optional .npz file to save the partition to
+        :return: Overlay
+        """
+        if cost not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {cost}")
+        if cell_sizes is not None or self.partition is None or self.partition.graph is not self.town_map.compile():
+            self.partition = Partition.build(self.town_map, cell_sizes)
+        if path is not None:
+            self.partition.save(path)
+        overlay = self.overlays[cost] = Overlay(self.partition, cost)
+        return overlay
+
+    def load_overlay(self, path, cost="time"):
+        """
+        Load a partition saved by build_overlay and customize an overlay on it
+        :param path: .npz file
+        :param cost: "hops", "distance" or "time"
+        :return: Overlay
+        """
+        if cost not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {cost}")
+        self.partition = Partition.load(path, self.town_map)
+        overlay = self.overlays[cost] = Overlay(self.partition, cost)
+        return overlay
+
+    def find_route(self, start, goal, cost="hops", bidirectional=False, depart_at=None):
         """
         Find the shortest path from start to goal
         :param start: Start point ID
         :param goal: Goal point ID
-        :return: Shortest path list
+        :param cost: What to minimize: "hops", "distance" or "time"
+        :param bidirectional: Search from both ends at once
+        :param depart_at: Departure time (minutes after midnight or "HH:MM"); if given, find the
+                          fastest route under time-of-day speeds and traffic light waits instead
+        :return: Shortest path tuple, or None if unreachable
         """
-        # Use BFS to find the shortest path, considering turn restrictions
-        return bfs_shortest_path_with_turns(self.town_map, start, goal)
-    
+        if cost not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {cost}")
+        if depart_at is not None:
+            depart_at = minutes_of_day(depart_at)
+            key = (start, goal, "time", depart_at)
+        else:
+            key = (start, goal, cost)
+        self._sync_versions()
+        version = self.route_versions[key[2]]
+        path = self.route_cache.get(key, version)
+        if path is not RouteCache.MISS:
+            if self.profiler is not None:
+                self.profiler.cache_hits += 1
+            return path
+        if self.profiler is None:
+            return self.route_cache.put(key, self._search(start, goal, cost, bidirectional, depart_at), version)
+        stats = {}
+        began = time.perf_counter()
+        path = self._search(start, goal, cost, bidirectional, depart_at, stats)
+        self.profiler.record(stats, (time.perf_counter() - began) * 1000)
+        return self.route_cache.put(key, path, version)
+
+    def find_routes(self, start, goals, cost="time"):
+        """
+        Find routes from one start to many goals, with at most one search for
+        all the goals that are not cached or ruled out by connectivity
+        :param start: Start point ID
+        :param goals: Goal point IDs
+        :param cost: What to minimize: "hops", "distance" or "time"
+        :return: Dict of goal -> path tuple, or None if unreachable
+        """
+        if cost not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {cost}")
+        self._sync_versions()
+        version = self.route_versions[cost]
+        routes, missing = {}, []
+        for goal in dict.fromkeys(goals):
+            path = self.route_cache.get((start, goal, cost), version)
+            if path is RouteCache.MISS:
+                missing.append(goal)
+            else:
+                routes[goal] = path
+                if self.profiler is not None:
+                    self.profiler.cache_hits += 1
+        if len(missing) <= 1:
+            for goal in missing:
+                routes[goal] = self.find_route(start, goal, cost)
+            return routes
+
+        stats = {} if self.profiler is not None else None
+        began = time.perf_counter()
+        tree = self._cached_tree(start, cost)
+        if tree is None:
+            # One Dijkstra that stops once every missing goal is settled
+            tree = ShortestPathTree(self.town_map, start, cost, missing, stats)
+            engine = 'one_to_many'
+        else:
+            engine = 'tree'
+            if stats is not None:
+                stats['expanded'] = 0
+        for goal in missing:
+            routes[goal] = self.route_cache.put((start, goal, cost), tree.path_to(goal), version)
+        if stats is not None:
+            stats['engine'] = engine
+            self.profiler.record(stats, (time.perf_counter() - began) * 1000)
+        return routes
+
+    def _search(self, start, goal, cost, bidirectional, depart_at=None, stats=None):
+        """Run the best available search for a cost mode, filling stats with its counters if given"""
+        path = self._answer_locally(start, goal, cost, depart_at, stats)
+        if path is not RouteCache.MISS:
+            return path
+        if depart_at is not None:
+            return find_path(self.town_map, start, goal, "time", depart_at=depart_at, stats=stats)
+        return worker_pool.route(self.town_map, start, goal, cost, self._current_engines(cost), bidirectional, stats)
+
+    def _answer_locally(self, start, goal, cost, depart_at=None, stats=None):
+        """
+        Answer a query without a search if the connectivity analysis rules it
+        out or a cached shortest-path tree covers it
+        :return: Path, None if unreachable, or RouteCache.MISS if it needs a search
+        """
+        # Pairs in incompatible components need no search at all. The analysis is never
+        # rebuilt here: after changes made outside update_traffic the check is skipped.
+        analysis = self.town_map.connectivity(rebuild=False) if self.connectivity_checks else None
+        if analysis is not None and analysis.unreachable(start, goal):
+            if stats is not None:
+                stats.update(engine='connectivity', expanded=0)
+            return None
+        if depart_at is None:
+            tree = self._cached_tree(start, cost)
+            if tree is not None:
+                if stats is not None:
+                    stats.update(engine='tree', expanded=0)
+                return tree.path_to(goal)
+        return RouteCache.MISS
+
+    def find_alternatives(self, start, goal, k=3, max_overlap=0.5, max_stretch=1.4, cost="time"):
+        """
+        Find the best route and up to k - 1 meaningfully different alternatives
+        :param start: Start point ID
+        :param goal: Goal point ID
+        :param k: Maximum number of routes, including the best one
+        :param max_overlap: Largest fraction of a route's cost it may share with another returned route
+        :param max_stretch: Largest allowed cost relative to the best route
+        :param cost: What to minimize: "hops", "distance" or "time"
+        :return: List of path tuples, best first; empty if unreachable
+        """
+        if cost not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {cost}")
+        return [tuple(path) for path in
+                find_alternatives(self.town_map, start, goal, k, max_overlap, max_stretch, cost)]
+
+    def isochrones(self, start, budgets, cost="time"):
+        """
+        Find everything reachable from start within one or more cost budgets, in one search
+        :param start: Start point ID
+        :param budgets: Cost budgets, e.g. [2, 5, 10] minutes for "time"
+        :param cost: What to measure: "hops", "distance" or "time"
+        :return: Isochrones with reachable(budget), bands() and polygon(budget), a convex outline
+        """
+        if cost not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {cost}")
+        return Isochrones(self.town_map, start, budgets, cost)
+
+    def distance_matrix(self, sources, targets, cost="time", return_paths=False, workers=None):
+        """
+        Compute route costs between every source and every target, with one
+        turn-aware one-to-many search per source
+        :param sources: Source point IDs
+        :param targets: Target point IDs
+        :param cost: What to minimize: "hops", "distance" or "time"
+        :param return_paths: Also return the routes
+        :param workers: Number of processes to spread sources over (default: this process)
+        :return: numpy array of shape (len(sources), len(targets)) with inf for unreachable
+                 pairs; with return_paths, (array, paths) where paths[i][j] is a tuple or None
+        """
+        if cost not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {cost}")
+        sources, targets = list(sources), list(targets)
+        graph = self.town_map.compile()
+        if workers and workers > 1 and len(sources) > 1:
+            with worker_pool.open_pool(graph, workers) as pool:
+                rows = list(pool.map(worker_pool._distance_row_task, sources,
+                                     [targets] * len(sources), [cost] * len(sources),
+                                     [return_paths] * len(sources),
+                                     chunksize=max(1, len(sources) // (workers * 4))))
+        else:
+            rows = [worker_pool.distance_row(graph, source, targets, cost, return_paths) for source in sources]
+
+        matrix = np.array([row for row, _ in rows], dtype=np.float64).reshape(len(sources), len(targets))
+        if return_paths:
+            return matrix, [paths for _, paths in rows]
+        return matrix
+
+    def plan_tour(self, start, stops, end=None, cost="time", time_limit=0.5):
+        """
+        Plan a route from start through every stop, choosing the visiting order
+        :param start: Start point ID
+        :param stops: Point IDs to visit, in any order
+        :param end: Point ID to finish at (start for a round trip), or None to end at the last stop
+        :param cost: What to minimize: "hops", "distance" or "time"
+        :param time_limit: Seconds to spend improving the visiting order
+        :return: Dict with 'order', 'path' (tuple), 'legs' (tuples) and 'cost', or None if a stop is unreachable
+        """
+        if cost not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {cost}")
+        # The cost matrix is a many-to-many search over the hierarchy when there is a current one
+        tour = plan_tour(self.town_map, start, stops, end, cost, time_limit, self._current_engines(cost).get('hierarchy'))
+        if tour is not None:
+            tour['path'] = tuple(tour['path'])
+            tour['legs'] = [tuple(leg) for leg in tour['legs']]
+        return tour
+
+    def _current_engines(self, cost):
+        """Preprocessed engines for a cost mode that still match the map, as taken by worker_pool.route"""
+        engines = {}
+        for name, engine in (('hierarchy', self.hierarchies.get(cost)), ('overlay', self.overlays.get(cost)),
+                             ('landmarks', self.landmarks.get(cost))):
+            if engine is not None and engine.version == self.town_map.version:
+                engines[name] = engine
+        return engines
+
+    def route_batch(self, pairs, cost="hops", workers=None, ordered=True):
+        """
+        Route many (start, goal) pairs, optionally across a process pool. Both
+        ways return the same paths as find_route: pairs the route cache, a
+        cached shortest-path tree or the connectivity analysis can answer are
+        answered in this process, and the workers search the rest with the
+        same engines find_route would use. Worker results go into the route
+        cache; the profiler only sees searches run in this process.
+        :param pairs: Iterable of (start, goal)
+        :param cost: What to minimize: "hops", "distance" or "time"
+        :param workers: Number of worker processes (default: route in this process)
+        :param ordered: Yield results in input order; otherwise as they complete
+        :raises ValueError: If the cost mode is unknown, when called rather than when iterated
+        :return: Generator of (start, goal, path tuple or None)
+        """
+        if cost not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {cost}")
+        if not workers or workers <= 1:
+            return ((start, goal, self.find_route(start, goal, cost)) for start, goal in pairs)
+        return self._route_pooled(list(pairs), cost, workers, ordered)
+
+    def _route_pooled(self, pairs, cost, workers, ordered):
+        self._sync_versions()
+        version = self.route_versions[cost]
+        local, remote = {}, []
+        for index, (start, goal) in enumerate(pairs):
+            path = self.route_cache.get((start, goal, cost), version)
+            if path is not RouteCache.MISS:
+                if self.profiler is not None:
+                    self.profiler.cache_hits += 1
+            else:
+                path = self._answer_locally(start, goal, cost)
+                if path is RouteCache.MISS:
+                    remote.append((start, goal))
+                    continue
+                path = self.route_cache.put((start, goal, cost), path, version)
+            local[index] = path
+
+        if not remote:
+            for index, (start, goal) in enumerate(pairs):
+                yield start, goal, local[index]
+            return
+        if not ordered:
+            for index, path in local.items():
+                yield pairs[index][0], pairs[index][1], path
+        with worker_pool.open_pool(self.town_map, workers, self._current_engines(cost)) as pool:
+            chunks = [remote[i:i + worker_pool.BATCH_CHUNK] for i in range(0, len(remote), worker_pool.BATCH_CHUNK)]
+            futures = [pool.submit(worker_pool._route_task, chunk, cost) for chunk in chunks]
+            routed = (route for future in (futures if ordered else worker_pool.as_completed(futures))
+                      for route in future.result())
+            if not ordered:
+                for start, goal, path in routed:
+                    yield start, goal, self.route_cache.put((start, goal, cost), path, version)
+                return
+            for index, (start, goal) in enumerate(pairs):
+                if index in local:
+                    yield start, goal, local[index]
+                else:
+                    start, goal, path = next(routed)
+                    yield start, goal, self.route_cache.put((start, goal, cost), path, version)
+
     def random_route(self):
         """
         Randomly select a start and goal point, and calculate the shortest path
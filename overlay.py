@@ -0,0 +1,479 @@
+import heapq
+from array import array
+import numpy as np
+from pathfinding import _heuristic
+from search_stats import SearchProbe
+
+def _bisect(nodes, us, vs, xs, ys, rank, balance):
+    """
+    Split nodes in two along x or y near the median, at the position where
+    the fewest roads between them cross
+    :param us, vs: Ends of the roads with both ends in nodes
+    :param rank: Scratch array over all intersections
+    :return: (left half, right half) as index arrays
+    """
+    count = len(nodes)
+    low = max(1, int(count * (0.5 - balance)))
+    high = max(low, min(count - 1, int(count * (0.5 + balance))))
+    best = None
+    for primary, secondary in ((xs, ys), (ys, xs)):
+        order = nodes[np.lexsort((secondary[nodes], primary[nodes]))]
+        rank[order] = np.arange(count)
+        first = np.minimum(rank[us], rank[vs])
+        last = np.maximum(rank[us], rank[vs])
+        # cuts[k]: roads with one end among the first k nodes and the other after them
+        cuts = np.cumsum(np.bincount(first + 1, minlength=count + 1) - np.bincount(last + 1, minlength=count + 1))
+        candidates = np.arange(low, high + 1)
+        scores = cuts[candidates] * count + np.abs(candidates - count // 2)
+        split = candidates[np.argmin(scores)]
+        score = scores.min()
+        if best is None or score < best[0]:
+            best = (score, order[:split], order[split:])
+    return best[1], best[2]
+
+def _group(edges, keys, count):
+    """Lists of edges by key 0..count-1, each in increasing edge order"""
+    order = np.argsort(keys, kind='stable')
+    bounds = np.searchsorted(keys[order], np.arange(count + 1))
+    edges = edges[order].tolist()
+    return [edges[bounds[key]:bounds[key + 1]] for key in range(count)]
+
+class Partition:
+    """
+    Nested multi-level partition of a map's intersections into cells, the
+    metric-independent half of a multi-level overlay.
+
+    It depends only on positions and which roads exist, not on speeds,
+    closures or cost modes, so it is built once per map. Level 0 has the
+    smallest cells and every cell lies inside one cell of the next level.
+    Cells come from recursive bisection: each split is along x or y near the
+    median, at the position where the fewest roads cross.
+
+    A road (directed edge) whose ends lie in different cells of a level is
+    a boundary edge there: an entry of the cell it leads into and an exit of
+    the cell it leaves. Being a boundary edge at one level implies being one
+    at every level below.
+    """
+
+    # Largest number of intersections per cell, smallest level first; levels
+    # whose cells would hold the whole map are dropped
+    CELL_SIZES = (32, 256, 2048, 16384)
+    # Splits are looked for this far either side of the median, as a fraction of the cell
+    BALANCE = 0.1
+
+    def __init__(self, graph, cells):
+        self.graph = graph
+        # cells[level][node] = cell of that intersection at that level
+        self.cells = [array('q', level.tolist()) for level in cells]
+        self.cell_counts = [int(level.max()) + 1 if len(level) else 0 for level in cells]
+        # parents[level][cell] = cell of the next level up containing it (not kept for the top level)
+        self.parents = []
+        # children[level][cell] = cells one level down inside it (empty for level 0)
+        self.children = [[[] for _ in range(self.cell_counts[0])]] if cells else []
+        for level in range(len(cells) - 1):
+            parents = np.zeros(self.cell_counts[level], dtype=np.int64)
+            parents[cells[level]] = cells[level + 1]
+            self.parents.append(parents.tolist())
+            children = [[] for _ in range(self.cell_counts[level + 1])]
+            for cell, parent in enumerate(self.parents[level]):
+                children[parent].append(cell)
+            self.children.append(children)
+
+        # entries[level][cell] / exits[level][cell]: boundary edges into / out of each cell
+        sources = np.frombuffer(graph.sources, dtype=np.int64)
+        targets = np.frombuffer(graph.targets, dtype=np.int64)
+        self.entries, self.exits = [], []
+        for level, count in zip(cells, self.cell_counts):
+            source_cells, target_cells = level[sources], level[targets]
+            cut = np.flatnonzero(source_cells != target_cells)
+            self.entries.append(_group(cut, target_cells[cut], count))
+            self.exits.append(_group(cut, source_cells[cut], count))
+
+    @classmethod
+    def build(cls, town_map, cell_sizes=None):
+        """
+        Partition a map's intersections
+        :param town_map: TownMap or CompiledMap object
+        :param cell_sizes: Largest cell per level, smallest first (default CELL_SIZES)
+        :return: Partition
+        """
+        graph = town_map.compile()
+        node_count = graph.node_count
+        sizes = sorted(size for size in (cell_sizes or cls.CELL_SIZES) if size < node_count)
+        xs = np.frombuffer(graph.x, dtype=np.float64)
+        ys = np.frombuffer(graph.y, dtype=np.float64)
+        sources = np.frombuffer(graph.sources, dtype=np.int64)
+        targets = np.frombuffer(graph.targets, dtype=np.int64)
+        roads = sources != targets
+        rank = np.zeros(node_count, dtype=np.int64)
+        side = np.zeros(node_count, dtype=bool)
+
+        cells = [np.zeros(node_count, dtype=np.int64) for _ in sizes]
+        counts = [0] * len(sizes)
+        stack = [(np.arange(node_count), sources[roads], targets[roads], len(sizes) - 1)] if sizes else []
+        while stack:
+            nodes, us, vs, level = stack.pop()
+            if len(nodes) <= sizes[level]:
+                cells[level][nodes] = counts[level]
+                counts[level] += 1
+                if level:
+                    stack.append((nodes, us, vs, level - 1))
+                continue
+            left, right = _bisect(nodes, us, vs, xs, ys, rank, cls.BALANCE)
+            side[left] = False
+            side[right] = True
+            for half, flag in ((right, True), (left, False)):
+                inside = (side[us] == flag) & (side[vs] == flag)
+                stack.append((half, us[inside], vs[inside], level))
+        return cls(graph, cells)
+
+    def save(self, path):
+        """Write the partition to a .npz file"""
+        np.savez_compressed(path, fingerprint=np.array(self.graph.fingerprint()),
+                            cells=np.array([level.tolist() for level in self.cells], dtype=np.int64)
+                            .reshape(len(self.cells), self.graph.node_count))
+
+    @classmethod
+    def load(cls, path, town_map):
+        """
+        Read a partition written by save()
+        :param path: .npz file
+        :param town_map: The TownMap or CompiledMap it was built from; speeds and
+                         closures may have changed since, as the cells do not depend on them
+        :raises ValueError: If the map's intersections or roads differ from those it was built on
+        :return: Partition
+        """
+        graph = town_map.compile()
+        with np.load(path) as data:
+            if 'fingerprint' not in data or str(data['fingerprint']) != graph.fingerprint():
+                raise ValueError(f"{path} was built for a different map")
+            cells = data['cells']
+            return cls(graph, list(cells))
+
+    @property
+    def levels(self):
+        return len(self.cells)
+
+class Overlay:
+    """
+    Multi-level overlay (customizable route planning) over a Partition, the
+    metric-dependent half: for every cell and level, the cheapest cost from
+    each entry to each exit without leaving the cell (its boundary clique).
+
+    Level 0 cliques come from turn-aware searches over the roads inside each
+    cell, and higher levels from the cliques one level down, so every turn
+    restriction stays exact. Customizing takes seconds rather than the
+    minutes of contraction, and after a traffic update only the cells
+    holding a changed road, and the cells above them, are recomputed.
+
+    A query runs A* from the start's open roads. At an intersection whose
+    level-l cell holds neither the start nor the goal, for the highest such
+    l, it follows that cell's clique instead of the roads, so it only walks
+    roads inside the smallest cells around the start and the goal. Clique
+    arcs on the result are unpacked by searching inside their cells again.
+    """
+
+    def __init__(self, partition, cost='time'):
+        """
+        :param partition: Partition of the map
+        :param cost: 'hops', 'distance' or 'time'
+        """
+        self.partition = partition
+        self.graph = partition.graph
+        self.cost = cost
+        # Map version the cliques match; customize() brings it up to date
+        self.version = None
+        # matrices[level][cell]: numpy array of clique costs, entries x exits (inf if no way through)
+        self.matrices = [[None] * count for count in partition.cell_counts]
+        # arcs[level][entry] = [(exit, cost)] with finite costs, the form queries walk
+        self.arcs = [{} for _ in partition.cell_counts]
+        self.customize()
+
+    def customize(self, changes=None):
+        """
+        Recompute the cliques for the map's current speeds and closures
+        :param changes: TrafficChanges from the last update (CompiledMap.update_roads), to
+                        recompute only the cells they touch; None recomputes everything
+        :return: Number of cells recomputed, over all levels
+        """
+        graph, partition = self.graph, self.partition
+        costs = graph.edge_costs(self.cost)
+        if not partition.levels:
+            dirty = set()
+        elif changes is None:
+            dirty = set(range(partition.cell_counts[0]))
+        else:
+            cells = partition.cells[0]
+            # A road's cost counts in the cell it leaves; its turns in the cell it enters
+            dirty = {cells[graph.sources[edge]] for edge in changes.times} if self.cost == 'time' else set()
+            dirty.update(cells[graph.targets[edge]] for edge in changes.turn_masks)
+
+        updated = 0
+        for level in range(partition.levels):
+            if level:
+                dirty = {partition.parents[level - 1][cell] for cell in dirty}
+            for cell in sorted(dirty):
+                self._customize_cell(level, cell, costs)
+            updated += len(dirty)
+        self.version = graph.version
+        return updated
+
+    def _customize_cell(self, level, cell, costs):
+        partition = self.partition
+        entries, exits = partition.entries[level][cell], partition.exits[level][cell]
+        if level == 0:
+            column = {edge: index for index, edge in enumerate(exits)}
+            matrix = np.full((len(entries), len(exits)), np.inf)
+            for row, entry in enumerate(entries):
+                found, _ = self._cell_search(0, cell, entry, costs)
+                for edge, cost in found.items():
+                    matrix[row, column[edge]] = cost
+        else:
+            matrix = self._combine(level, cell)
+        self.matrices[level][cell] = matrix
+
+        arcs = self.arcs[level]
+        for entry, row in zip(entries, matrix.tolist()):
+            arcs[entry] = [(edge, cost) for edge, cost in zip(exits, row) if cost != np.inf]
+
+    def _combine(self, level, cell):
+        """
+        Clique of a cell from the cliques of its subcells, for all entries of
+        the cell at once: label-correcting min-plus products over the
+        subcells' boundary edges, pushing only labels that improved since
+        they last went through their subcell
+        """
+        partition = self.partition
+        entries, exits = partition.entries[level][cell], partition.exits[level][cell]
+        index = {}
+        blocks = []
+        for child in partition.children[level][cell]:
+            child_entries = partition.entries[level - 1][child]
+            child_exits = partition.exits[level - 1][child]
+            if not child_entries or not child_exits:
+                continue
+            blocks.append((np.array([index.setdefault(edge, len(index)) for edge in child_entries]),
+                           np.array([index.setdefault(edge, len(index)) for edge in child_exits]),
+                           self.matrices[level - 1][child]))
+        if not entries or not exits or not blocks:
+            return np.full((len(entries), len(exits)), np.inf)
+
+        # labels[i, s]: cheapest known cost from entry i of the cell to boundary edge s. A
+        # boundary edge is the entry of one subcell only, so one block pushes each label.
+        labels = np.full((len(entries), len(index)), np.inf)
+        labels[np.arange(len(entries)), [index[edge] for edge in entries]] = 0.0
+        pending = np.isfinite(labels)
+        while True:
+            pushed = False
+            for inside, outside, matrix in blocks:
+                waiting = pending[:, inside]
+                rows = np.flatnonzero(waiting.any(axis=1))
+                if not len(rows):
+                    continue
+                pushed = True
+                columns = np.flatnonzero(waiting[rows].any(axis=0))
+                pending[np.ix_(rows, inside)] = False
+                starts = labels[np.ix_(rows, inside[columns])]
+                reach = np.full((len(rows), len(outside)), np.inf)
+                for k, column in enumerate(columns):
+                    np.minimum(reach, starts[:, k, None] + matrix[column], out=reach)
+                current = labels[np.ix_(rows, outside)]
+                better = reach < current
+                if better.any():
+                    labels[np.ix_(rows, outside)] = np.where(better, reach, current)
+                    pending[np.ix_(rows, outside)] |= better
+            if not pushed:
+                break
+        return labels[:, [index[edge] for edge in exits]]
+
+    def _cell_search(self, level, cell, entry, costs, goal=-1):
+        """
+        Dijkstra from an entry of a cell to its exits without leaving it, over
+        the roads inside (level 0) or the cliques one level down
+        :param goal: Stop once this exit is reached
+        :return: (exit -> cost, parent dict)
+        """
+        graph = self.graph
+        offsets, targets, turn_masks = graph.offsets, graph.targets, graph.turn_masks
+        cells = self.partition.cells[level]
+        arcs = self.arcs[level - 1] if level else None
+        remaining = len(self.partition.exits[level][cell])
+        best, parent, found = {entry: 0.0}, {entry: -1}, {}
+        heap = [(0.0, entry)]
+        heappush, heappop = heapq.heappush, heapq.heappop
+        infinity = float('inf')
+        while heap and remaining:
+            cost_so_far, state = heappop(heap)
+            if cost_so_far > best[state]:
+                continue
+            if cells[targets[state]] != cell:
+                found[state] = cost_so_far
+                remaining -= 1
+                if state == goal:
+                    break
+                continue
+
+            if arcs is None:
+                mask = turn_masks[state]
+                next_state = offsets[targets[state]]
+                while mask:
+                    if mask & 1:
+                        next_cost = cost_so_far + costs[next_state]
+                        if next_cost < best.get(next_state, infinity):
+                            best[next_state] = next_cost
+                            parent[next_state] = state
+                            heappush(heap, (next_cost, next_state))
+                    mask >>= 1
+                    next_state += 1
+                continue
+            for next_state, weight in arcs.get(state, ()):
+                next_cost = cost_so_far + weight
+                if next_cost < best.get(next_state, infinity):
+                    best[next_state] = next_cost
+                    parent[next_state] = state
+                    heappush(heap, (next_cost, next_state))
+        return found, parent
+
+    def query(self, start, goal, stats=None):
+        """
+        Find the cheapest path between two intersections
+        :param start: Start node
+        :param goal: Goal node
+        :param stats: Optional dict, receives the number of expanded states under 'expanded'
+                      and the other SearchProbe counters
+        :return: Cheapest path list, or None if unreachable
+        """
+        probe = SearchProbe(stats, 'overlay') if stats is not None else None
+        if start == goal:
+            if probe:
+                probe.finish(None, 0)
+            return [start]
+
+        graph, partition = self.graph, self.partition
+        costs = graph.edge_costs(self.cost)
+        offsets, sources, targets, turn_masks = graph.offsets, graph.sources, graph.targets, graph.turn_masks
+        start_index = graph.node_index[start]
+        goal_index = graph.node_index[goal]
+        heuristic = _heuristic(graph, goal_index, self.cost, states=True)
+        levels = list(zip(partition.cells, self.arcs))[::-1]
+        ends = [(cells[start_index], cells[goal_index]) for cells, _ in levels]
+
+        # parent[state] = (previous state, level of the clique arc taken, or -1 for a turn)
+        best, parent, heap = {}, {}, []
+        push, pop = (probe.heappush, probe.heappop) if probe else (heapq.heappush, heapq.heappop)
+        mask = graph.departure_masks[start_index]
+        for edge in range(offsets[start_index], offsets[start_index + 1]):
+            allowed = mask & 1
+            mask >>= 1
+            if allowed and costs[edge] < best.get(edge, np.inf):
+                best[edge] = costs[edge]
+                parent[edge] = (-1, -1)
+                push(heap, (costs[edge] + heuristic(edge), costs[edge], edge))
+        closed = set()
+        expanded = 0
+        if probe:
+            probe.phase('setup')
+
+        while heap:
+            _, cost_so_far, state = pop(heap)
+            if state in closed:
+                continue
+            closed.add(state)
+            expanded += 1
+            current = targets[state]
+            if current == goal_index:
+                if probe:
+                    probe.phase('search')
+                path = self._unpack(start_index, parent, state, costs)
+                if probe:
+                    closed.discard(state)
+                    probe.finish(graph, expanded, self._turned(closed, levels, ends))
+                return path
+
+            # Highest level whose cell here holds neither end, entered through its boundary
+            steps, step_level = None, -1
+            for level, ((cells, arcs), (start_cell, goal_cell)) in enumerate(zip(levels, ends)):
+                cell = cells[current]
+                if cell != start_cell and cell != goal_cell:
+                    if cells[sources[state]] != cell:
+                        steps, step_level = arcs.get(state, ()), len(levels) - 1 - level
+                    break
+            if steps is None:
+                steps = []
+                mask = turn_masks[state]
+                next_edge = offsets[current]
+                while mask:
+                    if mask & 1:
+                        steps.append((next_edge, costs[next_edge]))
+                    mask >>= 1
+                    next_edge += 1
+
+            for next_state, weight in steps:
+                if next_state in closed:
+                    continue
+                next_cost = cost_so_far + weight
+                if next_cost < best.get(next_state, np.inf):
+                    best[next_state] = next_cost
+                    parent[next_state] = (state, step_level)
+                    push(heap, (next_cost + heuristic(next_state), next_cost, next_state))
+
+        if probe:
+            probe.phase('search')
+            probe.finish(graph, expanded, self._turned(closed, levels, ends))
+        return None
+
+    def _turned(self, states, levels, ends):
+        """
+        Pick the expanded states query() left by a turn rather than a clique arc,
+        by the same rule it uses; only their turns were checked
+        """
+        sources, targets = self.graph.sources, self.graph.targets
+        turned = []
+        for state in states:
+            current = targets[state]
+            for (cells, _), (start_cell, goal_cell) in zip(levels, ends):
+                cell = cells[current]
+                if cell != start_cell and cell != goal_cell:
+                    if cells[sources[state]] != cell:
+                        break
+                    turned.append(state)
+                    break
+            else:
+                turned.append(state)
+        return turned
+
+    def _unpack(self, start_index, parent, state, costs):
+        """Turn the query's chain of turns and clique arcs into the intersections it drives through"""
+        steps = []
+        while state != -1:
+            previous, level = parent[state]
+            steps.append((previous, state, level))
+            state = previous
+        steps.reverse()
+
+        edges = [steps[0][1]]
+        stack = steps[:0:-1]
+        while stack:
+            entry, exit_edge, level = stack.pop()
+            if level < 0:
+                edges.append(exit_edge)
+                continue
+            # Search the cell again for the arc's route one level down
+            cell = self.partition.cells[level][self.graph.targets[entry]]
+            _, cell_parent = self._cell_search(level, cell, entry, costs, exit_edge)
+            chain = [exit_edge]
+            while chain[-1] != entry:
+                chain.append(cell_parent[chain[-1]])
+            stack.extend((chain[k + 1], chain[k], level - 1) for k in range(len(chain) - 1))
+        return self.graph.edge_path_to_nodes(start_index, edges)
+
+# Example usage
+if __name__ == "__main__":
+    from town_map import TownMap
+    town = TownMap('complex_town_map.json')
+    partition = Partition.build(town, cell_sizes=(8, 24))
+    overlay = Overlay(partition, 'time')
+    print(f"{partition.levels} levels with {partition.cell_counts} cells")
+    print(f"Route from 0 to 44: {overlay.query('0', '44')}")
+    changes = town.update_traffic(speed_limits={'5-11': 20})
+    print(f"Cells re-customized after a speed change: {overlay.customize(changes)}")
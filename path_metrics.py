@@ -0,0 +1,102 @@
+import weakref
+import numpy as np
+
+# Sorted (source * node_count + target) keys and matching edge ids, per compiled map
+_edge_lookups = weakref.WeakKeyDictionary()
+
+def _edge_lookup(graph):
+    lookup = _edge_lookups.get(graph)
+    if lookup is None:
+        sources = np.frombuffer(graph.sources, dtype=np.int64)
+        targets = np.frombuffer(graph.targets, dtype=np.int64)
+        keys = sources * graph.node_count + targets
+        order = np.argsort(keys, kind='stable')
+        lookup = _edge_lookups[graph] = (keys[order], order)
+    return lookup
+
+def path_metrics(town_map, paths):
+    """
+    Compute route metrics for many paths at once. Paths are flattened into
+    one array of node indices, each consecutive pair is matched to its edge by
+    binary search, and the per-edge arrays of the compiled map are gathered
+    and summed per path with bincount, so the cost per segment is a handful of
+    NumPy operations rather than Python calls.
+    :param town_map: TownMap or CompiledMap object
+    :param paths: Iterable of paths (sequences of intersection IDs, or None for no route)
+    :return: Structured array with one row per path and the fields
+             segments, distance, time (minutes at the speed limit), traffic_lights
+             (passed through or arrived at, not counting the start), valid (False
+             for None, for unknown intersection IDs or if a step is not a road;
+             metrics are then NaN / 0), and
+             <road type>_segments for every road type on the map
+    """
+    graph = town_map.compile()
+    node_index = graph.node_index
+    paths = list(paths)
+    missing = np.fromiter((path is None for path in paths), dtype=bool, count=len(paths))
+    paths = [path or () for path in paths]
+    path_lengths = np.fromiter((len(path) for path in paths), dtype=np.int64, count=len(paths))
+    nodes = np.fromiter((node_index.get(node, -1) for path in paths for node in path), dtype=np.int64,
+                        count=int(path_lengths.sum()))
+    unknown = nodes < 0
+
+    # Segment i joins nodes[i] and nodes[i + 1] unless a path ends at i
+    path_ends = np.cumsum(path_lengths)
+    is_segment = np.ones(max(len(nodes) - 1, 0), dtype=bool)
+    is_segment[path_ends[(path_ends > 0) & (path_ends < len(nodes))] - 1] = False
+    first = np.flatnonzero(is_segment)
+    segment_counts = np.maximum(path_lengths - 1, 0)
+    path_of = np.repeat(np.arange(len(paths)), segment_counts)
+
+    keys, order = _edge_lookup(graph)
+    wanted = nodes[first] * graph.node_count + nodes[first + 1]
+    found = np.searchsorted(keys, wanted)
+    found = np.minimum(found, max(len(keys) - 1, 0))
+    matched = keys[found] == wanted if len(keys) else np.zeros(len(wanted), dtype=bool)
+    matched &= ~unknown[first] & ~unknown[first + 1]
+    edges = order[found]
+    edges[~matched] = 0
+
+    count = len(paths)
+    valid = (np.bincount(path_of, weights=~matched, minlength=count) == 0) & ~missing
+    valid &= np.bincount(np.repeat(np.arange(count), path_lengths), weights=unknown, minlength=count) == 0
+    lengths = np.frombuffer(graph.lengths, dtype=np.float64)
+    times = np.frombuffer(graph.times, dtype=np.float64)
+    signals = np.frombuffer(graph.signals, dtype=np.int8)
+    road_class = np.frombuffer(graph.road_class, dtype=np.int8)
+    classes = graph.profiles.classes
+
+    dtype = [('segments', np.int32), ('distance', np.float64), ('time', np.float64),
+             ('traffic_lights', np.int32), ('valid', bool)]
+    dtype += [(f'{name}_segments', np.int32) for name in classes]
+    result = np.zeros(count, dtype=dtype)
+    result['segments'] = segment_counts
+    result['distance'] = np.bincount(path_of, weights=lengths[edges], minlength=count)
+    result['time'] = np.bincount(path_of, weights=times[edges], minlength=count)
+    result['traffic_lights'] = np.bincount(path_of, weights=signals[nodes[first + 1]] * matched, minlength=count)
+    result['valid'] = valid
+    composition = np.bincount(path_of * len(classes) + road_class[edges],
+                              minlength=count * len(classes)).reshape(count, len(classes))
+    composition[~valid] = 0
+    for index, name in enumerate(classes):
+        result[f'{name}_segments'] = composition[:, index]
+    result['distance'][~valid] = np.nan
+    result['time'][~valid] = np.nan
+    result['traffic_lights'][~valid] = 0
+    return result
+
+def road_type_counts(metrics, row):
+    """Get the road types a path used, as {road type: segments}, from a path_metrics result"""
+    return {name[:-len('_segments')]: int(metrics[name][row]) for name in metrics.dtype.names
+            if name.endswith('_segments') and name != 'segments' and metrics[name][row]}
+
+# Example usage
+if __name__ == "__main__":
+    from town_map import TownMap
+    from pathfinding import bfs_shortest_path_with_turns
+    town = TownMap('complex_town_map.json')
+    paths = [bfs_shortest_path_with_turns(town, start, goal) for start, goal in (('0', '44'), ('5', '17'))]
+    metrics = path_metrics(town, paths)
+    for row, path in enumerate(paths):
+        print(f"{' -> '.join(path)}: {metrics['distance'][row]:.2f} units, {metrics['time'][row]:.1f} minutes, "
+              f"{metrics['traffic_lights'][row]} traffic lights, {road_type_counts(metrics, row)}")
@@ -1,49 +1,872 @@
+import heapq
+import weakref
+from array import array
 from collections import deque
+import numpy as np
+from town_map import travel_time
+from traffic_profiles import minutes_of_day
+from search_stats import SearchProbe
 
-def bfs_shortest_path_with_turns(town_map, start, goal):
+COST_MODES = ('hops', 'distance', 'time')
+
+# Parent pointer value for states the search has not reached
+UNVISITED = -2
+
+# Per-graph pools of edge_count arrays filled with UNVISITED, so a query does
+# not allocate and fill one per call; each caller borrows its own array
+_scratch_pools = weakref.WeakKeyDictionary()
+
+def _borrow_scratch(graph):
+    """Take an array of UNVISITED, one entry per edge state, from the graph's pool"""
+    pool = _scratch_pools.setdefault(graph, [])
+    try:
+        return pool.pop()
+    except IndexError:
+        return array('q', [UNVISITED]) * graph.edge_count
+
+def _return_scratch(graph, scratch, touched):
+    """Reset the touched states of a borrowed array to UNVISITED and put it back in the pool"""
+    np.frombuffer(scratch, dtype=np.int64)[np.frombuffer(touched, dtype=np.int64)] = UNVISITED
+    _scratch_pools.setdefault(graph, []).append(scratch)
+
+def bfs_shortest_path_with_turns(town_map, start, goal, stats=None):
     """
     Find the shortest path using breadth-first search (BFS), considering turn restrictions
-    :param town_map: TownMap object
+    :param town_map: TownMap or CompiledMap object
     :param start: Start node
     :param goal: Goal node
+    :param stats: Optional dict, receives the number of expanded states under 'expanded'
+                  and the other SearchProbe counters
     :return: Shortest path list, or None if unreachable
     """
+    probe = SearchProbe(stats, 'bfs') if stats is not None else None
     if start == goal:
+        if probe:
+            probe.finish(None, 0)
         return [start]
-    
-    # Queue stores nodes to visit, path to node, and previous node
-    queue = deque([(start, [start], None)])
-    # Record visited (node, previous node) pairs to handle turn restrictions
-    visited = set()
-    visited.add((start, None))
-    
+
+    graph = town_map.compile()
+    start_index = graph.node_index[start]
+    goal_index = graph.node_index[goal]
+
+    # A state is the edge we arrived by, i.e. the (node, previous node) pair.
+    # parent holds, per state, the state it was reached from (-1 at the start,
+    # UNVISITED otherwise), so the path is rebuilt once at the goal instead of
+    # being copied into every queue entry. It is borrowed from a pool, and
+    # touched lists the states to reset, so a query costs time and memory in
+    # proportion to the states it reaches rather than to the map size.
+    parent = _borrow_scratch(graph)
+    touched = array('q')
+    try:
+        return _bfs_search(graph, start_index, goal_index, parent, touched, probe)
+    finally:
+        _return_scratch(graph, parent, touched)
+
+def _bfs_search(graph, start_index, goal_index, parent, touched, probe):
+    """The BFS itself, labeling states in a clean parent array and listing them in touched"""
+    offsets, targets, turn_masks = graph.offsets, graph.targets, graph.turn_masks
+    queue = deque()
+    push, pop = queue.append, probe.popper(queue) if probe else queue.popleft
+    label = touched.append
+    mask = graph.departure_masks[start_index]
+    for edge in range(offsets[start_index], offsets[start_index + 1]):
+        allowed = mask & 1
+        mask >>= 1
+        if not allowed:
+            continue
+        if targets[edge] == goal_index:
+            path = graph.edge_path_to_nodes(start_index, [edge])
+            if probe:
+                probe.pushed = len(queue)
+                probe.finish(graph, 1)
+            return path
+        parent[edge] = -1
+        label(edge)
+        push(edge)
+    expanded = 1
+    if probe:
+        probe.phase('setup')
+
     while queue:
-        current, path, previous = queue.popleft()
-        
-        # Traverse all neighbors of the current node
-        for neighbor in town_map.get_neighbors(current):
-            # Check if the turn is allowed
-            if previous is not None and not town_map.is_turn_allowed(previous, current, neighbor):
+        edge = pop()
+        expanded += 1
+        current = targets[edge]
+        mask = turn_masks[edge]
+
+        # Traverse all allowed turns out of the current node
+        for next_edge in range(offsets[current], offsets[current + 1]):
+            allowed = mask & 1
+            mask >>= 1
+            if not allowed:
                 continue
-                
+
             # Check if we've reached the goal
-            if neighbor == goal:
-                return path + [neighbor]
-            
+            if targets[next_edge] == goal_index:
+                parent[next_edge] = edge
+                label(next_edge)
+                if probe:
+                    probe.phase('search')
+                path = graph.edge_path_to_nodes(start_index, _trace_edges(parent, next_edge))
+                if probe:
+                    probe.pushed = probe.popped + len(queue)
+                    probe.finish(graph, expanded, _bfs_expanded(touched, queue, next_edge))
+                return path
+
             # Check if we've visited this state
-            if (neighbor, current) not in visited:
-                visited.add((neighbor, current))
-                queue.append((neighbor, path + [neighbor], current))
-    
+            if parent[next_edge] == UNVISITED:
+                parent[next_edge] = edge
+                label(next_edge)
+                push(next_edge)
+
     # If queue is empty and we haven't found the goal node, there's no path
+    if probe:
+        probe.phase('search')
+        probe.pushed = probe.popped
+        probe.finish(graph, expanded, _bfs_expanded(touched, queue))
     return None
 
+def _bfs_expanded(touched, queue, goal_edge=None):
+    """States a BFS has expanded: everything it labeled except what is still queued and the goal state"""
+    labeled = set(touched)
+    labeled.difference_update(queue)
+    labeled.discard(goal_edge)
+    return labeled
+
+def _trace_edges(parent, edge):
+    """Follow parent pointers back from edge to the start and return the edges in travel order"""
+    edges = []
+    while edge != -1:
+        edges.append(edge)
+        edge = parent[edge]
+    edges.reverse()
+    return edges
+
+def _heuristic(graph, goal_index, cost, states=False):
+    """
+    Build an admissible A* heuristic towards the goal for a cost mode.
+    Straight-line distance never exceeds the road distance, and no road is
+    faster than the map's maximum speed limit, so both bounds are admissible.
+    :param states: Take edge states instead of node indices
+    :return: Function node index (or edge state) -> lower bound of the remaining cost
+    """
+    if cost == 'distance':
+        scale = 1
+    elif cost == 'time':
+        scale = travel_time(1, graph.max_speed)
+    else:
+        return lambda node: 0
+
+    xs, ys = graph.x, graph.y
+    goal_x, goal_y = xs[goal_index], ys[goal_index]
+
+    if states:
+        targets = graph.targets
+
+        def heuristic(edge):
+            node = targets[edge]
+            return ((xs[node] - goal_x) ** 2 + (ys[node] - goal_y) ** 2) ** 0.5 * scale
+    else:
+        def heuristic(node):
+            return ((xs[node] - goal_x) ** 2 + (ys[node] - goal_y) ** 2) ** 0.5 * scale
+
+    return heuristic
+
+def _weighted_search(graph, start, goal, costs, heuristic, stats, engine):
+    """Best-first search over edge states, shared by Dijkstra and A*; heuristic takes an edge state"""
+    probe = SearchProbe(stats, engine) if stats is not None else None
+    if start == goal:
+        if probe:
+            probe.finish(graph, 0)
+        return [start]
+
+    offsets, targets, turn_masks = graph.offsets, graph.targets, graph.turn_masks
+    start_index = graph.node_index[start]
+    goal_index = graph.node_index[goal]
+
+    best_cost = {}
+    parent = {}
+    heap = []
+    push, pop = (probe.heappush, probe.heappop) if probe else (heapq.heappush, heapq.heappop)
+    # Seed with every open road leaving the start; there is no turn to check yet
+    mask = graph.departure_masks[start_index]
+    for edge in range(offsets[start_index], offsets[start_index + 1]):
+        allowed = mask & 1
+        mask >>= 1
+        if not allowed:
+            continue
+        edge_cost = costs[edge]
+        if edge_cost < best_cost.get(edge, float('inf')):
+            best_cost[edge] = edge_cost
+            parent[edge] = -1
+            push(heap, (edge_cost + heuristic(edge), edge_cost, edge))
+    closed = set()
+    expanded = 1
+    if probe:
+        probe.phase('setup')
+
+    while heap:
+        _, cost_so_far, edge = pop(heap)
+        if edge in closed:
+            continue
+        closed.add(edge)
+        expanded += 1
+        current = targets[edge]
+
+        # The goal is only settled once it is popped, which keeps the result optimal
+        if current == goal_index:
+            if probe:
+                probe.phase('search')
+            path = graph.edge_path_to_nodes(start_index, _trace_edges(parent, edge))
+            if probe:
+                closed.discard(edge)
+                probe.finish(graph, expanded, closed)
+            return path
+
+        mask = turn_masks[edge]
+        for next_edge in range(offsets[current], offsets[current + 1]):
+            allowed = mask & 1
+            mask >>= 1
+            if not allowed or next_edge in closed:
+                continue
+            next_cost = cost_so_far + costs[next_edge]
+            if next_cost < best_cost.get(next_edge, float('inf')):
+                best_cost[next_edge] = next_cost
+                parent[next_edge] = edge
+                push(heap, (next_cost + heuristic(next_edge), next_cost, next_edge))
+
+    if probe:
+        probe.phase('search')
+        probe.finish(graph, expanded, closed)
+    return None
+
+def dijkstra_shortest_path_with_turns(town_map, start, goal, cost='distance', stats=None):
+    """
+    Find the cheapest path using Dijkstra's algorithm, considering turn restrictions
+    :param town_map: TownMap or CompiledMap object
+    :param start: Start node
+    :param goal: Goal node
+    :param cost: 'hops', 'distance' or 'time'
+    :param stats: Optional dict, receives the number of expanded states under 'expanded'
+                  and the other SearchProbe counters
+    :return: Cheapest path list, or None if unreachable
+    """
+    graph = town_map.compile()
+    return _weighted_search(graph, start, goal, graph.edge_costs(cost), lambda edge: 0, stats, 'dijkstra')
+
+def astar_shortest_path_with_turns(town_map, start, goal, cost='distance', stats=None, landmarks=None):
+    """
+    Find the cheapest path using A* search, considering turn restrictions
+    :param town_map: TownMap or CompiledMap object
+    :param start: Start node
+    :param goal: Goal node
+    :param cost: 'hops', 'distance' or 'time'
+    :param stats: Optional dict, receives the number of expanded states under 'expanded'
+                  and the other SearchProbe counters
+    :param landmarks: Optional Landmarks built for this cost mode and map version; their
+                      triangle-inequality bounds (ALT) replace the straight-line heuristic
+    :return: Cheapest path list, or None if unreachable
+    """
+    graph = town_map.compile()
+    if landmarks is not None:
+        if landmarks.cost != cost:
+            raise ValueError(f"Landmarks were built for {landmarks.cost}, not {cost}")
+        return _weighted_search(graph, start, goal, graph.edge_costs(cost),
+                                landmarks.heuristic(start, goal), stats, 'alt')
+    return _weighted_search(graph, start, goal, graph.edge_costs(cost),
+                            _heuristic(graph, graph.node_index[goal], cost, states=True), stats, 'astar')
+
+def time_dependent_shortest_path(town_map, start, goal, depart_at, stats=None):
+    """
+    Find the earliest-arrival path for a departure time, using time-dependent
+    Dijkstra over edge states: roads follow their class's time-of-day speed
+    profile and each traffic light passed through adds the expected wait.
+    Profiles are FIFO, so settling states in arrival order stays exact.
+    :param town_map: TownMap or CompiledMap object
+    :param start: Start node
+    :param goal: Goal node
+    :param depart_at: Departure time, minutes after midnight or "HH:MM"
+    :param stats: Optional dict, receives the number of expanded states under 'expanded'
+                  and the other SearchProbe counters
+    :return: Fastest path list, or None if unreachable
+    """
+    probe = SearchProbe(stats, 'time_dependent') if stats is not None else None
+    if start == goal:
+        if probe:
+            probe.finish(None, 0)
+        return [start]
+
+    graph = town_map.compile()
+    offsets, targets, turn_masks = graph.offsets, graph.targets, graph.turn_masks
+    lengths, speeds, road_class, signals = graph.lengths, graph.speeds, graph.road_class, graph.signals
+    traverse, signal_wait = graph.profiles.traverse, graph.profiles.signal_wait
+    start_index = graph.node_index[start]
+    goal_index = graph.node_index[goal]
+    depart_at = minutes_of_day(depart_at)
+
+    arrival = {}
+    parent = {}
+    heap = []
+    push, pop = (probe.heappush, probe.heappop) if probe else (heapq.heappush, heapq.heappop)
+    mask = graph.departure_masks[start_index]
+    for edge in range(offsets[start_index], offsets[start_index + 1]):
+        allowed = mask & 1
+        mask >>= 1
+        if allowed:
+            arrival[edge] = traverse(road_class[edge], lengths[edge], speeds[edge], depart_at)
+            parent[edge] = -1
+            push(heap, (arrival[edge], edge))
+    closed = set()
+    expanded = 1
+    if probe:
+        probe.phase('setup')
+
+    while heap:
+        now, edge = pop(heap)
+        if edge in closed:
+            continue
+        closed.add(edge)
+        expanded += 1
+        current = targets[edge]
+
+        if current == goal_index:
+            if probe:
+                probe.phase('search')
+            path = graph.edge_path_to_nodes(start_index, _trace_edges(parent, edge))
+            if probe:
+                closed.discard(edge)
+                probe.finish(graph, expanded, closed)
+            return path
+
+        if signals[current]:
+            now += signal_wait
+        mask = turn_masks[edge]
+        for next_edge in range(offsets[current], offsets[current + 1]):
+            allowed = mask & 1
+            mask >>= 1
+            if not allowed or next_edge in closed:
+                continue
+            next_arrival = traverse(road_class[next_edge], lengths[next_edge], speeds[next_edge], now)
+            if next_arrival < arrival.get(next_edge, float('inf')):
+                arrival[next_edge] = next_arrival
+                parent[next_edge] = edge
+                push(heap, (next_arrival, next_edge))
+
+    if probe:
+        probe.phase('search')
+        probe.finish(graph, expanded, closed)
+    return None
+
+def _join_paths(graph, start_index, parent, following, meeting_edge):
+    """Combine the forward parent chain and the backward successor chain at the meeting edge"""
+    edges = _trace_edges(parent, meeting_edge)
+    edge = following[meeting_edge]
+    while edge != -1:
+        edges.append(edge)
+        edge = following[edge]
+    return graph.edge_path_to_nodes(start_index, edges)
+
+def bidirectional_bfs_with_turns(town_map, start, goal, stats=None):
+    """
+    Find the shortest path (fewest roads) with a bidirectional BFS, considering turn restrictions.
+    The forward search labels edge states with the number of roads driven so
+    far, the backward search with the number of roads still to drive; a state
+    labeled by both sides joins the two halves.
+    :param town_map: TownMap or CompiledMap object
+    :param start: Start node
+    :param goal: Goal node
+    :param stats: Optional dict, receives the number of expanded states under 'expanded'
+                  and the other SearchProbe counters
+    :return: Shortest path list, or None if unreachable
+    """
+    probe = SearchProbe(stats, 'bidirectional_bfs') if stats is not None else None
+    if start == goal:
+        if probe:
+            probe.finish(None, 0)
+        return [start]
+
+    graph = town_map.compile()
+    start_index = graph.node_index[start]
+    goal_index = graph.node_index[goal]
+
+    # Labels live in arrays borrowed from the graph's scratch pool; each side
+    # lists the states it labels, and only those are reset afterwards
+    forward_depth, parent = _borrow_scratch(graph), _borrow_scratch(graph)
+    backward_depth, following = _borrow_scratch(graph), _borrow_scratch(graph)
+    forward_touched, backward_touched = array('q'), array('q')
+    try:
+        return _bidirectional_bfs_search(graph, start_index, goal_index, forward_depth, backward_depth,
+                                         parent, following, forward_touched, backward_touched, probe)
+    finally:
+        _return_scratch(graph, forward_depth, forward_touched)
+        _return_scratch(graph, parent, forward_touched)
+        _return_scratch(graph, backward_depth, backward_touched)
+        _return_scratch(graph, following, backward_touched)
+
+def _bidirectional_bfs_search(graph, start_index, goal_index, forward_depth, backward_depth,
+                              parent, following, forward_touched, backward_touched, probe):
+    """The bidirectional BFS itself, listing the states each side labels in its touched array"""
+    offsets, targets, sources, turn_masks = graph.offsets, graph.targets, graph.sources, graph.turn_masks
+    in_offsets, in_edges = graph.in_offsets, graph.in_edges
+    forward_label, backward_label = forward_touched.append, backward_touched.append
+
+    best_length = float('inf')
+    meeting_edge = -1
+
+    forward_frontier = []
+    mask = graph.departure_masks[start_index]
+    for edge in range(offsets[start_index], offsets[start_index + 1]):
+        allowed = mask & 1
+        mask >>= 1
+        if allowed:
+            forward_depth[edge] = 1
+            parent[edge] = -1
+            forward_label(edge)
+            forward_frontier.append(edge)
+
+    backward_frontier = []
+    for edge in in_edges[in_offsets[goal_index]:in_offsets[goal_index + 1]]:
+        backward_depth[edge] = 0
+        following[edge] = -1
+        backward_label(edge)
+        backward_frontier.append(edge)
+        if forward_depth[edge] != UNVISITED:
+            best_length = 1
+            meeting_edge = edge
+
+    forward_level, backward_level = 1, 0
+    expanded = 0
+    if probe:
+        probe.pushed = len(forward_frontier) + len(backward_frontier)
+        probe.max_frontier = max(len(forward_frontier), len(backward_frontier))
+        probe.phase('setup')
+
+    # Every state within forward_level of the start and backward_level of the goal
+    # is labeled, so any path not found yet has at least forward_level + backward_level + 1 roads
+    while forward_frontier and backward_frontier and best_length > forward_level + backward_level + 1:
+        next_frontier = []
+        if len(forward_frontier) <= len(backward_frontier):
+            for edge in forward_frontier:
+                expanded += 1
+                current = targets[edge]
+                mask = turn_masks[edge]
+                for next_edge in range(offsets[current], offsets[current + 1]):
+                    allowed = mask & 1
+                    mask >>= 1
+                    if not allowed or forward_depth[next_edge] != UNVISITED:
+                        continue
+                    forward_depth[next_edge] = forward_level + 1
+                    parent[next_edge] = edge
+                    forward_label(next_edge)
+                    next_frontier.append(next_edge)
+                    if backward_depth[next_edge] != UNVISITED:
+                        length = forward_level + 1 + backward_depth[next_edge]
+                        if length < best_length:
+                            best_length = length
+                            meeting_edge = next_edge
+            forward_frontier = next_frontier
+            forward_level += 1
+        else:
+            for edge in backward_frontier:
+                expanded += 1
+                current = sources[edge]
+                first_out = offsets[current]
+                for previous_edge in in_edges[in_offsets[current]:in_offsets[current + 1]]:
+                    if backward_depth[previous_edge] != UNVISITED:
+                        continue
+                    if not turn_masks[previous_edge] >> (edge - first_out) & 1:
+                        continue
+                    backward_depth[previous_edge] = backward_level + 1
+                    following[previous_edge] = edge
+                    backward_label(previous_edge)
+                    next_frontier.append(previous_edge)
+                    if forward_depth[previous_edge] != UNVISITED:
+                        length = forward_depth[previous_edge] + backward_level + 1
+                        if length < best_length:
+                            best_length = length
+                            meeting_edge = previous_edge
+            backward_frontier = next_frontier
+            backward_level += 1
+        if probe:
+            probe.pushed += len(next_frontier)
+            probe.max_frontier = max(probe.max_frontier, len(next_frontier))
+
+    path = None
+    if probe:
+        probe.phase('search')
+    if meeting_edge != -1:
+        path = _join_paths(graph, start_index, parent, following, meeting_edge)
+    if probe:
+        probe.popped = expanded
+        forward_states = np.frombuffer(forward_touched, dtype=np.int64)
+        backward_states = np.frombuffer(backward_touched, dtype=np.int64)
+        forward_depths = np.frombuffer(forward_depth, dtype=np.int64)[forward_states]
+        backward_depths = np.frombuffer(backward_depth, dtype=np.int64)[backward_states]
+        probe.finish(graph, expanded, forward_states[forward_depths < forward_level],
+                     backward_states[backward_depths < backward_level])
+    return path
+
+def bidirectional_dijkstra_with_turns(town_map, start, goal, cost='distance', stats=None):
+    """
+    Find the cheapest path with a bidirectional Dijkstra search, considering turn restrictions.
+    The forward label of an edge state includes the cost of that edge, the
+    backward label is the cost of the rest of the route after it.
+    :param town_map: TownMap or CompiledMap object
+    :param start: Start node
+    :param goal: Goal node
+    :param cost: 'hops', 'distance' or 'time'
+    :param stats: Optional dict, receives the number of expanded states under 'expanded'
+                  and the other SearchProbe counters
+    :return: Cheapest path list, or None if unreachable
+    """
+    probe = SearchProbe(stats, 'bidirectional_dijkstra') if stats is not None else None
+    if start == goal:
+        if probe:
+            probe.finish(None, 0)
+        return [start]
+
+    graph = town_map.compile()
+    costs = graph.edge_costs(cost)
+    offsets, targets, sources, turn_masks = graph.offsets, graph.targets, graph.sources, graph.turn_masks
+    in_offsets, in_edges = graph.in_offsets, graph.in_edges
+    start_index = graph.node_index[start]
+    goal_index = graph.node_index[goal]
+
+    forward_cost, backward_cost = {}, {}
+    forward_closed, backward_closed = set(), set()
+    parent, following = {}, {}
+    forward_heap, backward_heap = [], []
+    push, pop = (probe.heappush, probe.heappop) if probe else (heapq.heappush, heapq.heappop)
+
+    mask = graph.departure_masks[start_index]
+    for edge in range(offsets[start_index], offsets[start_index + 1]):
+        allowed = mask & 1
+        mask >>= 1
+        if allowed:
+            forward_cost[edge] = costs[edge]
+            parent[edge] = -1
+            push(forward_heap, (costs[edge], edge))
+    for edge in in_edges[in_offsets[goal_index]:in_offsets[goal_index + 1]]:
+        backward_cost[edge] = 0
+        following[edge] = -1
+        push(backward_heap, (0, edge))
+
+    best_cost = float('inf')
+    meeting_edge = -1
+    for edge, edge_cost in forward_cost.items():
+        if edge in backward_cost and edge_cost < best_cost:
+            best_cost = edge_cost
+            meeting_edge = edge
+    expanded = 0
+    if probe:
+        probe.phase('setup')
+
+    while forward_heap and backward_heap and forward_heap[0][0] + backward_heap[0][0] < best_cost:
+        if forward_heap[0][0] <= backward_heap[0][0]:
+            cost_so_far, edge = pop(forward_heap)
+            if edge in forward_closed:
+                continue
+            forward_closed.add(edge)
+            expanded += 1
+            current = targets[edge]
+            mask = turn_masks[edge]
+            for next_edge in range(offsets[current], offsets[current + 1]):
+                allowed = mask & 1
+                mask >>= 1
+                if not allowed or next_edge in forward_closed:
+                    continue
+                next_cost = cost_so_far + costs[next_edge]
+                if next_cost < forward_cost.get(next_edge, float('inf')):
+                    forward_cost[next_edge] = next_cost
+                    parent[next_edge] = edge
+                    push(forward_heap, (next_cost, next_edge))
+                    if next_edge in backward_cost and next_cost + backward_cost[next_edge] < best_cost:
+                        best_cost = next_cost + backward_cost[next_edge]
+                        meeting_edge = next_edge
+        else:
+            cost_to_go, edge = pop(backward_heap)
+            if edge in backward_closed:
+                continue
+            backward_closed.add(edge)
+            expanded += 1
+            current = sources[edge]
+            first_out = offsets[current]
+            previous_cost = cost_to_go + costs[edge]
+            for previous_edge in in_edges[in_offsets[current]:in_offsets[current + 1]]:
+                if previous_edge in backward_closed:
+                    continue
+                if not turn_masks[previous_edge] >> (edge - first_out) & 1:
+                    continue
+                if previous_cost < backward_cost.get(previous_edge, float('inf')):
+                    backward_cost[previous_edge] = previous_cost
+                    following[previous_edge] = edge
+                    push(backward_heap, (previous_cost, previous_edge))
+                    if previous_edge in forward_cost and forward_cost[previous_edge] + previous_cost < best_cost:
+                        best_cost = forward_cost[previous_edge] + previous_cost
+                        meeting_edge = previous_edge
+
+    path = None
+    if probe:
+        probe.phase('search')
+    if meeting_edge != -1:
+        path = _join_paths(graph, start_index, parent, following, meeting_edge)
+    if probe:
+        probe.finish(graph, expanded, forward_closed, backward_closed)
+    return path
+
+def find_path(town_map, start, goal, cost='hops', bidirectional=False, depart_at=None, stats=None):
+    """
+    Run the default turn-aware search for a cost mode
+    :param town_map: TownMap or CompiledMap object
+    :param start: Start node
+    :param goal: Goal node
+    :param cost: 'hops' (BFS), 'distance' or 'time' (A*)
+    :param bidirectional: Use the bidirectional BFS / Dijkstra instead
+    :param depart_at: Departure time; if given, find the fastest path for it whatever the cost mode
+    :param stats: Optional dict, receives the SearchProbe counters of the search that ran
+    :return: Shortest path list, or None if unreachable
+    """
+    if depart_at is not None:
+        return time_dependent_shortest_path(town_map, start, goal, depart_at, stats)
+    if bidirectional:
+        if cost == 'hops':
+            return bidirectional_bfs_with_turns(town_map, start, goal, stats)
+        return bidirectional_dijkstra_with_turns(town_map, start, goal, cost, stats)
+    if cost == 'hops':
+        return bfs_shortest_path_with_turns(town_map, start, goal, stats)
+    return astar_shortest_path_with_turns(town_map, start, goal, cost, stats)
+
+class ShortestPathTree:
+    """
+    Single-source turn-aware Dijkstra over edge states, for one-to-many queries.
+
+    The cost of an intersection is the cost of the cheapest state arriving
+    there; the start itself costs 0. With targets, the search stops as soon
+    as every target is settled, so costs of other intersections may be missing.
+    """
+
+    def __init__(self, town_map, start, cost='time', targets=None, stats=None):
+        """
+        :param town_map: TownMap or CompiledMap object
+        :param start: Start node
+        :param cost: 'hops', 'distance' or 'time'
+        :param targets: Optional iterable of nodes; stop once all of them are settled
+        :param stats: Optional dict, receives the number of expanded states under 'expanded'
+                      and the other SearchProbe counters
+        """
+        probe = SearchProbe(stats, 'one_to_many') if stats is not None else None
+        self.graph = graph = town_map.compile()
+        self.version = graph.version
+        self.start = start
+        self.cost = cost
+        self.complete = targets is None
+        self.start_index = start_index = graph.node_index[start]
+        costs = graph.edge_costs(cost)
+        offsets, targets_of, turn_masks = graph.offsets, graph.targets, graph.turn_masks
+
+        # Settled edge state -> cost / parent state; node -> cheapest arrival cost / state
+        self.edge_cost = {}
+        self.parent = {}
+        self.node_cost = {start_index: 0}
+        self.node_edge = {start_index: -1}
+
+        remaining = None
+        if targets is not None:
+            remaining = {graph.node_index[target] for target in targets}
+            remaining.discard(start_index)
+
+        best_cost = {}
+        parent = {}
+        heap = []
+        push, pop = (probe.heappush, probe.heappop) if probe else (heapq.heappush, heapq.heappop)
+        mask = graph.departure_masks[start_index]
+        for edge in range(offsets[start_index], offsets[start_index + 1]):
+            allowed = mask & 1
+            mask >>= 1
+            if allowed:
+                best_cost[edge] = costs[edge]
+                parent[edge] = -1
+                push(heap, (costs[edge], edge))
+        expanded = 0
+        if probe:
+            probe.phase('setup')
+
+        while heap and (remaining is None or remaining):
+            cost_so_far, edge = pop(heap)
+            if edge in self.edge_cost:
+                continue
+            self.edge_cost[edge] = cost_so_far
+            self.parent[edge] = parent[edge]
+            expanded += 1
+            current = targets_of[edge]
+            if current not in self.node_cost:
+                self.node_cost[current] = cost_so_far
+                self.node_edge[current] = edge
+                if remaining is not None:
+                    remaining.discard(current)
+
+            mask = turn_masks[edge]
+            for next_edge in range(offsets[current], offsets[current + 1]):
+                allowed = mask & 1
+                mask >>= 1
+                if not allowed or next_edge in self.edge_cost:
+                    continue
+                next_cost = cost_so_far + costs[next_edge]
+                if next_cost < best_cost.get(next_edge, float('inf')):
+                    best_cost[next_edge] = next_cost
+                    parent[next_edge] = edge
+                    push(heap, (next_cost, next_edge))
+
+        if probe:
+            probe.phase('search')
+            probe.finish(graph, expanded, self.edge_cost)
+
+    def repair(self, changes, stats=None):
+        """
+        Bring a complete tree up to date after CompiledMap.update_roads patched
+        its map, re-searching only the part of the tree the changes affect:
+        subtrees hanging off a slower or closed road are detached and re-attached
+        from their settled surroundings, and faster or reopened roads are relaxed
+        from the states before them. Every update batch must be repaired in turn.
+        :param changes: TrafficChanges returned by the update
+        :param stats: Optional dict, receives the number of re-expanded states under 'expanded'
+        """
+        if not self.complete:
+            raise ValueError("Only trees built without targets can be repaired")
+        graph = self.graph
+        costs = graph.edge_costs(self.cost)
+        offsets, sources, targets_of = graph.offsets, graph.sources, graph.targets
+        in_offsets, in_edges = graph.in_offsets, graph.in_edges
+        turn_masks, departure_masks = graph.turn_masks, graph.departure_masks
+        start_index = self.start_index
+        edge_cost, parent = self.edge_cost, self.parent
+        old_times = changes.times if self.cost == 'time' else {}
+
+        def allowed(previous, edge, masks=turn_masks, departures=departure_masks):
+            if previous == -1:
+                return departures[start_index] >> (edge - offsets[start_index]) & 1
+            return masks[previous] >> (edge - offsets[targets_of[previous]]) & 1
+
+        # Settled states whose own cost went up or whose link to their parent was closed
+        roots = [edge for edge, old in old_times.items() if edge in edge_cost and costs[edge] > old]
+        for previous, old_mask in changes.turn_masks.items():
+            if previous in edge_cost:
+                through = targets_of[previous]
+                roots.extend(edge for edge in range(offsets[through], offsets[through + 1])
+                             if parent.get(edge) == previous and not allowed(previous, edge))
+        if start_index in changes.departure_masks:
+            roots.extend(edge for edge in range(offsets[start_index], offsets[start_index + 1])
+                         if parent.get(edge) == -1 and not allowed(-1, edge))
+
+        # Detach their subtrees; those states are re-searched from scratch
+        detached = set()
+        if roots:
+            children = {}
+            for edge, previous in parent.items():
+                children.setdefault(previous, []).append(edge)
+            stack = roots
+            while stack:
+                edge = stack.pop()
+                if edge not in detached:
+                    detached.add(edge)
+                    stack.extend(children.get(edge, ()))
+            for edge in detached:
+                del edge_cost[edge]
+                del parent[edge]
+
+        # States that may now be reached more cheaply: detached ones, faster roads, newly allowed turns
+        candidates = set(detached)
+        candidates.update(edge for edge, old in old_times.items() if costs[edge] < old)
+        for previous, old_mask in changes.turn_masks.items():
+            if previous in edge_cost:
+                through = targets_of[previous]
+                candidates.update(edge for edge in range(offsets[through], offsets[through + 1])
+                                  if allowed(previous, edge) and not old_mask >> (edge - offsets[through]) & 1)
+        if start_index in changes.departure_masks:
+            candidates.update(range(offsets[start_index], offsets[start_index + 1]))
+
+        heap = []
+        for edge in candidates:
+            best, best_parent = float('inf'), None
+            source = sources[edge]
+            if source == start_index and allowed(-1, edge):
+                best, best_parent = costs[edge], -1
+            for previous in in_edges[in_offsets[source]:in_offsets[source + 1]]:
+                if previous in edge_cost and allowed(previous, edge):
+                    candidate = edge_cost[previous] + costs[edge]
+                    if candidate < best:
+                        best, best_parent = candidate, previous
+            if best < edge_cost.get(edge, float('inf')):
+                heap.append((best, edge, best_parent))
+        heapq.heapify(heap)
+
+        # Dijkstra over the affected region, improving states until nothing changes
+        touched = {targets_of[edge] for edge in detached}
+        expanded = 0
+        inf = float('inf')
+        lookup = edge_cost.get
+        heappush, heappop = heapq.heappush, heapq.heappop
+        while heap:
+            cost_so_far, edge, previous = heappop(heap)
+            if cost_so_far >= lookup(edge, inf):
+                continue
+            edge_cost[edge] = cost_so_far
+            parent[edge] = previous
+            expanded += 1
+            current = targets_of[edge]
+            touched.add(current)
+
+            mask = turn_masks[edge]
+            next_edge = offsets[current]
+            while mask:
+                if mask & 1:
+                    next_cost = cost_so_far + costs[next_edge]
+                    if next_cost < lookup(next_edge, inf):
+                        heappush(heap, (next_cost, next_edge, edge))
+                mask >>= 1
+                next_edge += 1
+
+        # Intersection costs are the cheapest state arriving there
+        touched.discard(start_index)
+        for node in touched:
+            best_edge = -1
+            for edge in in_edges[in_offsets[node]:in_offsets[node + 1]]:
+                if edge in edge_cost and (best_edge == -1 or edge_cost[edge] < edge_cost[best_edge]):
+                    best_edge = edge
+            if best_edge == -1:
+                self.node_cost.pop(node, None)
+                self.node_edge.pop(node, None)
+            else:
+                self.node_cost[node] = edge_cost[best_edge]
+                self.node_edge[node] = best_edge
+
+        self.version = graph.version
+        if stats is not None:
+            stats['expanded'] = expanded
+
+    def cost_to(self, goal):
+        """Get the cost of the cheapest route to goal, or inf if it is unreachable"""
+        return self.node_cost.get(self.graph.node_index[goal], float('inf'))
+
+    def path_to(self, goal):
+        """Get the cheapest route to goal as a list, or None if it is unreachable"""
+        goal_index = self.graph.node_index[goal]
+        if goal_index not in self.node_edge:
+            return None
+        edge = self.node_edge[goal_index]
+        return self.graph.edge_path_to_nodes(self.start_index, _trace_edges(self.parent, edge))
+
 # Example usage
 if __name__ == "__main__":
     from town_map import TownMap
     town = TownMap('large_map_data.json')
-    
+
     start = '0'
     goal = '99'
     path = bfs_shortest_path_with_turns(town, start, goal)
-    print(f"Shortest path from {start} to {goal}: {path}")
\ No newline at end of file
+    print(f"Shortest path from {start} to {goal}: {path}")
+
+    path = astar_shortest_path_with_turns(town, start, goal, cost='time')
+    print(f"Fastest path from {start} to {goal}: {path} ({town.get_path_time(path):.1f} minutes)")
+
+    path = time_dependent_shortest_path(town, start, goal, depart_at="08:00")
+    print(f"Fastest path at 08:00 from {start} to {goal}: {path} ({town.get_path_time(path, '08:00'):.1f} minutes)")
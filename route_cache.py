@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+
+class RouteCache:
+    """
+    Bounded LRU cache of computed routes with optional TTL.
+
+    Keys are (start, goal, cost mode). Every entry remembers the map version
+    it was computed against and every lookup passes the version it must
+    match; an entry from another version is dropped instead of returned, so a
+    blocked road or new restriction can never be answered from stale routes.
+    Callers may pass an older version for cost modes an update left alone, so
+    those routes survive it. Paths are stored as tuples so callers cannot
+    modify cached entries.
+    """
+
+    # Returned by get() when the key is not cached (None is a valid cached result: no route)
+    MISS = object()
+
+    def __init__(self, max_size=1024, ttl=None):
+        """
+        :param max_size: Maximum number of cached routes
+        :param ttl: Seconds before an entry expires, or None to keep entries until evicted
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version):
+        """
+        Look up a route
+        :param key: (start, goal, cost mode)
+        :param version: Map version the route must have been computed against
+        :return: Cached path tuple or None, or RouteCache.MISS
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return self.MISS
+        path, stored_at, stored_version = entry
+        if stored_version != version:
+            del self._entries[key]
+            self.invalidations += 1
+            self.misses += 1
+            return self.MISS
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return self.MISS
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return path
+
+    def put(self, key, path, version):
+        """
+        Store a route, evicting the least recently used entries if full
+        :param key: (start, goal, cost mode)
+        :param path: Path sequence, or None if there is no route
+        :param version: Map version the path was computed against
+        :return: The stored path tuple, or None
+        """
+        if path is not None:
+            path = tuple(path)
+        self._entries[key] = (path, time.monotonic(), version)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return path
+
+    def clear(self):
+        """Drop all cached routes"""
+        self._entries.clear()
+
+    def get_stats(self):
+        """Get hit/miss/eviction counters"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
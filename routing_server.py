@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Asyncio routing service over a NavigationSystem, speaking JSON lines over TCP or a Unix socket.
+
+Each request is one line, e.g. {"id": 1, "start": "0", "goal": "44", "cost": "time"}
+(optional "depart_at"), answered by one line {"id": 1, "path": [...], "latency_ms": ...}
+or {"id": 1, "error": "..."}. Responses on a connection may come back out of
+order; match them by id. {"op": "metrics"} returns the service counters.
+
+    python routing_server.py complex_town_map.json [--port 8765 | --unix /tmp/navigator.sock]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from navigation import NavigationSystem
+from pathfinding import COST_MODES
+from search_stats import Histogram, SearchProfiler, _bounds
+
+class RoutingServer:
+    """
+    Asyncio front end that keeps searches off the event loop.
+
+    Connections parse requests and put them on a bounded queue; when it is
+    full they stop reading, so TCP flow control pushes back on clients instead
+    of requests piling up in memory. One dispatcher drains the queue in
+    batches and runs the searches on a single worker thread (NavigationSystem
+    is not thread-safe). Requests in a batch that share a start and cost mode
+    are coalesced into one one-to-many search (NavigationSystem.find_routes),
+    so a burst from the same source costs little more than a single route.
+    """
+
+    def __init__(self, nav, max_pending=1024, max_batch=256, executor=None):
+        """
+        :param nav: NavigationSystem to route on
+        :param max_pending: Requests queued before connections stop being read
+        :param max_batch: Most requests taken from the queue per dispatch
+        :param executor: Executor for searches (default: one worker thread)
+        """
+        self.nav = nav
+        self.max_batch = max_batch
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='routing')
+        self.queue = asyncio.Queue(max_pending)
+        self.node_index = nav.town_map.compile().node_index
+        self.latency = Histogram(SearchProfiler.METRICS['latency_ms'])
+        self.queue_wait = Histogram(SearchProfiler.METRICS['latency_ms'])
+        self.batch_sizes = Histogram(_bounds(1, 10000))
+        self.requests = 0
+        self.errors = 0
+        self.searches = 0
+        self.coalesced = 0
+        self.connections = 0
+        self._dispatcher = None
+        self._servers = []
+
+    async def start(self, host='127.0.0.1', port=8765, unix_path=None):
+        """
+        Start listening and dispatching
+        :param host: TCP host
+        :param port: TCP port (0 picks a free one)
+        :param unix_path: Listen on this Unix socket instead of TCP
+        :return: asyncio Server
+        """
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self._handle, unix_path)
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        """Stop listening, cancel the dispatcher and shut the executor down"""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=False)
+
+    def metrics(self):
+        """Get the service counters and latency histograms (milliseconds)"""
+        metrics = {
+            'requests': self.requests,
+            'errors': self.errors,
+            'searches': self.searches,
+            'coalesced': self.coalesced,
+            'connections': self.connections,
+            'queue_depth': self.queue.qsize(),
+            'latency_ms': self.latency.to_dict(),
+            'queue_wait_ms': self.queue_wait.to_dict(),
+            'batch_size': self.batch_sizes.to_dict(),
+            'route_cache': self.nav.route_cache.get_stats(),
+        }
+        if self.nav.profiler is not None:
+            metrics['search'] = self.nav.profiler.to_dict()
+        return metrics
+
+    def _check(self, request):
+        """Raise ValueError if a route request names unknown intersections or cost modes"""
+        for field in ('start', 'goal'):
+            if str(request.get(field)) not in self.node_index:
+                raise ValueError(f"Unknown {field}: {request.get(field)}")
+        if request.get('cost', 'time') not in COST_MODES:
+            raise ValueError(f"Unknown cost mode: {request.get('cost')}")
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        loop = asyncio.get_running_loop()
+        pending = set()
+
+        def send(response):
+            writer.write((json.dumps(response) + '\n').encode())
+
+        async def respond(request_id, future, received):
+            try:
+                path = await future
+                response = {'id': request_id, 'path': list(path) if path is not None else None}
+            except Exception as e:
+                self.errors += 1
+                response = {'id': request_id, 'error': str(e)}
+            latency = (time.perf_counter() - received) * 1000
+            self.latency.observe(latency)
+            response['latency_ms'] = round(latency, 3)
+            send(response)
+            await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                received = time.perf_counter()
+                self.requests += 1
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Request must be a JSON object")
+                except ValueError as e:
+                    self.errors += 1
+                    send({'id': None, 'error': f"Invalid request: {e}"})
+                    continue
+                if request.get('op') == 'metrics':
+                    send({'id': request.get('id'), 'metrics': self.metrics()})
+                    continue
+                try:
+                    self._check(request)
+                except ValueError as e:
+                    self.errors += 1
+                    send({'id': request.get('id'), 'error': str(e)})
+                    continue
+                future = loop.create_future()
+                # Blocks this connection while the queue is full: that is the backpressure
+                await self.queue.put((request, future, received))
+                task = asyncio.create_task(respond(request.get('id'), future, received))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _dispatch(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self._run_batch(batch)
+            except Exception as e:
+                # Fail what is left of this batch but keep serving the next one
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _run_batch(self, batch):
+        """Coalesce a batch by start and cost mode and resolve each request's future"""
+        loop = asyncio.get_running_loop()
+        self.batch_sizes.observe(len(batch))
+        now = time.perf_counter()
+
+        # (start, cost) -> requests; timed requests are searched one by one
+        groups = {}
+        for request, future, received in batch:
+            self.queue_wait.observe((now - received) * 1000)
+            if request.get('depart_at') is not None:
+                groups[id(future)] = [(request, future)]
+            else:
+                key = (str(request['start']), request.get('cost', 'time'))
+                groups.setdefault(key, []).append((request, future))
+
+        for members in groups.values():
+            try:
+                request = members[0][0]
+                start, cost = str(request['start']), request.get('cost', 'time')
+                goals = [str(member['goal']) for member, _ in members]
+                if request.get('depart_at') is not None:
+                    path = await loop.run_in_executor(self.executor, self.nav.find_route, start, goals[0],
+                                                      cost, False, request['depart_at'])
+                    routes = {goals[0]: path}
+                else:
+                    routes = await loop.run_in_executor(self.executor, self.nav.find_routes, start, goals, cost)
+                paths = [routes[goal] for goal in goals]
+            except Exception as e:
+                for _, future in members:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.searches += 1
+            self.coalesced += len(members) - 1
+            for (_, future), path in zip(members, paths):
+                if not future.done():
+                    future.set_result(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('map_file')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help='Listen on this Unix socket path instead of TCP')
+    parser.add_argument('--max-pending', type=int, default=1024)
+    parser.add_argument('--profile', action='store_true', help='Collect per-engine search histograms')
+    args = parser.parse_args()
+
+    async def serve():
+        nav = NavigationSystem(args.map_file, profile=args.profile)
+        server = RoutingServer(nav, args.max_pending)
+        listener = await server.start(args.host, args.port, args.unix)
+        where = args.unix or '%s:%d' % listener.sockets[0].getsockname()[:2]
+        print(f"Routing {args.map_file} on {where}")
+        try:
+            await listener.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import bisect
+import heapq
+import json
+import time
+import numpy as np
+
+def _popcounts(masks):
+    """Number of set bits of each uint64 in an array"""
+    return np.unpackbits(masks.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+class SearchProbe:
+    """
+    Instrumentation for one search, created only when the caller passes a
+    stats dict. The searches bind their push/pop operations to local names
+    once, to this probe's counting versions when there is a stats dict and
+    to the plain heapq/deque operations otherwise, so the uninstrumented
+    loops do no extra work. Turn checks are counted after the search from
+    the set of expanded states rather than in the loop.
+
+    Fills the stats dict with:
+    - engine: name of the search
+    - expanded: states expanded (popped and not stale)
+    - pushed / popped: frontier operations, including stale heap entries
+    - max_frontier: largest frontier size
+    - turn_checks: turns looked at from expanded states
+    - turn_rejections: turns refused by turn restrictions (is_turn_allowed)
+    - closed_road_rejections: turns refused because the next road is closed
+    - phases: wall time in seconds of 'setup', 'search' and 'unpack'
+
+    The three turn counters are left out for searches that never check a
+    turn on its own, such as the Contraction Hierarchy's shortcut arcs, so
+    reports do not show them as zeros.
+    """
+
+    def __init__(self, stats, engine):
+        self.stats = stats
+        self.engine = engine
+        self.pushed = 0
+        self.popped = 0
+        self.max_frontier = 0
+        self.phases = {}
+        self.mark = time.perf_counter()
+
+    def phase(self, name):
+        """End the running phase and record its wall time under name"""
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self.mark
+        self.mark = now
+
+    def heappush(self, heap, item):
+        self.pushed += 1
+        heapq.heappush(heap, item)
+        if len(heap) > self.max_frontier:
+            self.max_frontier = len(heap)
+
+    def heappop(self, heap):
+        self.popped += 1
+        return heapq.heappop(heap)
+
+    def popper(self, queue):
+        """
+        Counting replacement for queue.popleft. The queue is largest just before
+        a pop, so max_frontier is tracked here and pushes are popped + len(queue)
+        at the end, leaving append uncounted.
+        """
+        def popleft():
+            self.popped += 1
+            if len(queue) > self.max_frontier:
+                self.max_frontier = len(queue)
+            return queue.popleft()
+        return popleft
+
+    def finish(self, graph, expanded, forward=(), backward=(), turns=True):
+        """
+        Write the counters to the stats dict
+        :param graph: CompiledMap searched
+        :param expanded: Number of expanded states
+        :param forward: Edge states expanded forwards (their out-turns were checked)
+        :param backward: Edge states expanded backwards (their in-turns were checked)
+        :param turns: Whether the search checks turns, so the turn counters apply
+        """
+        self.phase('unpack')
+        stats = self.stats
+        stats['engine'] = self.engine
+        stats['expanded'] = expanded
+        stats['pushed'] = self.pushed
+        stats['popped'] = self.popped
+        stats['max_frontier'] = self.max_frontier
+        stats['phases'] = dict(self.phases)
+        if not turns:
+            return
+
+        checks = rejections = closed = 0
+        forward = np.fromiter(forward, dtype=np.int64)
+        if len(forward):
+            offsets = np.frombuffer(graph.offsets, dtype=np.int64)
+            nodes = np.frombuffer(graph.targets, dtype=np.int64)[forward]
+            open_turns = _popcounts(np.frombuffer(graph.departure_masks, dtype=np.uint64)[nodes])
+            allowed = _popcounts(np.frombuffer(graph.turn_masks, dtype=np.uint64)[forward])
+            degrees = offsets[nodes + 1] - offsets[nodes]
+            checks += int(degrees.sum())
+            # Turn masks only allow open roads, so what an open road does not allow is a restriction
+            rejections += int((open_turns - allowed).sum())
+            closed += int((degrees - open_turns).sum())
+        backward = np.fromiter(backward, dtype=np.int64)
+        if len(backward):
+            offsets = np.frombuffer(graph.offsets, dtype=np.int64)
+            sources = np.frombuffer(graph.sources, dtype=np.int64)
+            in_offsets = np.frombuffer(graph.in_offsets, dtype=np.int64)
+            in_edges = np.frombuffer(graph.in_edges, dtype=np.int64)
+            turn_masks = np.frombuffer(graph.turn_masks, dtype=np.uint64)
+            departure_masks = np.frombuffer(graph.departure_masks, dtype=np.uint64)
+            nodes = sources[backward]
+            counts = in_offsets[nodes + 1] - in_offsets[nodes]
+            # Every (incoming road, expanded state) pair is one turn check
+            previous = in_edges[np.repeat(in_offsets[nodes], counts) +
+                                np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)]
+            bits = np.repeat(backward - offsets[nodes], counts).astype(np.uint64)
+            allowed = (turn_masks[previous] >> bits) & np.uint64(1)
+            previous_sources = sources[previous]
+            previous_open = (departure_masks[previous_sources] >>
+                             (previous - offsets[previous_sources]).astype(np.uint64)) & np.uint64(1)
+            checks += len(previous)
+            # A closed incoming road has no allowed turns at all, so it is not a restriction
+            rejections += int(((allowed == 0) & (previous_open == 1)).sum())
+            closed += int((previous_open == 0).sum())
+
+        stats['turn_checks'] = checks
+        stats['turn_rejections'] = rejections
+        stats['closed_road_rejections'] = closed
+
+def _bounds(low, high):
+    """Bucket upper bounds 1, 2, 5, 10, 20, 50, ... times powers of ten from low to high"""
+    bounds = []
+    scale = low
+    while scale <= high:
+        bounds += [scale, scale * 2, scale * 5]
+        scale *= 10
+    return [bound for bound in bounds if bound <= high]
+
+class Histogram:
+    """Fixed-bucket histogram in the cumulative le-bucket style of Prometheus"""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (inf if it is past the last bound)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else float('inf')
+        return float('inf')
+
+    def to_dict(self):
+        cumulative = []
+        seen = 0
+        for bound, count in zip(self.bounds + ['+Inf'], self.counts):
+            seen += count
+            cumulative.append([bound, seen])
+        return {'count': self.count, 'sum': self.total, 'buckets': cumulative,
+                'p50': self.quantile(0.5), 'p99': self.quantile(0.99)}
+
+class SearchProfiler:
+    """
+    Aggregates per-query search stats into histograms per engine, for
+    dumping as JSON or scraping in the Prometheus text format.
+    """
+
+    # Metric -> bucket bounds
+    METRICS = {
+        'latency_ms': _bounds(0.01, 100000),
+        'expanded': _bounds(1, 10000000),
+        'pushed': _bounds(1, 10000000),
+        'max_frontier': _bounds(1, 10000000),
+        'turn_checks': _bounds(1, 10000000),
+        'turn_rejections': _bounds(1, 10000000),
+    }
+
+    def __init__(self):
+        # (engine, metric) -> Histogram; (engine, phase) -> total seconds
+        self.histograms = {}
+        self.phase_seconds = {}
+        self.queries = {}
+        self.cache_hits = 0
+
+    def record(self, stats, latency_ms):
+        """Add one query's stats dict and its end-to-end latency"""
+        engine = stats.get('engine', 'unknown')
+        self.queries[engine] = self.queries.get(engine, 0) + 1
+        values = dict(stats, latency_ms=latency_ms)
+        for metric, bounds in self.METRICS.items():
+            if metric in values:
+                histogram = self.histograms.get((engine, metric))
+                if histogram is None:
+                    histogram = self.histograms[(engine, metric)] = Histogram(bounds)
+                histogram.observe(values[metric])
+        for phase, seconds in stats.get('phases', {}).items():
+            self.phase_seconds[(engine, phase)] = self.phase_seconds.get((engine, phase), 0.0) + seconds
+
+    def to_dict(self):
+        engines = {}
+        for (engine, metric), histogram in sorted(self.histograms.items()):
+            engines.setdefault(engine, {'queries': self.queries[engine], 'phase_seconds': {}})[metric] = histogram.to_dict()
+        for (engine, phase), seconds in sorted(self.phase_seconds.items()):
+            engines.setdefault(engine, {'queries': self.queries[engine], 'phase_seconds': {}})['phase_seconds'][phase] = seconds
+        return {'cache_hits': self.cache_hits, 'engines': engines}
+
+    def dump(self, path):
+        """Write the histograms to a JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def to_prometheus(self, prefix='navigator_search'):
+        """Render the histograms in the Prometheus text exposition format"""
+        lines = [f'# TYPE {prefix}_cache_hits_total counter', f'{prefix}_cache_hits_total {self.cache_hits}']
+        for metric in self.METRICS:
+            name = f'{prefix}_{metric}'
+            entries = [(engine, histogram) for (engine, name_), histogram in sorted(self.histograms.items())
+                       if name_ == metric]
+            if not entries:
+                continue
+            lines.append(f'# TYPE {name} histogram')
+            for engine, histogram in entries:
+                seen = 0
+                for bound, count in zip(histogram.bounds + ['+Inf'], histogram.counts):
+                    seen += count
+                    lines.append(f'{name}_bucket{{engine="{engine}",le="{bound}"}} {seen}')
+                lines.append(f'{name}_sum{{engine="{engine}"}} {histogram.total}')
+                lines.append(f'{name}_count{{engine="{engine}"}} {histogram.count}')
+        if self.phase_seconds:
+            lines.append(f'# TYPE {prefix}_phase_seconds_total counter')
+            for (engine, phase), seconds in sorted(self.phase_seconds.items()):
+                lines.append(f'{prefix}_phase_seconds_total{{engine="{engine}",phase="{phase}"}} {seconds}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,210 @@
+import numpy as np
+
+class SpatialIndex:
+    """
+    Uniform grid hash over the intersections and road segments of a map.
+
+    Every item is bucketed in the square cells it overlaps, with the buckets
+    stored CSR-style (cell_start / cell_items) so a query only looks at the
+    cells around it. Searches grow outwards one ring of cells at a time: after
+    rings 0..r nothing unseen can be closer than r cell widths, which bounds
+    how far nearest-neighbour and snapping queries have to look.
+    """
+
+    def __init__(self, town_map, cell_size=None):
+        """
+        :param town_map: TownMap object
+        :param cell_size: Width of a grid cell in map units (default: about one intersection per cell)
+        """
+        self.node_ids = town_map.get_all_intersections()
+        positions = np.array([town_map.get_position(node_id) for node_id in self.node_ids],
+                             dtype=np.float64).reshape(-1, 2)
+        self.xs, self.ys = positions[:, 0].copy(), positions[:, 1].copy()
+
+        # Road segments, in get_all_roads() order
+        self.roads = list(town_map.get_all_roads())
+        node_index = {node_id: index for index, node_id in enumerate(self.node_ids)}
+        ends = np.array([(node_index[a], node_index[b]) for a, b in self.roads], dtype=np.int64).reshape(-1, 2)
+        self.x0, self.y0 = self.xs[ends[:, 0]], self.ys[ends[:, 0]]
+        self.x1, self.y1 = self.xs[ends[:, 1]], self.ys[ends[:, 1]]
+
+        self.min_x = self.xs.min() if len(self.xs) else 0.0
+        self.min_y = self.ys.min() if len(self.ys) else 0.0
+        width = (self.xs.max() - self.min_x) if len(self.xs) else 0.0
+        height = (self.ys.max() - self.min_y) if len(self.ys) else 0.0
+        if cell_size is None:
+            cell_size = max(width, height, 1.0) / max(1.0, np.sqrt(len(self.xs)))
+        self.cell_size = float(cell_size)
+        self.cols = int(width // self.cell_size) + 1
+        self.rows = int(height // self.cell_size) + 1
+
+        self.node_start, self.node_items = self._bucket(
+            self._cell_x(self.xs), self._cell_y(self.ys), self._cell_x(self.xs), self._cell_y(self.ys))
+        # A segment goes in every cell of its bounding box, which covers every cell it crosses
+        self.road_start, self.road_items = self._bucket(
+            self._cell_x(np.minimum(self.x0, self.x1)), self._cell_y(np.minimum(self.y0, self.y1)),
+            self._cell_x(np.maximum(self.x0, self.x1)), self._cell_y(np.maximum(self.y0, self.y1)))
+
+    def _cell_x(self, x):
+        return np.clip(np.floor((np.asarray(x, dtype=np.float64) - self.min_x) / self.cell_size),
+                       0, self.cols - 1).astype(np.int64)
+
+    def _cell_y(self, y):
+        return np.clip(np.floor((np.asarray(y, dtype=np.float64) - self.min_y) / self.cell_size),
+                       0, self.rows - 1).astype(np.int64)
+
+    def _bucket(self, col_low, row_low, col_high, row_high):
+        """Build CSR buckets for items covering cell rectangles [col_low..col_high] x [row_low..row_high]"""
+        spans_x = col_high - col_low + 1
+        spans_y = row_high - row_low + 1
+        counts = spans_x * spans_y
+        items = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+        # Position of each (item, cell) pair within its item's rectangle
+        within = np.arange(counts.sum(), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+        cols = np.repeat(col_low, counts) + within % np.repeat(spans_x, counts)
+        rows = np.repeat(row_low, counts) + within // np.repeat(spans_x, counts)
+        cells = rows * self.cols + cols
+        order = np.argsort(cells, kind='stable')
+        start = np.zeros(self.cols * self.rows + 1, dtype=np.int64)
+        np.add.at(start, cells + 1, 1)
+        return np.cumsum(start), items[order]
+
+    def _ring_cells(self, col, row, ring):
+        """Cell ids at Chebyshev distance ring from (col, row), clipped to the grid"""
+        if ring == 0:
+            offsets = [(0, 0)]
+        else:
+            offsets = [(dx, dy) for dx in range(-ring, ring + 1) for dy in (-ring, ring)]
+            offsets += [(dx, dy) for dx in (-ring, ring) for dy in range(-ring + 1, ring)]
+        return [(row + dy) * self.cols + col + dx for dx, dy in offsets
+                if 0 <= col + dx < self.cols and 0 <= row + dy < self.rows]
+
+    def _max_ring(self):
+        return max(self.cols, self.rows)
+
+    def nearest_k(self, x, y, k):
+        """
+        Find the k intersections closest to a point
+        :return: List of (intersection ID, distance), closest first
+        """
+        k = min(k, len(self.node_ids))
+        if k <= 0:
+            return []
+        col, row = int(self._cell_x(x)), int(self._cell_y(y))
+        found = []
+        for ring in range(self._max_ring() + 1):
+            for cell in self._ring_cells(col, row, ring):
+                found.extend(self.node_items[self.node_start[cell]:self.node_start[cell + 1]])
+            if len(found) >= k:
+                candidates = np.array(found)
+                distances = np.hypot(self.xs[candidates] - x, self.ys[candidates] - y)
+                order = np.argsort(distances, kind='stable')[:k]
+                if distances[order[-1]] <= ring * self.cell_size:
+                    break
+        return [(self.node_ids[candidates[i]], float(distances[i])) for i in order]
+
+    def nearest(self, x, y):
+        """Find the intersection closest to a point, or None on an empty map"""
+        found = self.nearest_k(x, y, 1)
+        return found[0][0] if found else None
+
+    def within_radius(self, x, y, radius):
+        """
+        Find every intersection within a distance of a point
+        :return: List of (intersection ID, distance), closest first
+        """
+        col_low, col_high = int(self._cell_x(x - radius)), int(self._cell_x(x + radius))
+        row_low, row_high = int(self._cell_y(y - radius)), int(self._cell_y(y + radius))
+        found = [self.node_items[self.node_start[cell]:self.node_start[cell + 1]]
+                 for row in range(row_low, row_high + 1)
+                 for cell in range(row * self.cols + col_low, row * self.cols + col_high + 1)]
+        candidates = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+        distances = np.hypot(self.xs[candidates] - x, self.ys[candidates] - y)
+        inside = np.nonzero(distances <= radius)[0]
+        inside = inside[np.argsort(distances[inside], kind='stable')]
+        return [(self.node_ids[candidates[i]], float(distances[i])) for i in inside]
+
+    def snap(self, x, y):
+        """
+        Snap a point to the nearest road segment
+        :return: (road as in get_all_roads(), (x, y) of the closest point on it, distance),
+                 or None if the map has no roads
+        """
+        roads, points, distances = self.snap_many([(x, y)])
+        if roads[0] == -1:
+            return None
+        return self.roads[roads[0]], (float(points[0, 0]), float(points[0, 1])), float(distances[0])
+
+    def snap_many(self, points):
+        """
+        Snap many points to their nearest road segments at once, with every ring
+        of the search evaluated for all unresolved points in a few NumPy passes
+        :param points: Sequence or (n, 2) array of (x, y)
+        :return: (road indices into self.roads, -1 if there are no roads;
+                  (n, 2) array of snapped points; distances)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        count = len(points)
+        best_road = np.full(count, -1, dtype=np.int64)
+        best_distance = np.full(count, np.inf)
+        best_t = np.zeros(count)
+        if not self.roads:
+            return best_road, points.copy(), best_distance
+        px, py = points[:, 0], points[:, 1]
+        cols, rows = self._cell_x(px), self._cell_y(py)
+        pending = np.arange(count)
+
+        for ring in range(self._max_ring() + 1):
+            if ring == 0:
+                offsets = np.zeros((1, 2), dtype=np.int64)
+            else:
+                span = np.arange(-ring, ring + 1)
+                side = np.arange(-ring + 1, ring)
+                offsets = np.concatenate([
+                    np.stack([span, np.full_like(span, -ring)], 1), np.stack([span, np.full_like(span, ring)], 1),
+                    np.stack([np.full_like(side, -ring), side], 1), np.stack([np.full_like(side, ring), side], 1)])
+
+            # Every (pending point, ring cell) pair inside the grid
+            owner = np.repeat(pending, len(offsets))
+            cell_cols = cols[owner] + np.tile(offsets[:, 0], len(pending))
+            cell_rows = rows[owner] + np.tile(offsets[:, 1], len(pending))
+            valid = (cell_cols >= 0) & (cell_cols < self.cols) & (cell_rows >= 0) & (cell_rows < self.rows)
+            owner, cells = owner[valid], (cell_rows * self.cols + cell_cols)[valid]
+
+            # Expand cells to their segments
+            starts, ends = self.road_start[cells], self.road_start[cells + 1]
+            counts = ends - starts
+            owner = np.repeat(owner, counts)
+            slots = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+            roads = self.road_items[slots]
+
+            if len(roads):
+                distances, ts = self._segment_distances(px[owner], py[owner], roads)
+                # Keep each point's closest candidate from this ring
+                order = np.lexsort((distances, owner))
+                first = order[np.unique(owner[order], return_index=True)[1]]
+                winners = owner[first]
+                better = distances[first] < best_distance[winners]
+                winners, first = winners[better], first[better]
+                best_distance[winners] = distances[first]
+                best_road[winners] = roads[first]
+                best_t[winners] = ts[first]
+
+            # Nothing outside rings 0..ring is closer than ring cell widths
+            pending = pending[best_distance[pending] > ring * self.cell_size]
+            if not len(pending):
+                break
+
+        snapped = np.stack([self.x0[best_road] + best_t * (self.x1[best_road] - self.x0[best_road]),
+                            self.y0[best_road] + best_t * (self.y1[best_road] - self.y0[best_road])], 1)
+        return best_road, snapped, best_distance
+
+    def _segment_distances(self, px, py, roads):
+        """Distances from points to segments, and the position t in [0, 1] of the closest point"""
+        x0, y0 = self.x0[roads], self.y0[roads]
+        dx, dy = self.x1[roads] - x0, self.y1[roads] - y0
+        length_squared = dx * dx + dy * dy
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t = np.where(length_squared > 0, ((px - x0) * dx + (py - y0) * dy) / length_squared, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        return np.hypot(x0 + t * dx - px, y0 + t * dy - py), t
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Check Connectivity against the reference search: unreachable() may only
+answer True for pairs with no route, and report() must match which
+intersections routes can get into and out of.
+"""
+
+from collections import deque
+from town_map import TownMap
+from connectivity import Connectivity
+from test_pathfinding import MAPS, reference_costs, with_closures
+
+def fragmented_maps(map_file):
+    """The map as loaded, with a few closures, and with enough closures to split it into many components"""
+    town_map = TownMap(map_file)
+    roads = len(list(town_map.get_all_roads()))
+    return [town_map, with_closures(map_file), with_closures(map_file, roads // 4, seed=8),
+            with_closures(map_file, roads // 2, seed=4)]
+
+def test_unreachable_is_exact_when_true():
+    for map_file in MAPS:
+        for town_map in fragmented_maps(map_file):
+            connectivity = Connectivity(town_map)
+            ids = town_map.get_all_intersections()
+            ruled_out = unreachable = 0
+            for start in ids:
+                references = reference_costs(town_map, start, 'hops')
+                for goal in ids:
+                    if connectivity.unreachable(start, goal):
+                        assert goal not in references, f"{map_file}: {start}->{goal} has a route but was ruled out"
+                        ruled_out += 1
+                    unreachable += goal not in references
+            assert ruled_out <= unreachable
+        # The heavily closed map has unreachable pairs, and most of them are ruled out without a search
+        assert unreachable and ruled_out >= unreachable // 2, (map_file, ruled_out, unreachable)
+
+def reference_state_reach(town_map):
+    """
+    Breadth-first search from every road over allowed turns, using only the TownMap API.
+    A closed road is still a state, but no turn leads onto or off it.
+    :return: Dict of (from, to) road -> set of roads a route starting on it can continue onto
+    """
+    states = [(a, b) for a in town_map.get_all_intersections() for b in town_map.get_neighbors(a)]
+    reach = {}
+    for state in states:
+        seen = {state}
+        queue = deque([state])
+        while queue:
+            previous, current = queue.popleft()
+            for neighbor in town_map.get_neighbors(current):
+                if town_map.is_turn_allowed(previous, current, neighbor) and (current, neighbor) not in seen:
+                    seen.add((current, neighbor))
+                    queue.append((current, neighbor))
+        reach[state] = seen
+    return reach
+
+def test_report_matches_reference():
+    for map_file in MAPS:
+        for town_map in fragmented_maps(map_file):
+            connectivity = Connectivity(town_map)
+            report = connectivity.report()
+            graph = connectivity.graph
+            reach = reference_state_reach(town_map)
+            components = {frozenset(other for other in reach[state] if state in reach[other]) for state in reach}
+            largest = max(map(len, components))
+            assert connectivity.component_count == len(components), map_file
+            main = {(graph.node_ids[graph.sources[edge]], graph.node_ids[graph.targets[edge]])
+                    for edge in range(len(graph.targets)) if connectivity.component[edge] == connectivity.main_component()}
+            assert main in components and len(main) == largest, map_file
+
+            ids = town_map.get_all_intersections()
+            entered = {current for state in main for _, current in reach[state]}
+            left = {a for (a, b), reached in reach.items() if reached & main and not town_map.is_road_blocked(a, b)}
+            assert set(report['unreachable']) == set(ids) - entered, map_file
+            assert set(report['stranded']) == set(ids) - left, map_file
+            grouped = [node_id for area in report['isolated'] for node_id in area]
+            assert sorted(grouped) == sorted(set(report['unreachable']) | set(report['stranded']))
+            assert report['main_component_states'] == largest and report['states'] == len(graph.targets)
+
+if __name__ == "__main__":
+    test_unreachable_is_exact_when_true()
+    print("[OK] unreachable() only rules out pairs without a route")
+    test_report_matches_reference()
+    print("[OK] connectivity report matches the reference search")
+    print("\n[SUCCESS] Connectivity verified")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Check Isochrones against a plain budgeted Dijkstra over the TownMap API:
+the reachable sets, the bands, the partial-road boundary points and the outline.
+"""
+
+import heapq
+import random
+from town_map import TownMap
+from isochrones import Isochrones
+from test_pathfinding import MAPS, road_cost, with_closures
+
+def reference_entries(town_map, start, cost):
+    """
+    Dijkstra over (previous, current) roads, recording the cheapest cost at
+    which each road can be entered
+    :return: Dict of (from, to) road -> entry cost
+    """
+    entries = {}
+    heap = []
+    for neighbor in town_map.get_neighbors(start):
+        if not town_map.is_road_blocked(start, neighbor):
+            entries[(start, neighbor)] = 0
+            heap.append((road_cost(town_map, start, neighbor, cost), start, neighbor))
+    heapq.heapify(heap)
+    settled = set()
+    while heap:
+        cost_so_far, previous, current = heapq.heappop(heap)
+        if (previous, current) in settled:
+            continue
+        settled.add((previous, current))
+        for neighbor in town_map.get_neighbors(current):
+            if town_map.is_turn_allowed(previous, current, neighbor):
+                if cost_so_far < entries.get((current, neighbor), float('inf')):
+                    entries[(current, neighbor)] = cost_so_far
+                heapq.heappush(heap, (cost_so_far + road_cost(town_map, current, neighbor, cost), current, neighbor))
+    return entries
+
+def reference_reachable(town_map, start, cost, budget, entries):
+    """Intersections whose cheapest arrival is within budget, with that arrival cost"""
+    arrivals = {start: 0}
+    for (a, b), entry in entries.items():
+        arrival = entry + road_cost(town_map, a, b, cost)
+        if arrival < arrivals.get(b, float('inf')):
+            arrivals[b] = arrival
+    return {node_id: arrival for node_id, arrival in arrivals.items() if arrival <= budget}
+
+def reference_boundary(town_map, start, cost, budget, entries):
+    """The start plus, on every road entered within budget, the farthest point reached along it"""
+    points = [town_map.get_position(start)]
+    for (a, b), entry in entries.items():
+        if entry < budget:
+            length = road_cost(town_map, a, b, cost)
+            fraction = min(1.0, (budget - entry) / length) if length > 0 else 1.0
+            (x0, y0), (x1, y1) = town_map.get_position(a), town_map.get_position(b)
+            points.append((x0 + fraction * (x1 - x0), y0 + fraction * (y1 - y0)))
+    return points
+
+def same_costs(found, expected):
+    return found.keys() == expected.keys() and all(
+        abs(found[node_id] - expected[node_id]) <= 1e-9 * max(1, expected[node_id]) for node_id in expected)
+
+def budgets_for(cost):
+    return {'hops': [0, 1, 3, 7], 'distance': [0, 2, 6, 12], 'time': [0, 0.5, 2, 5]}[cost]
+
+def test_reachable_matches_reference():
+    for map_file in MAPS:
+        for town_map in (TownMap(map_file), with_closures(map_file)):
+            starts = random.Random(5).sample(town_map.get_all_intersections(), 6)
+            for cost in ('hops', 'distance', 'time'):
+                budgets = budgets_for(cost)
+                for start in starts:
+                    isochrones = Isochrones(town_map, start, budgets, cost)
+                    entries = reference_entries(town_map, start, cost)
+                    covered = {}
+                    for budget, band in isochrones.bands():
+                        expected = reference_reachable(town_map, start, cost, budget, entries)
+                        assert same_costs(isochrones.reachable(budget), expected), (map_file, cost, start, budget)
+                        assert not covered.keys() & band.keys()
+                        covered.update(band)
+                        assert same_costs(covered, expected), (map_file, cost, start, budget)
+                    # Budgets between the searched ones are answered from the same search
+                    middle = (budgets[1] + budgets[2]) / 2
+                    assert same_costs(isochrones.reachable(middle),
+                                      reference_reachable(town_map, start, cost, middle, entries))
+
+def test_boundary_matches_reference():
+    for map_file in MAPS:
+        town_map = with_closures(map_file)
+        for start in random.Random(9).sample(town_map.get_all_intersections(), 4):
+            for cost in ('distance', 'time'):
+                budgets = budgets_for(cost)
+                isochrones = Isochrones(town_map, start, budgets, cost)
+                entries = reference_entries(town_map, start, cost)
+                for budget in budgets[1:]:
+                    xs, ys = isochrones.boundary_points(budget)
+                    found = sorted((round(x, 6), round(y, 6)) for x, y in zip(xs.tolist(), ys.tolist()))
+                    expected = sorted((round(x, 6), round(y, 6))
+                                      for x, y in reference_boundary(town_map, start, cost, budget, entries))
+                    assert found == expected, (map_file, start, cost, budget)
+                    # The outline is the convex hull: its corners are boundary points and it contains all of them
+                    outline = isochrones.polygon(budget)
+                    assert set((round(x, 6), round(y, 6)) for x, y in outline) <= set(found)
+                    if len(outline) >= 3:
+                        for x, y in zip(xs, ys):
+                            for (ax, ay), (bx, by) in zip(outline, outline[1:] + outline[:1]):
+                                assert (bx - ax) * (y - ay) - (by - ay) * (x - ax) >= -1e-6, (map_file, start, budget)
+
+if __name__ == "__main__":
+    test_reachable_matches_reference()
+    print("[OK] reachable sets and bands match a budgeted reference search")
+    test_boundary_matches_reference()
+    print("[OK] boundary points and outline match the reference")
+    print("\n[SUCCESS] Isochrones verified")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Check that the binary map and the streaming loader give the same map,
+and the same routes, as loading the JSON file.
+"""
+
+import os
+import tempfile
+from town_map import TownMap
+from binary_map import export_binary, load_binary, SECTIONS
+from pathfinding import astar_shortest_path_with_turns, bfs_shortest_path_with_turns
+from test_pathfinding import MAPS, query_pairs
+
+def test_binary_map_matches_json():
+    for map_file in MAPS:
+        town_map = TownMap(map_file)
+        compiled = town_map.compile()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'map.bin')
+            export_binary(town_map, path)
+            mapped = load_binary(path)
+            for name, _ in SECTIONS:
+                if hasattr(compiled, name):
+                    assert list(getattr(mapped, name)) == list(getattr(compiled, name)), f"{map_file}: {name} differs"
+            assert list(mapped.node_ids) == list(compiled.node_ids)
+            for node_id, index in compiled.node_index.items():
+                assert mapped.node_index[node_id] == index
+            assert 'no-such-intersection' not in mapped.node_index
+            for start, goal in query_pairs(town_map):
+                for cost in ('hops', 'time'):
+                    assert astar_shortest_path_with_turns(mapped, start, goal, cost) == \
+                        astar_shortest_path_with_turns(town_map, start, goal, cost), f"{start}->{goal} ({cost})"
+            del mapped
+
+def test_streaming_matches_json():
+    for map_file in MAPS:
+        loaded, streamed = TownMap(map_file), TownMap(map_file, streaming=True)
+        assert streamed.intersections == loaded.intersections
+        assert streamed.road_types == loaded.road_types
+        assert streamed.traffic_restrictions == loaded.traffic_restrictions
+        assert sorted(streamed.get_all_roads()) == sorted(loaded.get_all_roads())
+        for name, _ in SECTIONS:
+            if hasattr(loaded.compile(), name):
+                assert list(getattr(streamed.compile(), name)) == list(getattr(loaded.compile(), name)), name
+        for start, goal in query_pairs(loaded):
+            assert bfs_shortest_path_with_turns(streamed, start, goal) == \
+                bfs_shortest_path_with_turns(loaded, start, goal), f"{start}->{goal}"
+
+if __name__ == "__main__":
+    test_binary_map_matches_json()
+    print("[OK] binary maps match the JSON maps")
+    test_streaming_matches_json()
+    print("[OK] streamed maps match the JSON maps")
+    print("\n[SUCCESS] Map loaders verified")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Check NavigationSystem's batch and caching layers against plain per-query
+routing: the results must not depend on how queries are grouped or served.
+"""
+
+import random
+import route_cache
+from navigation import NavigationSystem
+from route_cache import RouteCache
+from test_pathfinding import query_pairs, with_closures, reference_costs, road_cost, check_route
+
+MAP_FILE = 'large_map_data.json'
+
+def closed_nav(map_file=MAP_FILE):
+    """
+    A NavigationSystem with a few random closures plus every road of one
+    intersection closed, so pairs with that intersection are unreachable
+    :return: (NavigationSystem, the isolated intersection)
+    """
+    nav = NavigationSystem(map_file)
+    isolated = nav.town_map.get_all_intersections()[5]
+    closures = with_closures(map_file).traffic_restrictions['blocked_roads']
+    closures += [f"{a}-{b}" for a, b in nav.town_map.get_all_roads() if isolated in (a, b)]
+    nav.update_traffic(closed=closures)
+    return nav, isolated
+
+def test_route_batch_workers_match_sequential():
+    nav, isolated = closed_nav()
+    pairs = query_pairs(nav.town_map, 300)
+    # Repeats are served from the cache, and the first start gets a cached tree below
+    pairs += pairs[:20] + [(isolated, pairs[0][1]), (pairs[0][0], isolated)]
+    setups = (('hops', None), ('time', 'landmarks'), ('distance', 'overlay'), ('time', 'hierarchy'))
+    for cost, engine in setups:
+        navs = [closed_nav()[0] for _ in range(3)]
+        for nav in navs:
+            if engine == 'landmarks':
+                nav.build_landmarks(cost)
+            elif engine == 'overlay':
+                nav.build_overlay(cost)
+            elif engine == 'hierarchy':
+                nav.build_hierarchy(cost)
+        sequential, ordered, unordered = navs
+        expected = [sequential.find_route(start, goal, cost) for start, goal in pairs]
+        assert list(sequential.route_batch(pairs, cost)) == [(start, goal, path) for (start, goal), path
+                                                             in zip(pairs, expected)]
+        assert any(path is None for path in expected), "no unreachable pair was tested"
+        for nav in (ordered, unordered):
+            nav.route_tree(pairs[0][0], cost)
+            nav.find_route(*pairs[1], cost)
+        assert list(ordered.route_batch(pairs, cost, workers=2)) == list(sequential.route_batch(pairs, cost))
+        results = list(unordered.route_batch(pairs, cost, workers=2, ordered=False))
+        assert len(results) == len(pairs)
+        assert set(results) == set(sequential.route_batch(pairs, cost)), (cost, engine)
+        # Worker results went into the cache
+        hits = ordered.route_cache.hits
+        assert list(ordered.route_batch(pairs, cost, workers=2)) == list(sequential.route_batch(pairs, cost))
+        assert ordered.route_cache.hits == hits + len(pairs)
+
+def test_route_batch_rejects_cost_when_called():
+    nav = NavigationSystem('complex_town_map.json')
+    for workers in (None, 2):
+        try:
+            nav.route_batch([('0', '44')], 'fastest', workers=workers)
+        except ValueError:
+            continue
+        raise AssertionError("an unknown cost mode was accepted")
+
+def test_distance_matrix_matches_find_route():
+    nav, isolated = closed_nav()
+    town_map = nav.town_map
+    ids = town_map.get_all_intersections()
+    sources = ids[:6] + [isolated]
+    targets = ids[3:15] + [isolated, sources[0]]
+    for cost in ('hops', 'distance', 'time'):
+        matrix, paths = nav.distance_matrix(sources, targets, cost, return_paths=True)
+        assert matrix.shape == (len(sources), len(targets))
+        for i, source in enumerate(sources):
+            references = reference_costs(town_map, source, cost)
+            for j, target in enumerate(targets):
+                expected = references.get(target)
+                check_route(town_map, paths[i][j], source, target, cost, expected)
+                route = nav.find_route(source, target, cost)
+                if expected is None:
+                    assert matrix[i, j] == float('inf') and route is None, (source, target)
+                    continue
+                route_cost = sum(road_cost(town_map, a, b, cost) for a, b in zip(route, route[1:]))
+                assert abs(matrix[i, j] - expected) <= 1e-9 * max(1, expected), (source, target, cost)
+                assert abs(matrix[i, j] - route_cost) <= 1e-9 * max(1, expected), (source, target, cost)
+        assert (matrix == float('inf')).any(), "no unreachable pair was tested"
+        pooled = nav.distance_matrix(sources, targets, cost, workers=2)
+        assert (pooled == matrix).all(), cost
+
+class FakeClock:
+    """Stands in for the time module in route_cache so TTLs can be tested without sleeping"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+class ReferenceCache:
+    """Plain list model of an LRU + TTL + version cache: most recently used last"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size, self.ttl = max_size, ttl
+        self.entries = []
+        self.counts = dict.fromkeys(('hits', 'misses', 'evictions', 'expirations', 'invalidations'), 0)
+
+    def find(self, key):
+        return next((entry for entry in self.entries if entry[0] == key), None)
+
+    def get(self, key, version, now):
+        entry = self.find(key)
+        if entry is None:
+            self.counts['misses'] += 1
+            return RouteCache.MISS
+        self.entries.remove(entry)
+        _, path, stored_at, stored_version = entry
+        if stored_version != version:
+            self.counts['invalidations'] += 1
+        elif self.ttl is not None and now - stored_at > self.ttl:
+            self.counts['expirations'] += 1
+        else:
+            self.entries.append(entry)
+            self.counts['hits'] += 1
+            return path
+        self.counts['misses'] += 1
+        return RouteCache.MISS
+
+    def put(self, key, path, version, now):
+        entry = self.find(key)
+        if entry is not None:
+            self.entries.remove(entry)
+        self.entries.append((key, tuple(path) if path is not None else None, now, version))
+        while len(self.entries) > self.max_size:
+            self.entries.pop(0)
+            self.counts['evictions'] += 1
+
+def test_route_cache_matches_reference():
+    clock = FakeClock()
+    real_time = route_cache.time
+    route_cache.time = clock
+    try:
+        for max_size, ttl in ((1, None), (4, None), (6, 5.0), (3, 0.5)):
+            rng = random.Random(max_size)
+            cache, reference = RouteCache(max_size, ttl), ReferenceCache(max_size, ttl)
+            keys = [(str(start), str(goal), 'time') for start in range(4) for goal in range(3)]
+            for _ in range(3000):
+                clock.now += rng.choice((0, 0, 0.1, 0.4, 2.0))
+                key, version = rng.choice(keys), rng.choice((1, 1, 1, 2))
+                if rng.random() < 0.5:
+                    path = rng.choice((None, [key[0], key[1]], [key[0], 'x', key[1]]))
+                    stored = cache.put(key, path, version)
+                    assert stored == (tuple(path) if path is not None else None) and isinstance(stored, (tuple, type(None)))
+                    reference.put(key, path, version, clock.now)
+                else:
+                    assert cache.get(key, version) == reference.get(key, version, clock.now)
+                stats = cache.get_stats()
+                assert stats['size'] == len(cache) == len(reference.entries) <= max_size
+                assert {name: stats[name] for name in reference.counts} == reference.counts, (max_size, ttl)
+                lookups = stats['hits'] + stats['misses']
+                assert stats['hit_rate'] == (stats['hits'] / lookups if lookups else 0.0)
+            assert all(reference.counts[name] for name in ('hits', 'misses', 'evictions')), reference.counts
+            assert ttl is None or reference.counts['expirations']
+    finally:
+        route_cache.time = real_time
+
+def test_find_route_cache_counters():
+    nav = NavigationSystem('complex_town_map.json', cache_size=2)
+    pairs = [('0', '17'), ('5', '40'), ('22', '40')]
+    for start, goal in pairs:
+        nav.find_route(start, goal, 'time')
+    assert nav.route_cache.get_stats()['misses'] == 3 and nav.route_cache.evictions == 1
+    # The oldest pair was evicted; the newer two are hits and return the same tuples
+    assert nav.find_route('22', '40', 'time') is nav.find_route('22', '40', 'time')
+    nav.find_route('0', '17', 'time')
+    stats = nav.route_cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (2, 4, 2)
+
+if __name__ == "__main__":
+    test_route_batch_workers_match_sequential()
+    print("[OK] route_batch with workers matches sequential routing, ordered and unordered")
+    test_route_batch_rejects_cost_when_called()
+    print("[OK] route_batch checks the cost mode when called")
+    test_distance_matrix_matches_find_route()
+    print("[OK] distance_matrix matches find_route and a reference search")
+    test_route_cache_matches_reference()
+    print("[OK] route cache LRU, TTL and counters match a reference model")
+    test_find_route_cache_counters()
+    print("[OK] find_route counts cache hits, misses and evictions")
+    print("\n[SUCCESS] Navigation batches verified")
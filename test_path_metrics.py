@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Check path_metrics against per-path TownMap lookups, and that paths it
+cannot follow (unknown intersections, missing roads, None) are marked invalid
+with no metrics.
+"""
+
+import math
+from town_map import TownMap
+from path_metrics import path_metrics, road_type_counts
+from pathfinding import bfs_shortest_path_with_turns
+from test_pathfinding import MAPS, query_pairs
+
+def test_metrics_match_town_map():
+    for map_file in MAPS:
+        town_map = TownMap(map_file)
+        paths = [bfs_shortest_path_with_turns(town_map, start, goal) for start, goal in query_pairs(town_map, 200)]
+        paths = [path for path in paths if path]
+        metrics = path_metrics(town_map, paths)
+        for row, path in enumerate(paths):
+            road_types = {}
+            for a, b in zip(path, path[1:]):
+                name = town_map.get_road_type(a, b)['type']
+                road_types[name] = road_types.get(name, 0) + 1
+            assert metrics['valid'][row]
+            assert metrics['segments'][row] == len(path) - 1
+            assert math.isclose(metrics['distance'][row], town_map.get_path_distance(path), abs_tol=1e-9)
+            assert math.isclose(metrics['time'][row], town_map.get_path_time(path), abs_tol=1e-9)
+            assert metrics['traffic_lights'][row] == sum(town_map.has_traffic_light(node) for node in path[1:])
+            assert road_type_counts(metrics, row) == road_types, path
+
+def test_invalid_paths():
+    town_map = TownMap('complex_town_map.json')
+    road = bfs_shortest_path_with_turns(town_map, '0', '44')
+    invalid = [['0', '44'], ['0', 'no-such-intersection'], ['no-such-intersection', road[1]],
+               ['no-such-intersection'], None]
+    metrics = path_metrics(town_map, [road] + invalid)
+    assert metrics['valid'][0]
+    for row in range(1, len(invalid) + 1):
+        assert not metrics['valid'][row]
+        assert math.isnan(metrics['distance'][row]) and math.isnan(metrics['time'][row])
+        assert metrics['traffic_lights'][row] == 0
+        assert road_type_counts(metrics, row) == {}, invalid[row - 1]
+
+if __name__ == "__main__":
+    test_metrics_match_town_map()
+    print("[OK] path metrics match the TownMap lookups")
+    test_invalid_paths()
+    print("[OK] invalid paths are flagged with no metrics")
+    print("\n[SUCCESS] Path metrics verified")
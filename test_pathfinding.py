@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Cross-check every routing engine against a plain reference search on the sample maps.
+"""
+
+import heapq
+import json
+import os
+import random
+import tempfile
+from town_map import TownMap
+from binary_map import export_binary, load_binary
+from traffic_profiles import minutes_of_day
+from pathfinding import (bfs_shortest_path_with_turns, bidirectional_bfs_with_turns,
+                         dijkstra_shortest_path_with_turns, astar_shortest_path_with_turns,
+                         bidirectional_dijkstra_with_turns, ShortestPathTree, time_dependent_shortest_path)
+from contraction import ContractionHierarchy
+from landmarks import Landmarks
+from overlay import Partition, Overlay
+from alternatives import find_alternatives
+
+MAPS = ('complex_town_map.json', 'large_map_data.json')
+
+def road_cost(town_map, from_intersection, to_intersection, cost):
+    if cost == 'hops':
+        return 1
+    if cost == 'distance':
+        return town_map.get_road_distance(from_intersection, to_intersection)
+    return town_map.get_road_time(from_intersection, to_intersection)
+
+def reference_costs(town_map, start, cost):
+    """
+    Dijkstra over (previous, current) intersection pairs using only the
+    TownMap API, independent of the compiled graph the engines search
+    :return: Dict of intersection -> cheapest route cost from start
+    """
+    heap = [(road_cost(town_map, start, neighbor, cost), start, neighbor)
+            for neighbor in town_map.get_neighbors(start) if not town_map.is_road_blocked(start, neighbor)]
+    heapq.heapify(heap)
+    settled = set()
+    costs = {start: 0}
+    while heap:
+        cost_so_far, previous, current = heapq.heappop(heap)
+        if (previous, current) in settled:
+            continue
+        settled.add((previous, current))
+        costs.setdefault(current, cost_so_far)
+        for neighbor in town_map.get_neighbors(current):
+            if town_map.is_turn_allowed(previous, current, neighbor) and (current, neighbor) not in settled:
+                heapq.heappush(heap, (cost_so_far + road_cost(town_map, current, neighbor, cost), current, neighbor))
+    return costs
+
+def check_route(town_map, path, start, goal, cost, expected):
+    """Assert that path is a legal route from start to goal costing expected (None if unreachable)"""
+    if expected is None:
+        assert path is None, f"{start}->{goal}: expected no route, got {path}"
+        return
+    assert path is not None, f"{start}->{goal}: expected a route costing {expected}"
+    path = list(path)
+    assert path[0] == start and path[-1] == goal, path
+    if len(path) > 1:
+        assert not town_map.is_road_blocked(path[0], path[1]), path
+    for previous, current, following in zip(path, path[1:], path[2:]):
+        assert town_map.is_turn_allowed(previous, current, following), f"illegal turn {previous}-{current}-{following}"
+    total = sum(road_cost(town_map, a, b, cost) for a, b in zip(path, path[1:]))
+    assert abs(total - expected) <= 1e-9 * max(1, expected), f"{start}->{goal}: cost {total}, expected {expected}"
+
+def query_pairs(town_map, count=400, seed=7):
+    """All pairs on small maps, a seeded sample on larger ones"""
+    ids = town_map.get_all_intersections()
+    pairs = [(start, goal) for start in ids for goal in ids]
+    if len(pairs) > count:
+        pairs = random.Random(seed).sample(pairs, count)
+    return pairs
+
+def with_closures(map_file, count=4, seed=3):
+    """Load a map and close a few roads, so engines also meet blocked roads"""
+    town_map = TownMap(map_file)
+    roads = sorted(f"{road[0]}-{road[1]}" for road in town_map.get_all_roads())
+    town_map.update_traffic(closed=random.Random(seed).sample(roads, count))
+    return town_map
+
+def check_engine(route, cost, maps=MAPS):
+    """Check route(town_map, start, goal) against the reference on every map, with and without closures"""
+    for map_file in maps:
+        for town_map in (TownMap(map_file), with_closures(map_file)):
+            engine = route(town_map)
+            references = {}
+            for start, goal in query_pairs(town_map):
+                if start not in references:
+                    references[start] = reference_costs(town_map, start, cost)
+                check_route(town_map, engine(start, goal), start, goal, cost, references[start].get(goal))
+
+def test_astar():
+    for cost in ('hops', 'distance', 'time'):
+        check_engine(lambda town_map: lambda start, goal: astar_shortest_path_with_turns(town_map, start, goal, cost), cost)
+
+def test_dijkstra():
+    for cost in ('distance', 'time'):
+        check_engine(lambda town_map: lambda start, goal: dijkstra_shortest_path_with_turns(town_map, start, goal, cost), cost)
+
+def test_bfs():
+    check_engine(lambda town_map: lambda start, goal: bfs_shortest_path_with_turns(town_map, start, goal), 'hops')
+
+def test_bidirectional_bfs():
+    check_engine(lambda town_map: lambda start, goal: bidirectional_bfs_with_turns(town_map, start, goal), 'hops')
+
+def test_bidirectional_dijkstra():
+    for cost in ('hops', 'time'):
+        check_engine(lambda town_map: lambda start, goal:
+                     bidirectional_dijkstra_with_turns(town_map, start, goal, cost), cost)
+
+def test_shortest_path_tree():
+    def route(town_map):
+        trees = {}
+
+        def path(start, goal):
+            if start not in trees:
+                trees[start] = ShortestPathTree(town_map, start, 'time')
+            return trees[start].path_to(goal)
+        return path
+    check_engine(route, 'time')
+
+def test_contraction_hierarchy():
+    check_engine(lambda town_map: ContractionHierarchy.build(town_map, 'time').query, 'time')
+
+def check_saved_file(build, load, map_file='complex_town_map.json', cost_sensitive=True):
+    """
+    Save what build(town_map) preprocesses and check that load(path, town_map)
+    accepts the same map, in JSON or binary form, and rejects a different map
+    (also one with the same roads but a moved intersection) and, if
+    cost_sensitive, a map whose speeds or closures changed since
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'saved.npz')
+        build(TownMap(map_file)).save(path)
+        load(path, TownMap(map_file))
+        binary_file = os.path.join(directory, 'map.navmap')
+        export_binary(map_file, binary_file)
+        load(path, load_binary(binary_file))
+
+        roads = sorted(f"{road[0]}-{road[1]}" for road in TownMap(map_file).get_all_roads())
+        slower, closed = TownMap(map_file), TownMap(map_file)
+        road = roads[len(roads) // 2]
+        slower.update_traffic({road: slower.get_road_type(*road.split('-'))['speed_limit'] / 2})
+        closed.update_traffic(closed=[road])
+        # Same roads, one intersection moved: the counts match but the geometry does not
+        with open(map_file, encoding='utf-8') as f:
+            map_data = json.load(f)
+        moved = next(iter(map_data['intersections'].values()))
+        moved['x'] += 1
+        moved_file = os.path.join(directory, 'moved.json')
+        with open(moved_file, 'w', encoding='utf-8') as f:
+            json.dump(map_data, f)
+        other = next(name for name in MAPS if name != map_file)
+        for town_map, changed in ((slower, cost_sensitive), (closed, cost_sensitive),
+                                  (TownMap(moved_file), True), (TownMap(other), True)):
+            try:
+                load(path, town_map)
+            except ValueError:
+                assert changed, "a file was rejected for a change it does not depend on"
+                continue
+            assert not changed, "a file built for another metric was accepted"
+
+def test_contraction_files():
+    check_saved_file(lambda town_map: ContractionHierarchy.build(town_map, 'time'), ContractionHierarchy.load)
+    # Distances do not depend on speeds, but closures change them
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'saved.npz')
+        ContractionHierarchy.build(TownMap('complex_town_map.json'), 'distance').save(path)
+        town_map = TownMap('complex_town_map.json')
+        town_map.update_traffic({'0-6': 10})
+        ContractionHierarchy.load(path, town_map)
+
+def test_contraction_cost_matrix():
+    for map_file in MAPS:
+        for town_map in (TownMap(map_file), with_closures(map_file)):
+            hierarchy = ContractionHierarchy.build(town_map, 'time')
+            points = town_map.get_all_intersections()[::3]
+            matrix = hierarchy.cost_matrix(points, points + points[:2])
+            for row, start in enumerate(points):
+                references = reference_costs(town_map, start, 'time')
+                for column, goal in enumerate(points + points[:2]):
+                    expected = references.get(goal, float('inf'))
+                    assert abs(matrix[row, column] - expected) <= 1e-9 * max(1, expected) or \
+                        matrix[row, column] == expected, f"{start}->{goal}: {matrix[row, column]}, expected {expected}"
+
+def test_landmarks():
+    for landmarks in (None, 'farthest'):
+        def route(town_map):
+            table = Landmarks.build(town_map, 'time', landmarks, count=4)
+            return lambda start, goal: astar_shortest_path_with_turns(town_map, start, goal, 'time', landmarks=table)
+        check_engine(route, 'time')
+
+def test_landmark_files():
+    check_saved_file(lambda town_map: Landmarks.build(town_map, 'time', 'farthest', count=4), Landmarks.load)
+
+def test_overlay():
+    for cost in ('hops', 'time'):
+        check_engine(lambda town_map: Overlay(Partition.build(town_map, (6, 20)), cost).query, cost)
+
+def test_partition_files():
+    # Cells depend on the road graph only, so traffic changes keep a saved partition valid
+    check_saved_file(lambda town_map: Partition.build(town_map, (6, 20)), Partition.load, cost_sensitive=False)
+
+def test_alternatives():
+    check_engine(lambda town_map: lambda start, goal: (find_alternatives(town_map, start, goal) or [None])[0], 'time')
+    town_map = TownMap('large_map_data.json')
+    for start, goal in query_pairs(town_map, 100):
+        routes = find_alternatives(town_map, start, goal, k=3)
+        assert len(routes) <= 3
+        for path in routes[1:]:
+            check_route(town_map, path, start, goal, 'time', town_map.get_path_time(path))
+            assert len(set(path)) == len(path), path
+            assert town_map.get_path_time(path) <= 1.4 * town_map.get_path_time(routes[0]) * (1 + 1e-9)
+    for k in (0, -1):
+        try:
+            find_alternatives(town_map, '0', '1', k=k)
+        except ValueError:
+            continue
+        raise AssertionError(f"k={k} was accepted")
+
+def reference_road_arrival(town_map, from_intersection, to_intersection, depart, step=0.05):
+    """
+    Drive one road by stepping the clock and summing the distance covered at
+    the profile speed of each instant, independent of SpeedProfiles.traverse
+    :return: Arrival time in minutes
+    """
+    road_type = town_map.get_road_type(from_intersection, to_intersection)
+    road_class = town_map.profiles.class_of(road_type.get('type', 'local_road'))
+    remaining = town_map.get_road_distance(from_intersection, to_intersection) * 0.1  # km
+    km_per_minute = road_type['speed_limit'] / 60
+    now = depart
+    speed = town_map.profiles.factor(road_class, now) * km_per_minute
+    while True:
+        next_speed = town_map.profiles.factor(road_class, now + step) * km_per_minute
+        covered = (speed + next_speed) / 2 * step
+        if covered >= remaining:
+            # Constant acceleration within the step: solve speed * x + a / 2 * x^2 = remaining
+            acceleration = (next_speed - speed) / step
+            return now + 2 * remaining / (speed + (speed * speed + 2 * acceleration * remaining) ** 0.5)
+        remaining -= covered
+        now += step
+        speed = next_speed
+
+def reference_arrivals(town_map, start, depart):
+    """
+    Earliest arrival at every intersection for a departure time: Dijkstra over
+    (previous, current) pairs on the TownMap API, with brute-force road times
+    and the expected wait at each traffic light passed through
+    """
+    heap = [(reference_road_arrival(town_map, start, neighbor, depart), start, neighbor)
+            for neighbor in town_map.get_neighbors(start) if not town_map.is_road_blocked(start, neighbor)]
+    heapq.heapify(heap)
+    settled = set()
+    arrivals = {start: depart}
+    while heap:
+        now, previous, current = heapq.heappop(heap)
+        if (previous, current) in settled:
+            continue
+        settled.add((previous, current))
+        arrivals.setdefault(current, now)
+        if town_map.has_traffic_light(current):
+            now += town_map.profiles.signal_wait
+        for neighbor in town_map.get_neighbors(current):
+            if town_map.is_turn_allowed(previous, current, neighbor) and (current, neighbor) not in settled:
+                heapq.heappush(heap, (reference_road_arrival(town_map, current, neighbor, now), current, neighbor))
+    return arrivals
+
+def test_time_dependent():
+    # Rush hours, just before midnight (the drive crosses into the next day) and exact day boundaries
+    departures = (0, '07:45', '17:30', 1439, 1439.99, 2 * 24 * 60)
+    for map_file in MAPS:
+        for town_map in (TownMap(map_file), with_closures(map_file)):
+            pairs = query_pairs(town_map, 60)
+            starts = sorted({start for start, _ in pairs})[:6]
+            for depart in departures:
+                for start in starts:
+                    arrivals = reference_arrivals(town_map, start, minutes_of_day(depart))
+                    for goal in town_map.get_all_intersections()[::4]:
+                        path = time_dependent_shortest_path(town_map, start, goal, depart)
+                        if goal not in arrivals:
+                            assert path is None, f"{start}->{goal}: expected no route, got {path}"
+                            continue
+                        check_route(town_map, path, start, goal, 'hops', len(path) - 1)
+                        expected = arrivals[goal] - minutes_of_day(depart)
+                        total = town_map.get_path_time(path, depart)
+                        assert abs(total - expected) <= 1e-6 * max(1, expected), \
+                            f"{start}->{goal} at {depart}: {total}, expected {expected}"
+
+    # Closing a road on the route forces a detour that never arrives earlier
+    town_map = TownMap('complex_town_map.json')
+    path = time_dependent_shortest_path(town_map, '0', '17', '17:30')
+    before = town_map.get_path_time(path, '17:30')
+    town_map.update_traffic(closed=[f"{path[1]}-{path[2]}"])
+    detour = time_dependent_shortest_path(town_map, '0', '17', '17:30')
+    assert detour is not None and (path[1], path[2]) not in set(zip(detour, detour[1:])), detour
+    expected = reference_arrivals(town_map, '0', minutes_of_day('17:30'))['17'] - minutes_of_day('17:30')
+    assert before - 1e-9 <= town_map.get_path_time(detour, '17:30')
+    assert abs(town_map.get_path_time(detour, '17:30') - expected) <= 1e-6 * max(1, expected)
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"[OK] {name}")
+    print("\n[SUCCESS] All engines agree with the reference search")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Run the routing server on an ephemeral port and check coalescing, error
+responses, and that the service keeps answering after a request fails.
+"""
+
+import asyncio
+import json
+from navigation import NavigationSystem
+from routing_server import RoutingServer
+from test_pathfinding import reference_costs, check_route
+
+MAP_FILE = 'complex_town_map.json'
+
+class FailingHistogram:
+    """Stands in for a server histogram and raises on the next observation"""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.armed = True
+
+    def observe(self, value):
+        if self.armed:
+            self.armed = False
+            raise RuntimeError("injected dispatcher fault")
+        self.histogram.observe(value)
+
+    def to_dict(self):
+        return self.histogram.to_dict()
+
+async def exchange(reader, writer, requests):
+    """Send requests in one write and collect one response per request, by id"""
+    writer.write(''.join(json.dumps(request) + '\n' for request in requests).encode())
+    await writer.drain()
+    responses = {}
+    for _ in requests:
+        response = json.loads(await asyncio.wait_for(reader.readline(), 30))
+        responses[response['id']] = response
+    return responses
+
+def test_routing_server():
+    async def run():
+        nav = NavigationSystem(MAP_FILE)
+        town_map = nav.town_map
+        references = reference_costs(town_map, '0', 'time')
+        server = RoutingServer(nav)
+        listener = await server.start(port=0)
+        host, port = listener.sockets[0].getsockname()[:2]
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            # Two goals from one start arrive in one batch and share one search
+            responses = await exchange(reader, writer, [{'id': 1, 'start': '0', 'goal': '17'},
+                                                        {'id': 2, 'start': '0', 'goal': '40'}])
+            for request_id, goal in ((1, '17'), (2, '40')):
+                check_route(town_map, responses[request_id]['path'], '0', goal, 'time', references.get(goal))
+            assert server.searches == 1 and server.coalesced == 1
+
+            # Unknown intersections are answered with an error, not a search
+            responses = await exchange(reader, writer, [{'id': 3, 'start': '0', 'goal': 'no-such-node'}])
+            assert 'error' in responses[3] and 'no-such-node' in responses[3]['error']
+            assert server.searches == 1
+
+            # A search that fails in the worker fails only its own request
+            responses = await exchange(reader, writer, [{'id': 4, 'start': '0', 'goal': '17', 'depart_at': 'soon'},
+                                                        {'id': 5, 'start': '0', 'goal': '22'}])
+            assert 'error' in responses[4]
+            check_route(town_map, responses[5]['path'], '0', '22', 'time', references.get('22'))
+
+            # A fault outside the searches fails that batch, and the dispatcher keeps running
+            server.batch_sizes = FailingHistogram(server.batch_sizes)
+            responses = await exchange(reader, writer, [{'id': 6, 'start': '0', 'goal': '17'}])
+            assert 'injected dispatcher fault' in responses[6]['error']
+            responses = await exchange(reader, writer, [{'id': 7, 'start': '0', 'goal': '17'}])
+            check_route(town_map, responses[7]['path'], '0', '17', 'time', references.get('17'))
+            assert server.errors == 3
+        finally:
+            writer.close()
+            await server.close()
+
+    asyncio.run(run())
+
+if __name__ == "__main__":
+    test_routing_server()
+    print("[OK] routing server coalesces, reports errors and keeps serving")
+    print("\n[SUCCESS] Routing server verified")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Check the search counters: exhaustive searches against a count taken from
+the TownMap API, the bookkeeping identities every engine must keep, and that
+SearchProfiler's histograms add up to the stats it was given.
+"""
+
+import re
+from collections import deque
+from navigation import NavigationSystem
+from search_stats import SearchProfiler
+from pathfinding import (ShortestPathTree, bfs_shortest_path_with_turns, bidirectional_bfs_with_turns,
+                         dijkstra_shortest_path_with_turns, astar_shortest_path_with_turns,
+                         bidirectional_dijkstra_with_turns, time_dependent_shortest_path)
+from isochrones import Isochrones
+from contraction import ContractionHierarchy
+from overlay import Partition, Overlay
+from test_pathfinding import MAPS, query_pairs, with_closures
+
+TURN_COUNTERS = ('turn_checks', 'turn_rejections', 'closed_road_rejections')
+
+def reference_turn_counts(town_map, start):
+    """
+    Every road a route from start can drive, and the turns looked at from them
+    :return: (number of roads, turns looked at, refused by restrictions, refused by closures)
+    """
+    states = {(start, neighbor) for neighbor in town_map.get_neighbors(start)
+              if not town_map.is_road_blocked(start, neighbor)}
+    queue = deque(states)
+    checks = rejections = closed = 0
+    while queue:
+        previous, current = queue.popleft()
+        for neighbor in town_map.get_neighbors(current):
+            checks += 1
+            if town_map.is_road_blocked(current, neighbor):
+                closed += 1
+            elif not town_map.is_turn_allowed(previous, current, neighbor):
+                rejections += 1
+            elif (current, neighbor) not in states:
+                states.add((current, neighbor))
+                queue.append((current, neighbor))
+    return len(states), checks, rejections, closed
+
+def check_bookkeeping(stats, engine):
+    """Identities every probe must keep, whatever the search"""
+    assert stats['engine'] == engine, stats
+    assert stats['popped'] <= stats['pushed'] and stats['max_frontier'] <= max(stats['pushed'], 1), stats
+    assert set(stats['phases']) <= {'setup', 'search', 'unpack'} and all(t >= 0 for t in stats['phases'].values())
+    if engine == 'hierarchy':
+        assert not set(TURN_COUNTERS) & set(stats), stats
+    else:
+        assert stats['turn_rejections'] + stats['closed_road_rejections'] <= stats['turn_checks'], stats
+
+def test_exhaustive_counts_match_reference():
+    totals = [0, 0]
+    for map_file in MAPS:
+        town_map = with_closures(map_file)
+        for start in town_map.get_all_intersections()[::7]:
+            states, checks, rejections, closed = reference_turn_counts(town_map, start)
+            totals[0] += rejections
+            totals[1] += closed
+            for cost in ('hops', 'time'):
+                searches = (('one_to_many', lambda stats: ShortestPathTree(town_map, start, cost, stats=stats)),
+                            ('isochrones', lambda stats: Isochrones(town_map, start, [1e12], cost, stats)))
+                for engine, search in searches:
+                    stats = {}
+                    search(stats)
+                    check_bookkeeping(stats, engine)
+                    # Nothing is left on the heap, so every push was popped
+                    assert stats['pushed'] == stats['popped'], (map_file, engine, stats)
+                    assert (stats['expanded'], stats['turn_checks'], stats['turn_rejections'],
+                            stats['closed_road_rejections']) == (states, checks, rejections, closed), \
+                        (map_file, start, engine, stats)
+    assert all(totals), "no turn was refused by a restriction or a closure"
+
+def test_engine_counters_are_consistent():
+    for map_file in MAPS:
+        town_map = with_closures(map_file)
+        hierarchy = ContractionHierarchy.build(town_map, 'time')
+        overlay = Overlay(Partition.build(town_map), 'time')
+        engines = {
+            'bfs': lambda start, goal, stats: bfs_shortest_path_with_turns(town_map, start, goal, stats),
+            'bidirectional_bfs': lambda start, goal, stats: bidirectional_bfs_with_turns(town_map, start, goal, stats),
+            'dijkstra': lambda start, goal, stats: dijkstra_shortest_path_with_turns(town_map, start, goal, 'time', stats),
+            'astar': lambda start, goal, stats: astar_shortest_path_with_turns(town_map, start, goal, 'time', stats),
+            'bidirectional_dijkstra': lambda start, goal, stats: bidirectional_dijkstra_with_turns(
+                town_map, start, goal, 'time', stats),
+            'time_dependent': lambda start, goal, stats: time_dependent_shortest_path(town_map, start, goal, 480, stats),
+            'hierarchy': lambda start, goal, stats: hierarchy.query(start, goal, stats),
+            'overlay': lambda start, goal, stats: overlay.query(start, goal, stats),
+        }
+        for engine, search in engines.items():
+            for start, goal in query_pairs(town_map, 60):
+                stats = {}
+                search(start, goal, stats)
+                check_bookkeeping(stats, engine)
+
+def test_profiler_adds_up():
+    town_map = with_closures('complex_town_map.json')
+    hierarchy = ContractionHierarchy.build(town_map, 'time')
+    profiler = SearchProfiler()
+    recorded = []
+    for index, (start, goal) in enumerate(query_pairs(town_map, 120)):
+        stats = {}
+        if index % 3 == 0:
+            hierarchy.query(start, goal, stats)
+        else:
+            dijkstra_shortest_path_with_turns(town_map, start, goal, 'time', stats)
+        latency = index * 0.37
+        profiler.record(stats, latency)
+        recorded.append(dict(stats, latency_ms=latency))
+
+    report = profiler.to_dict()
+    assert sum(engine['queries'] for engine in report['engines'].values()) == len(recorded)
+    prometheus = profiler.to_prometheus()
+    for engine, summary in report['engines'].items():
+        mine = [stats for stats in recorded if stats['engine'] == engine]
+        assert summary['queries'] == len(mine)
+        for metric in SearchProfiler.METRICS:
+            values = [stats[metric] for stats in mine if metric in stats]
+            if not values:
+                # Counters an engine does not measure are left out rather than reported as zeros
+                assert metric not in summary, (engine, metric)
+                continue
+            histogram = summary[metric]
+            assert histogram['count'] == len(values) == len(mine), (engine, metric)
+            assert abs(histogram['sum'] - sum(values)) <= 1e-9 * max(1, sum(values))
+            for bound, seen in histogram['buckets'][:-1]:
+                assert seen == sum(value <= bound for value in values), (engine, metric, bound)
+            assert histogram['buckets'][-1] == ['+Inf', len(values)]
+            count_line = re.search(rf'navigator_search_{metric}_count{{engine="{engine}"}} (\d+)', prometheus)
+            assert count_line and int(count_line.group(1)) == len(values)
+        for phase, seconds in summary['phase_seconds'].items():
+            assert abs(seconds - sum(stats['phases'].get(phase, 0) for stats in mine)) < 1e-9
+    assert 'turn_checks' not in report['engines']['hierarchy']
+    assert 'turn_checks' in report['engines']['dijkstra']
+
+def test_navigation_profile_adds_up():
+    nav = NavigationSystem('complex_town_map.json', profile=True)
+    isolated = nav.town_map.get_all_intersections()[5]
+    nav.update_traffic(closed=[f"{a}-{b}" for a, b in nav.town_map.get_all_roads() if isolated in (a, b)])
+    nav.build_hierarchy('distance')
+    pairs = query_pairs(nav.town_map, 80)
+    nav.route_tree(pairs[0][0], 'hops')
+    calls = 0
+    for cost in ('hops', 'distance', 'time'):
+        for start, goal in pairs + pairs[:10] + [(isolated, pairs[0][1])]:
+            nav.find_route(start, goal, cost)
+            calls += 1
+    report = nav.profiler.to_dict()
+    searches = sum(engine['queries'] for engine in report['engines'].values())
+    assert report['cache_hits'] + searches == calls, (report['cache_hits'], searches, calls)
+    assert report['cache_hits'] >= 30
+    assert {'connectivity', 'tree', 'hierarchy'} <= set(report['engines']), set(report['engines'])
+    for engine, summary in report['engines'].items():
+        assert summary['latency_ms']['count'] == summary['expanded']['count'] == summary['queries'], engine
+
+if __name__ == "__main__":
+    test_exhaustive_counts_match_reference()
+    print("[OK] exhaustive searches count the same turns as the reference")
+    test_engine_counters_are_consistent()
+    print("[OK] every engine's counters are consistent")
+    test_profiler_adds_up()
+    print("[OK] profiler histograms add up to the recorded stats")
+    test_navigation_profile_adds_up()
+    print("[OK] every find_route is a cache hit or one profiled search")
+    print("\n[SUCCESS] Search counters verified")
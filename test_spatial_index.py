@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Check SpatialIndex queries against a linear scan over every intersection
+and road, for points inside and outside the map and several grid sizes.
+"""
+
+import math
+import random
+from town_map import TownMap
+from spatial_index import SpatialIndex
+from test_pathfinding import MAPS
+
+def segment_distance(px, py, x0, y0, x1, y1):
+    """Distance from a point to a segment, by projecting onto the segment"""
+    dx, dy = x1 - x0, y1 - y0
+    length_squared = dx * dx + dy * dy
+    t = 0.0 if length_squared == 0 else max(0.0, min(1.0, ((px - x0) * dx + (py - y0) * dy) / length_squared))
+    return math.hypot(x0 + t * dx - px, y0 + t * dy - py)
+
+def query_points(town_map, count=150, seed=11):
+    """Random points over the map's bounding box plus a margin around it, and every intersection"""
+    xs, ys = zip(*(town_map.get_position(node_id) for node_id in town_map.get_all_intersections()))
+    margin = max(max(xs) - min(xs), max(ys) - min(ys)) * 0.3 + 1
+    rng = random.Random(seed)
+    points = [(rng.uniform(min(xs) - margin, max(xs) + margin), rng.uniform(min(ys) - margin, max(ys) + margin))
+              for _ in range(count)]
+    return points + list(zip(xs, ys))
+
+def indexes(town_map):
+    """The default grid plus a very coarse and a very fine one"""
+    default = SpatialIndex(town_map)
+    return [default, SpatialIndex(town_map, default.cell_size * 7), SpatialIndex(town_map, default.cell_size / 5)]
+
+def test_nearest_matches_scan():
+    for map_file in MAPS:
+        town_map = TownMap(map_file)
+        positions = {node_id: town_map.get_position(node_id) for node_id in town_map.get_all_intersections()}
+        for index in indexes(town_map):
+            for x, y in query_points(town_map):
+                scan = sorted(math.hypot(px - x, py - y) for px, py in positions.values())
+                for k in (1, 4, 25, len(positions) + 3):
+                    found = index.nearest_k(x, y, k)
+                    assert len(found) == min(k, len(positions))
+                    assert len({node_id for node_id, _ in found}) == len(found)
+                    for node_id, distance in found:
+                        assert abs(distance - math.hypot(positions[node_id][0] - x, positions[node_id][1] - y)) < 1e-9
+                    assert all(abs(a - b) < 1e-9 for (_, a), b in zip(found, scan)), (map_file, x, y, k)
+                assert index.nearest(x, y) == index.nearest_k(x, y, 1)[0][0]
+
+def test_within_radius_matches_scan():
+    for map_file in MAPS:
+        town_map = TownMap(map_file)
+        positions = {node_id: town_map.get_position(node_id) for node_id in town_map.get_all_intersections()}
+        for index in indexes(town_map):
+            for x, y in query_points(town_map, 60):
+                for radius in (0.0, index.cell_size * 0.5, index.cell_size * 3, 1e9):
+                    found = index.within_radius(x, y, radius)
+                    expected = {node_id for node_id, (px, py) in positions.items()
+                                if math.hypot(px - x, py - y) <= radius}
+                    assert {node_id for node_id, _ in found} == expected, (map_file, x, y, radius)
+                    distances = [distance for _, distance in found]
+                    assert distances == sorted(distances)
+
+def test_snap_matches_scan():
+    for map_file in MAPS:
+        town_map = TownMap(map_file)
+        roads = [(town_map.get_position(a), town_map.get_position(b)) for a, b in town_map.get_all_roads()]
+        for index in indexes(town_map):
+            points = query_points(town_map)
+            snapped_roads, snapped, distances = index.snap_many(points)
+            for (x, y), road, (sx, sy), distance in zip(points, snapped_roads, snapped, distances):
+                scan = min(segment_distance(x, y, x0, y0, x1, y1) for (x0, y0), (x1, y1) in roads)
+                assert abs(distance - scan) < 1e-9, (map_file, x, y)
+                # The snapped point lies on the chosen road, at the reported distance
+                (x0, y0), (x1, y1) = roads[road]
+                assert segment_distance(sx, sy, x0, y0, x1, y1) < 1e-9
+                assert abs(math.hypot(sx - x, sy - y) - distance) < 1e-9
+            road, point, distance = index.snap(*points[0])
+            assert road == index.roads[snapped_roads[0]] and abs(distance - distances[0]) < 1e-12
+
+if __name__ == "__main__":
+    test_nearest_matches_scan()
+    print("[OK] nearest_k matches a linear scan")
+    test_within_radius_matches_scan()
+    print("[OK] within_radius matches a linear scan")
+    test_snap_matches_scan()
+    print("[OK] snap_many matches a linear scan over every road")
+    print("\n[SUCCESS] Spatial index verified")
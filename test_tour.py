@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Check tour planning against the TownMap API: every stop is visited, every
+turn is legal, the reported cost is the cost of the route driven, and no
+route through the stops in the chosen order is cheaper than the reference.
+"""
+
+import heapq
+import random
+import numpy as np
+from navigation import NavigationSystem
+from tour import cost_matrix, stitch_tour, plan_tour
+from contraction import ContractionHierarchy
+from test_pathfinding import MAPS, road_cost, reference_costs, with_closures
+
+def reference_ordered_cost(town_map, points, cost):
+    """
+    Dijkstra over (previous, current, stops reached) that must reach points
+    in the given order; arriving at the next point counts as visiting it
+    :return: Cheapest cost of a route through points in order, or None
+    """
+    if len(points) == 1:
+        return 0
+    heap = []
+    for neighbor in town_map.get_neighbors(points[0]):
+        if not town_map.is_road_blocked(points[0], neighbor):
+            reached = 1 + (neighbor == points[1])
+            heap.append((road_cost(town_map, points[0], neighbor, cost), points[0], neighbor, reached))
+    heapq.heapify(heap)
+    settled = set()
+    while heap:
+        cost_so_far, previous, current, reached = heapq.heappop(heap)
+        if reached == len(points):
+            return cost_so_far
+        if (previous, current, reached) in settled:
+            continue
+        settled.add((previous, current, reached))
+        for neighbor in town_map.get_neighbors(current):
+            if town_map.is_turn_allowed(previous, current, neighbor):
+                next_reached = reached + (neighbor == points[reached])
+                heapq.heappush(heap, (cost_so_far + road_cost(town_map, current, neighbor, cost),
+                                      current, neighbor, next_reached))
+    return None
+
+def check_tour(town_map, tour, start, stops, end, cost):
+    """Assert the tour visits every stop, drives only legal turns and costs what it reports"""
+    expected_stops = [stop for stop in dict.fromkeys(stops) if stop not in (start, end)]
+    assert sorted(tour['order']) == sorted(expected_stops), tour['order']
+    visit = [start] + tour['order'] + ([end] if end is not None else [])
+    path = list(tour['path'])
+    assert path[0] == start and path[-1] == visit[-1], path
+    if len(path) > 1:
+        assert not town_map.is_road_blocked(path[0], path[1]), path
+    for previous, current, following in zip(path, path[1:], path[2:]):
+        assert town_map.is_turn_allowed(previous, current, following), f"illegal turn {previous}-{current}-{following}"
+    total = sum(road_cost(town_map, a, b, cost) for a, b in zip(path, path[1:]))
+    assert abs(total - tour['cost']) <= 1e-9 * max(1, total), (total, tour['cost'])
+    # The legs join up into the path, each ending at the next stop in order
+    assert len(tour['legs']) == len(visit) - 1
+    joined = [start]
+    for leg, point in zip(tour['legs'], visit[1:]):
+        leg = list(leg)
+        assert leg[0] == joined[-1] and leg[-1] == point, (leg, point)
+        joined += leg[1:]
+    assert joined == path
+    return visit
+
+def tour_cases(town_map, count=12, seed=2):
+    """Random start, stops and end (none, the start, or another intersection)"""
+    rng = random.Random(seed)
+    ids = town_map.get_all_intersections()
+    for index in range(count):
+        start = rng.choice(ids)
+        stops = rng.sample(ids, rng.randint(1, 6))
+        if index % 4 == 0:
+            stops += [stops[0], start]
+        end = (None, start, rng.choice(ids))[index % 3]
+        yield start, stops, end
+
+def test_cost_matrix_matches_reference():
+    for map_file in MAPS:
+        town_map = with_closures(map_file)
+        points = random.Random(1).sample(town_map.get_all_intersections(), 8)
+        for cost in ('hops', 'distance', 'time'):
+            matrix = cost_matrix(town_map, points, cost)
+            for row, point in enumerate(points):
+                references = reference_costs(town_map, point, cost)
+                for column, target in enumerate(points):
+                    expected = references.get(target, np.inf)
+                    assert np.isclose(matrix[row, column], expected, rtol=1e-9, atol=0), (map_file, point, target, cost)
+            hierarchy_matrix = cost_matrix(town_map, points, cost, ContractionHierarchy.build(town_map, cost))
+            assert np.allclose(hierarchy_matrix, matrix, rtol=1e-9, atol=0), (map_file, cost)
+
+def test_plan_tour_is_legal_and_priced():
+    for map_file in MAPS:
+        for town_map in (with_closures(map_file), with_closures(map_file, 12, seed=6)):
+            for cost in ('hops', 'distance', 'time'):
+                for start, stops, end in tour_cases(town_map):
+                    tour = plan_tour(town_map, start, stops, end, cost, time_limit=0.05)
+                    if tour is None:
+                        # Only when some stop or the end cannot be reached from the start
+                        references = reference_costs(town_map, start, cost)
+                        assert any(point not in references for point in stops + [end] if point is not None)
+                        continue
+                    visit = check_tour(town_map, tour, start, stops, end, cost)
+                    best = reference_ordered_cost(town_map, visit, cost)
+                    assert best is not None and tour['cost'] >= best - 1e-9 * max(1, best), (map_file, visit)
+
+def plan_legs(path, points):
+    """Split a stitched path at the first arrival at each point after the previous one, as plan_tour does"""
+    legs, position = [], 0
+    for point in points[1:]:
+        arrival = path.index(point, position + 1)
+        legs.append(path[position:arrival + 1])
+        position = arrival
+    return legs
+
+def test_stitch_tour_orders():
+    town_map = with_closures('complex_town_map.json')
+    rng = random.Random(4)
+    ids = town_map.get_all_intersections()
+    exact = 0
+    for _ in range(60):
+        points = rng.sample(ids, rng.randint(2, 5))
+        path, total = stitch_tour(town_map, points, 'time')
+        best = reference_ordered_cost(town_map, points, 'time')
+        if best is None:
+            assert path is None and total == float('inf'), points
+            continue
+        assert path is not None, points
+        tour = {'order': points[1:-1], 'path': path, 'cost': total,
+                'legs': plan_legs(path, points)}
+        check_tour(town_map, tour, points[0], points[1:-1], points[-1], 'time')
+        assert total >= best - 1e-9 * max(1, best), points
+        exact += abs(total - best) <= 1e-9 * max(1, best)
+    # The arrival window only rarely costs anything
+    assert exact >= 50, exact
+
+def test_navigation_plan_tour():
+    nav = NavigationSystem('complex_town_map.json')
+    stops = ['44', '17', '22', '5', '28', '33']
+    plain = nav.plan_tour('0', stops, end='0', time_limit=0.05)
+    check_tour(nav.town_map, plain, '0', stops, '0', 'time')
+    nav.build_hierarchy('time')
+    with_hierarchy = nav.plan_tour('0', stops, end='0', time_limit=0.05)
+    check_tour(nav.town_map, with_hierarchy, '0', stops, '0', 'time')
+    assert isinstance(with_hierarchy['path'], tuple) and all(isinstance(leg, tuple) for leg in with_hierarchy['legs'])
+
+if __name__ == "__main__":
+    test_cost_matrix_matches_reference()
+    print("[OK] tour cost matrices match the reference search")
+    test_plan_tour_is_legal_and_priced()
+    print("[OK] planned tours visit every stop with legal turns at the reported cost")
+    test_stitch_tour_orders()
+    print("[OK] stitched tours are never cheaper than the reference for their order")
+    test_navigation_plan_tour()
+    print("[OK] NavigationSystem.plan_tour returns legal tours with and without a hierarchy")
+    print("\n[SUCCESS] Tour planning verified")
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Check that live traffic updates give the same routes as starting over:
+repaired trees against rebuilt ones, incremental overlay customization
+against a full one, and the navigation system against a fresh search.
+"""
+
+import copy
+import random
+import numpy as np
+from town_map import TownMap
+from compiled_map import CompiledMap
+from pathfinding import ShortestPathTree, dijkstra_shortest_path_with_turns
+from overlay import Partition, Overlay
+from navigation import NavigationSystem
+from test_pathfinding import reference_costs, check_route
+
+MAP_FILE = 'large_map_data.json'
+
+def random_batches(town_map, rounds=8, seed=11):
+    """
+    Yield (speed_limits, closed, reopened) update batches mixing slowdowns,
+    speedups, closures and reopenings of random roads
+    """
+    rng = random.Random(seed)
+    roads = sorted(f"{road[0]}-{road[1]}" for road in town_map.get_all_roads())
+    closed_roads = []
+    for _ in range(rounds):
+        speed_limits = {road: rng.choice((10, 20, 40, 60, 80)) for road in rng.sample(roads, 6)}
+        closed = rng.sample(roads, 2)
+        reopened = [closed_roads.pop(rng.randrange(len(closed_roads))) for _ in range(min(2, len(closed_roads)))]
+        closed_roads.extend(closed)
+        yield speed_limits, closed, reopened
+
+def test_tree_repair_matches_rebuild():
+    town_map = TownMap(MAP_FILE)
+    starts = town_map.get_all_intersections()[::17]
+    trees = {start: ShortestPathTree(town_map, start, 'time') for start in starts}
+    for speed_limits, closed, reopened in random_batches(town_map):
+        changes = town_map.update_traffic(speed_limits, closed, reopened)
+        for start, tree in trees.items():
+            tree.repair(changes)
+            rebuilt = ShortestPathTree(town_map, start, 'time')
+            for goal in town_map.get_all_intersections():
+                assert abs(tree.cost_to(goal) - rebuilt.cost_to(goal)) <= 1e-9, f"{start}->{goal}"
+                check_route(town_map, tree.path_to(goal), start, goal, 'time',
+                            rebuilt.cost_to(goal) if rebuilt.path_to(goal) else None)
+
+def test_overlay_customize_matches_full():
+    town_map = TownMap(MAP_FILE)
+    partition = Partition.build(town_map, (6, 20))
+    overlay = Overlay(partition, 'time')
+    pairs = [(start, goal) for start in town_map.get_all_intersections()[::9]
+             for goal in town_map.get_all_intersections()[::7]]
+    for speed_limits, closed, reopened in random_batches(town_map):
+        overlay.customize(town_map.update_traffic(speed_limits, closed, reopened))
+        fresh = Overlay(partition, 'time')
+        for level, matrices in enumerate(fresh.matrices):
+            for cell, matrix in enumerate(matrices):
+                assert np.allclose(overlay.matrices[level][cell], matrix), f"level {level} cell {cell}"
+        for start, goal in pairs:
+            expected = dijkstra_shortest_path_with_turns(town_map, start, goal, 'time')
+            check_route(town_map, overlay.query(start, goal), start, goal, 'time',
+                        town_map.get_path_time(expected) if expected else None)
+
+def test_navigation_after_updates():
+    nav = NavigationSystem(MAP_FILE)
+    town_map = nav.town_map
+    starts = town_map.get_all_intersections()[::23]
+    goals = town_map.get_all_intersections()[::13]
+    for start in starts:
+        nav.route_tree(start)
+    for speed_limits, closed, reopened in random_batches(town_map):
+        nav.update_traffic(speed_limits, closed, reopened)
+        for start in starts:
+            references = reference_costs(town_map, start, 'time')
+            for goal in goals:
+                check_route(town_map, nav.find_route(start, goal, cost='time'), start, goal, 'time',
+                            references.get(goal))
+
+def test_unaffected_cost_modes_survive_updates():
+    nav = NavigationSystem(MAP_FILE)
+    town_map = nav.town_map
+    hierarchy = nav.build_hierarchy('distance')
+    start, goal = town_map.get_all_intersections()[0], town_map.get_all_intersections()[-1]
+    tree = nav.route_tree(start, 'distance')
+    route = nav.find_route(start, goal, cost='distance')
+    roads = sorted(f"{road[0]}-{road[1]}" for road in town_map.get_all_roads())
+
+    # Speed changes cannot change distances: nothing distance-based is rebuilt or repaired
+    assert nav.update_traffic({roads[0]: 10, roads[1]: 80}) == 0
+    assert nav.route_tree(start, 'distance') is tree and tree.version == town_map.version
+    assert hierarchy.version == town_map.version
+    hits = nav.route_cache.hits
+    assert nav.find_route(start, goal, cost='distance') == route
+    assert nav.route_cache.hits == hits + 1
+
+    # A closure changes every cost mode
+    nav.update_traffic(closed=[roads[2]])
+    assert hierarchy.version != town_map.version
+    assert nav.route_cache.get((start, goal, 'distance'), nav.route_versions['distance']) is nav.route_cache.MISS
+
+def test_batched_repairs_match_rebuild():
+    nav = NavigationSystem(MAP_FILE)
+    town_map = nav.town_map
+    starts = town_map.get_all_intersections()[::31]
+    for start in starts:
+        nav.route_tree(start)
+    # Several batches arrive before the trees are used again; each is repaired once
+    for speed_limits, closed, reopened in random_batches(town_map, rounds=5, seed=5):
+        assert nav.update_traffic(speed_limits, closed, reopened) == len(starts)
+    for start in starts:
+        tree = nav.route_tree(start)
+        rebuilt = ShortestPathTree(town_map, start, 'time')
+        for goal in town_map.get_all_intersections():
+            assert abs(tree.cost_to(goal) - rebuilt.cost_to(goal)) <= 1e-9, f"{start}->{goal}"
+    assert not nav.tree_changes
+
+def test_connectivity_rebuilt_per_batch():
+    nav = NavigationSystem(MAP_FILE)
+    town_map = nav.town_map
+    roads = sorted(f"{road[0]}-{road[1]}" for road in town_map.get_all_roads())
+    nav.update_traffic(closed=roads[:3])
+    analysis = town_map.connectivity(rebuild=False)
+    assert analysis is not None and analysis.version == town_map.version
+    starts, goals = town_map.get_all_intersections()[::11], town_map.get_all_intersections()[::7]
+    for start in starts:
+        references = reference_costs(town_map, start, 'time')
+        for goal in goals:
+            check_route(town_map, nav.find_route(start, goal, cost='time'), start, goal, 'time',
+                        references.get(goal))
+    assert town_map.connectivity(rebuild=False) is analysis
+
+    # Changed outside update_traffic: queries skip the check instead of rebuilding it
+    through = town_map.get_all_intersections()[5]
+    before, after = town_map.get_neighbors(through)[:2]
+    town_map.add_turn_restriction('no_left_turn', before, through, after)
+    nav.find_route(starts[0], goals[-1], cost='time')
+    assert town_map.connectivity(rebuild=False) is None
+    nav.update_traffic(reopened=roads[:1])
+    assert town_map.connectivity(rebuild=False) is not None
+
+def test_compiled_updates_match_recompile():
+    town_map = TownMap(MAP_FILE)
+    # Give some two-way roads a separate road type per direction
+    for a, b in town_map.get_all_roads()[::9]:
+        if a in town_map.get_neighbors(b) and f"{b}-{a}" not in town_map.road_types:
+            town_map.road_types[f"{b}-{a}"] = dict(town_map.get_road_type(a, b), speed_limit=70)
+    graph = town_map.compile()
+    for speed_limits, closed, reopened in random_batches(town_map):
+        town_map.update_traffic(speed_limits, closed, reopened)
+        fresh = CompiledMap(town_map)
+        assert list(graph.speeds) == list(fresh.speeds)
+        assert list(graph.times) == list(fresh.times)
+        assert list(graph.turn_masks) == list(fresh.turn_masks)
+        assert list(graph.departure_masks) == list(fresh.departure_masks)
+
+def test_invalid_speed_limits():
+    town_map = TownMap(MAP_FILE)
+    town_map.compile()
+    roads = sorted(f"{road[0]}-{road[1]}" for road in town_map.get_all_roads())
+    for speed_limit in (0, -5, float('nan'), float('inf'), 'fast', None, True):
+        road_types = copy.deepcopy(town_map.road_types)
+        blocked = list(town_map.traffic_restrictions.get('blocked_roads', []))
+        speeds, version = list(town_map.compile().speeds), town_map.version
+        try:
+            town_map.update_traffic({roads[0]: 50, roads[1]: speed_limit}, closed=[roads[2]])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"speed limit {speed_limit!r} was accepted")
+        # The valid parts of the batch were not applied either
+        assert town_map.road_types == road_types
+        assert town_map.traffic_restrictions.get('blocked_roads', []) == blocked
+        assert list(town_map.compile().speeds) == speeds and town_map.version == version
+    try:
+        town_map.update_traffic({roads[0]: 50}, closed=['no-such-road'])
+    except ValueError:
+        assert town_map.road_types == road_types and town_map.version == version
+    else:
+        raise AssertionError("an unknown road was accepted")
+
+if __name__ == "__main__":
+    test_tree_repair_matches_rebuild()
+    print("[OK] repaired trees match rebuilt trees")
+    test_overlay_customize_matches_full()
+    print("[OK] incremental overlay customization matches a full one")
+    test_navigation_after_updates()
+    print("[OK] navigation routes stay optimal across traffic updates")
+    test_unaffected_cost_modes_survive_updates()
+    print("[OK] updates leave unaffected cost modes cached")
+    test_batched_repairs_match_rebuild()
+    print("[OK] one repair over several batches matches a rebuild")
+    test_connectivity_rebuilt_per_batch()
+    print("[OK] connectivity is rebuilt by updates, not by queries")
+    test_compiled_updates_match_recompile()
+    print("[OK] patched compiled maps match a recompile, per direction")
+    test_invalid_speed_limits()
+    print("[OK] invalid speed limits are rejected before anything changes")
+    print("\n[SUCCESS] Traffic updates verified")
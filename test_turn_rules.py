@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Check TownMap.is_turn_allowed: the incoming road is the one actually driven
+(from -> through), so one-way roads can be entered but not driven backwards.
+"""
+
+import json
+import os
+import tempfile
+from town_map import TownMap
+from pathfinding import bfs_shortest_path_with_turns
+
+def load_map(map_data):
+    """Build a TownMap from an in-memory map dict"""
+    with tempfile.TemporaryDirectory() as directory:
+        map_file = os.path.join(directory, 'map.json')
+        with open(map_file, 'w', encoding='utf-8') as f:
+            json.dump(map_data, f)
+        return TownMap(map_file)
+
+def reference_turn_allowed(town_map, from_intersection, through_intersection, to_intersection):
+    """Evaluate a turn straight from the neighbor lists and traffic_restrictions"""
+    restrictions = town_map.traffic_restrictions
+    if through_intersection not in town_map.get_neighbors(from_intersection):
+        return False
+    if to_intersection not in town_map.get_neighbors(through_intersection):
+        return False
+    for a, b in ((from_intersection, through_intersection), (through_intersection, to_intersection)):
+        if f"{a}-{b}" in restrictions.get('blocked_roads', []) or f"{b}-{a}" in restrictions.get('blocked_roads', []):
+            return False
+    turn_key = f"{from_intersection}-{through_intersection}-{to_intersection}"
+    for kind in ('no_left_turn', 'no_right_turn', 'no_u_turn'):
+        if turn_key in restrictions.get(kind, []):
+            return False
+    for only_key in restrictions.get('only_straight', []):
+        if only_key.startswith(f"{from_intersection}-{through_intersection}-") and only_key != turn_key:
+            return False
+    return True
+
+def test_one_way_entry():
+    """A one-way road can be entered and left, but not driven against its direction"""
+    # z <-> a -> b <-> c, where a -> b is one-way
+    town_map = load_map({'intersections': {
+        'z': {'x': -1, 'y': 0, 'turns': {'right': 'a'}},
+        'a': {'x': 0, 'y': 0, 'turns': {'right': 'b', 'left': 'z'}},
+        'b': {'x': 1, 'y': 0, 'turns': {'right': 'c'}},
+        'c': {'x': 2, 'y': 0, 'turns': {'left': 'b'}},
+    }, 'road_types': {'a-b': {'type': 'local_road', 'speed_limit': 30, 'lanes': 1, 'one_way': True}}})
+    # Leaving the one-way road after driving it; this used to be rejected
+    assert town_map.is_turn_allowed('a', 'b', 'c')
+    # Arriving at a over b -> a, a road that does not exist; this used to be accepted
+    assert not town_map.is_turn_allowed('b', 'a', 'z')
+    assert not town_map.is_turn_allowed('c', 'b', 'a')
+    assert town_map.is_turn_allowed('z', 'a', 'b')
+    assert bfs_shortest_path_with_turns(town_map, 'z', 'c') == ['z', 'a', 'b', 'c']
+    assert bfs_shortest_path_with_turns(town_map, 'c', 'z') is None
+
+def test_turns_match_reference():
+    """Every turn on the complex map agrees with a direct reading of the map data"""
+    town_map = TownMap('complex_town_map.json')
+    checked = 0
+    for through in town_map.intersections:
+        for from_intersection in town_map.intersections:
+            for to_intersection in town_map.get_neighbors(through):
+                expected = reference_turn_allowed(town_map, from_intersection, through, to_intersection)
+                assert town_map.is_turn_allowed(from_intersection, through, to_intersection) == expected, \
+                    (from_intersection, through, to_intersection)
+                checked += expected
+    assert checked > 0
+
+def test_routes_through_one_way_roads():
+    """Both routes enter a one-way road and had no route under the old check"""
+    town_map = TownMap('complex_town_map.json')
+    for start, goal in (('0', '44'), ('22', '40')):
+        path = bfs_shortest_path_with_turns(town_map, start, goal)
+        assert path and path[0] == start and path[-1] == goal, (start, goal)
+        for a, b, c in zip(path, path[1:], path[2:]):
+            assert town_map.is_turn_allowed(a, b, c), (a, b, c)
+
+if __name__ == "__main__":
+    test_one_way_entry()
+    print("[OK] one-way roads can be entered but not driven backwards")
+    test_turns_match_reference()
+    print("[OK] turn checks match the map data")
+    test_routes_through_one_way_roads()
+    print("[OK] routes through one-way roads are found")
+    print("\n[SUCCESS] Turn rules verified")
@@ -0,0 +1,270 @@
+import heapq
+import time
+import numpy as np
+from pathfinding import ShortestPathTree
+
+def cost_matrix(town_map, points, cost='time', hierarchy=None):
+    """
+    Turn-aware route costs between every pair of points: a many-to-many
+    search over a Contraction Hierarchy when one is given, otherwise one
+    one-to-many search per point that stops once every point is settled
+    :param hierarchy: Optional ContractionHierarchy built for this cost mode and map version
+    :return: numpy array of shape (len(points), len(points)) with inf for unreachable pairs
+    """
+    if hierarchy is not None:
+        if hierarchy.cost != cost:
+            raise ValueError(f"Hierarchy was built for {hierarchy.cost}, not {cost}")
+        return hierarchy.cost_matrix(points, points)
+    matrix = np.empty((len(points), len(points)))
+    for row, point in enumerate(points):
+        tree = ShortestPathTree(town_map, point, cost, points)
+        matrix[row] = [tree.cost_to(target) for target in points]
+    return matrix
+
+def _nearest_insertion(matrix, first, last, nodes):
+    """
+    Build a route from first to last through nodes: repeatedly take the node
+    closest to the route so far and insert it where it adds the least cost
+    """
+    tour = [first, last]
+    remaining = set(nodes)
+    # Cost between each remaining node and its closest node on the route, either way
+    nearest = {node: min(matrix[first][node], matrix[node][first], matrix[last][node], matrix[node][last])
+               for node in remaining}
+    while remaining:
+        node = min(remaining, key=lambda candidate: (nearest[candidate], candidate))
+        remaining.discard(node)
+        position = min(range(1, len(tour)),
+                       key=lambda i: matrix[tour[i - 1]][node] + matrix[node][tour[i]] - matrix[tour[i - 1]][tour[i]])
+        tour.insert(position, node)
+        for other in remaining:
+            nearest[other] = min(nearest[other], matrix[node][other], matrix[other][node])
+    return tour
+
+def _improve(matrix, tour, deadline):
+    """
+    Local search with 2-opt (reverse a stretch) and Or-opt (move a run of up
+    to three stops, possibly reversed) until no move helps or time runs out.
+    Costs may be asymmetric, so reversed stretches are re-priced with prefix
+    sums of the route in both directions. The first and last stop stay put.
+    :return: True if the search finished before the deadline
+    """
+    size = len(tour)
+    while True:
+        # forward[k] / backward[k]: cost of tour[0..k] travelled forwards / in reverse
+        forward, backward = [0.0] * size, [0.0] * size
+        for k in range(1, size):
+            forward[k] = forward[k - 1] + matrix[tour[k - 1]][tour[k]]
+            backward[k] = backward[k - 1] + matrix[tour[k]][tour[k - 1]]
+        improved = False
+
+        # 2-opt: reverse tour[i..j]
+        for i in range(1, size - 2):
+            before = tour[i - 1]
+            for j in range(i + 1, size - 1):
+                after = tour[j + 1]
+                delta = (matrix[before][tour[j]] + (backward[j] - backward[i]) + matrix[tour[i]][after] -
+                         matrix[before][tour[i]] - (forward[j] - forward[i]) - matrix[tour[j]][after])
+                if delta < -1e-9:
+                    tour[i:j + 1] = tour[i:j + 1][::-1]
+                    improved = True
+                    break
+            if improved or time.perf_counter() > deadline:
+                break
+        if improved:
+            continue
+        if time.perf_counter() > deadline:
+            return False
+
+        # Or-opt: move tour[i..i + length - 1] between tour[p] and tour[p + 1]
+        for length in (1, 2, 3):
+            for i in range(1, size - length):
+                j = i + length - 1
+                before, after = tour[i - 1], tour[j + 1]
+                internal = forward[j] - forward[i]
+                removed = matrix[before][tour[i]] + matrix[tour[j]][after] - matrix[before][after]
+                for p in range(size - 1):
+                    if i - 1 <= p <= j:
+                        continue
+                    left, right = tour[p], tour[p + 1]
+                    gap = matrix[left][right]
+                    straight = matrix[left][tour[i]] + internal + matrix[tour[j]][right] - gap
+                    reversed_ = matrix[left][tour[j]] + (backward[j] - backward[i]) + matrix[tour[i]][right] - gap
+                    if min(straight - internal, reversed_ - internal) - removed < -1e-9:
+                        segment = tour[i:j + 1]
+                        if reversed_ < straight:
+                            segment.reverse()
+                        rest = tour[:i] + tour[j + 1:]
+                        at = p + 1 if p < i else p + 1 - length
+                        tour[:] = rest[:at] + segment + rest[at:]
+                        improved = True
+                        break
+                if improved:
+                    break
+            if improved or time.perf_counter() > deadline:
+                break
+        if not improved:
+            return time.perf_counter() <= deadline
+
+def order_stops(matrix, end_fixed=True, time_limit=0.5):
+    """
+    Order the stops of a route with nearest insertion and local search
+    :param matrix: Cost matrix over [start, stops..., end]; without a fixed end, just [start, stops...]
+    :param end_fixed: The last point is a fixed end rather than a stop
+    :param time_limit: Seconds the local search may run
+    :return: List of point indices in visiting order, starting at 0
+    """
+    count = len(matrix)
+    matrix = np.asarray(matrix, dtype=float)
+    if not end_fixed:
+        # A free end is a virtual point every stop reaches for nothing
+        matrix = np.pad(matrix, ((0, 1), (0, 1)))
+        matrix[count, :] = np.inf
+        count += 1
+    # Unreachable pairs get a cost no real route reaches, so the search avoids them
+    finite = matrix[np.isfinite(matrix)]
+    matrix = np.where(np.isfinite(matrix), matrix, (finite.max() if len(finite) else 0.0) * count * 10 + 1)
+    if count <= 2:
+        tour = list(range(count))
+    else:
+        deadline = time.perf_counter() + time_limit
+        # Nested lists index much faster than an array from Python loops
+        matrix = matrix.tolist()
+        tour = _nearest_insertion(matrix, 0, count - 1, range(1, count - 1))
+        _improve(matrix, tour, deadline)
+    return tour if end_fixed else tour[:-1]
+
+def _stitch_leg(graph, costs, seeds, goal_index, start_index=None):
+    """
+    Multi-source Dijkstra over edge states for one leg of a tour. It starts
+    from every state the route can arrive at the previous stop in (or from
+    the start's open roads) with its cost so far, and records every state
+    arriving at the next stop within twice the cheapest arrival's leg cost,
+    so the next leg can leave in whichever direction its turns allow.
+    :param seeds: Dict of arrival state -> cost so far, or None to leave from start_index
+    :return: (arrival state -> cost so far, parent dict); states reached only
+             as seeds have no parent, first-leg roads have parent -1
+    """
+    offsets, targets, turn_masks = graph.offsets, graph.targets, graph.turn_masks
+    entering = set(graph.in_edges[graph.in_offsets[goal_index]:graph.in_offsets[goal_index + 1]])
+    best, parent, heap = {}, {}, []
+    if seeds is None:
+        mask = graph.departure_masks[start_index]
+        for edge in range(offsets[start_index], offsets[start_index + 1]):
+            allowed = mask & 1
+            mask >>= 1
+            if allowed:
+                best[edge] = costs[edge]
+                parent[edge] = -1
+                heap.append((costs[edge], edge))
+    else:
+        best.update(seeds)
+        heap = [(cost_so_far, edge) for edge, cost_so_far in seeds.items()]
+    heapq.heapify(heap)
+
+    base = min(heap)[0] if heap else 0
+    limit = float('inf')
+    settled = set()
+    arrivals = {}
+    while heap:
+        cost_so_far, edge = heapq.heappop(heap)
+        if cost_so_far > limit:
+            break
+        if edge in settled:
+            continue
+        settled.add(edge)
+        if edge in entering:
+            arrivals[edge] = cost_so_far
+            if len(arrivals) == 1:
+                limit = cost_so_far + (cost_so_far - base)
+            if len(arrivals) == len(entering):
+                break
+            # The tour stops here; leaving again belongs to the next leg
+            continue
+
+        current = targets[edge]
+        mask = turn_masks[edge]
+        for next_edge in range(offsets[current], offsets[current + 1]):
+            allowed = mask & 1
+            mask >>= 1
+            if not allowed or next_edge in settled:
+                continue
+            next_cost = cost_so_far + costs[next_edge]
+            if next_cost < best.get(next_edge, float('inf')):
+                best[next_edge] = next_cost
+                parent[next_edge] = edge
+                heapq.heappush(heap, (next_cost, next_edge))
+    return arrivals, parent
+
+def stitch_tour(town_map, points, cost='time'):
+    """
+    Join the legs of a tour into one turn-aware route. Each leg continues
+    from the states the previous one can arrive in, so the turn at every
+    stop is one the map allows, and the route through all stops is the
+    cheapest for this order (up to the arrival window of each leg).
+    :param points: Intersection IDs in visiting order, start first
+    :return: (path list, cost), or (None, inf) if some leg cannot be driven
+    """
+    graph = town_map.compile()
+    costs = graph.edge_costs(cost)
+    if len(points) == 1:
+        return [points[0]], 0.0
+    start_index = graph.node_index[points[0]]
+    legs = []
+    seeds = None
+    for point in points[1:]:
+        seeds, parent = _stitch_leg(graph, costs, seeds, graph.node_index[point], start_index)
+        if not seeds:
+            return None, float('inf')
+        legs.append(parent)
+
+    # Walk back from the cheapest final arrival, leg by leg
+    edge = min(seeds, key=seeds.get)
+    total = seeds[edge]
+    edges = []
+    for parent in reversed(legs):
+        while edge in parent:
+            edges.append(edge)
+            edge = parent[edge]
+            if edge == -1:
+                break
+    edges.reverse()
+    return graph.edge_path_to_nodes(start_index, edges), total
+
+def plan_tour(town_map, start, stops, end=None, cost='time', time_limit=0.5, hierarchy=None):
+    """
+    Plan a route from start through every stop, in the order that costs least
+    :param town_map: TownMap or CompiledMap object
+    :param start: Start intersection
+    :param stops: Intersections to visit, in any order
+    :param end: Intersection to finish at (start for a round trip), or None to end at the last stop
+    :param cost: 'hops', 'distance' or 'time'
+    :param time_limit: Seconds the ordering local search may run
+    :param hierarchy: Optional ContractionHierarchy for the cost matrix (see cost_matrix)
+    :return: Dict with 'order' (stops in visiting order), 'path' (list of intersections),
+             'legs' (paths between consecutive points) and 'cost'; None if a stop cannot be reached
+    """
+    stops = [stop for stop in dict.fromkeys(stops) if stop != start and stop != end]
+    points = [start] + stops + ([end] if end is not None else [])
+    matrix = cost_matrix(town_map, points, cost, hierarchy)
+    visit = [points[index] for index in order_stops(matrix, end is not None, time_limit)]
+    path, total = stitch_tour(town_map, visit, cost)
+    if path is None:
+        return None
+
+    # Each leg ends where the route first reaches its stop after the previous one
+    legs = []
+    position = 0
+    for point in visit[1:]:
+        arrival = path.index(point, position + 1)
+        legs.append(path[position:arrival + 1])
+        position = arrival
+    return {'order': visit[1:len(visit) - (end is not None)], 'path': path, 'legs': legs, 'cost': total}
+
+# Example usage
+if __name__ == "__main__":
+    from town_map import TownMap
+    town = TownMap('complex_town_map.json')
+    tour = plan_tour(town, '0', ['44', '17', '22', '5', '28', '33'], end='0')
+    print(f"Visit order: {tour['order']}")
+    print(f"Route ({tour['cost']:.1f} min): {tour['path']}")
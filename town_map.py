@@ -1,17 +1,47 @@
 import json
+import numbers
+import sys
+from traffic_profiles import SpeedProfiles, minutes_of_day
+
+def travel_time(distance, speed_limit):
+    """Convert a map distance at a given speed limit (km/h) to minutes"""
+    distance_km = distance * 0.1  # assuming 1 unit = 100m
+    return distance_km / speed_limit * 60
 
 class TownMap:
-    def __init__(self, map_file):
+    def __init__(self, map_file, streaming=False):
+        """
+        :param map_file: Path to a map JSON file
+        :param streaming: Parse the file incrementally instead of loading the whole
+                          document, for city-scale maps; the result is identical
+        """
         self.intersections = {}
         self.roads = []
         self.road_types = {}
         self.traffic_restrictions = {}
         self.landmarks = {}
         self.metadata = {}
-        self._load_map(map_file)
+        # Optional per-road-class speed profiles from the map file, and the resolved profiles
+        self.speed_profiles = {}
+        self.profiles = None
+        # Bumped on every change to roads or restrictions, so derived data can tell it is stale
+        self.version = 0
+        self._compiled = None
+        self._spatial_index = None
+        self._connectivity = None
+        self._directed_roads = set()
+        self._banned_turns = set()
+        self._only_straight = {}
+        self._blocked_roads = set()
+        self._load_map(map_file, streaming)
+        self.profiles = SpeedProfiles(self.speed_profiles)
 
-    def _load_map(self, map_file):
+    def _load_map(self, map_file, streaming=False):
         """Load map data from JSON file"""
+        if streaming:
+            self._stream_map(map_file)
+            return
+
         with open(map_file, 'r', encoding='utf-8') as f:
             map_data = json.load(f)
 
@@ -20,27 +50,76 @@ class TownMap:
 
         # Load intersections
         for id, data in map_data['intersections'].items():
-            self.intersections[id] = {
-                'position': (data['x'], data['y']),
-                'turns': data.get('turns', {}),
-                'neighbors': [],
-                'type': data.get('type', 'intersection'),
-                'traffic_light': data.get('traffic_light', False)
-            }
-
-            # Build neighbors list from turns
-            for direction, neighbor in data.get('turns', {}).items():
-                if neighbor not in self.intersections[id]['neighbors']:
-                    self.intersections[id]['neighbors'].append(neighbor)
+            self._add_intersection(id, data)
 
         # Build roads list and load road types
         self.road_types = map_data.get('road_types', {})
+        self._build_roads()
+
+        # Load traffic restrictions
+        self.traffic_restrictions = map_data.get('traffic_restrictions', {})
+        self._build_turn_rules()
+
+        # Load landmarks
+        self.landmarks = map_data.get('landmarks', {})
+
+        # Load time-of-day speed profiles
+        self.speed_profiles = map_data.get('speed_profiles', {})
+
+    def _stream_map(self, map_file):
+        """Load map data one JSON entry at a time, without materializing the whole document"""
+        from map_stream import iter_map_sections
+
+        sections = {
+            'metadata': self.metadata,
+            'road_types': self.road_types,
+            'traffic_restrictions': self.traffic_restrictions,
+            'landmarks': self.landmarks,
+            'speed_profiles': self.speed_profiles,
+        }
+        for section, key, value in iter_map_sections(map_file):
+            if section == 'intersections':
+                # Each entry is decoded on its own, so direction keys are not shared like json.load shares them
+                value['turns'] = {sys.intern(direction): neighbor
+                                  for direction, neighbor in value.get('turns', {}).items()}
+                self._add_intersection(key, value)
+            elif section in sections and key is not None:
+                sections[section][key] = value
+
+        # Roads need every intersection and the file's road types, which may come in any order
+        self._build_roads()
+        self._build_turn_rules()
+
+    def _add_intersection(self, id, data):
+        """Add one entry of the intersections section"""
+        id = sys.intern(id)
+        turns = data.get('turns', {})
+        self.intersections[id] = {
+            'position': (data['x'], data['y']),
+            'turns': turns,
+            'neighbors': [],
+            'type': data.get('type', 'intersection'),
+            'traffic_light': data.get('traffic_light', False)
+        }
+
+        # Build neighbors list from turns
+        for direction, neighbor in turns.items():
+            # Share one string per ID across every road that references it
+            neighbor = turns[direction] = sys.intern(neighbor)
+            if (id, neighbor) not in self._directed_roads:
+                self._directed_roads.add((id, neighbor))
+                self.intersections[id]['neighbors'].append(neighbor)
+
+    def _build_roads(self):
+        """Build roads list from the loaded intersections, adding default road types"""
+        seen_roads = set()
         for id, data in self.intersections.items():
             for neighbor in data['neighbors']:
                 # Ensure we don't duplicate roads (only add each road once)
                 road_key = f"{id}-{neighbor}"
                 reverse_key = f"{neighbor}-{id}"
-                if (neighbor, id) not in self.roads:
+                if (neighbor, id) not in seen_roads:
+                    seen_roads.add((id, neighbor))
                     self.roads.append((id, neighbor))
                     # Add default road type if not specified
                     if road_key not in self.road_types and reverse_key not in self.road_types:
@@ -51,12 +130,160 @@ class TownMap:
                             'one_way': False
                         }
 
-        # Load traffic restrictions
-        self.traffic_restrictions = map_data.get('traffic_restrictions', {})
+    def _build_turn_rules(self):
+        """
+        Precompute lookup tables for traffic_restrictions. Turn keys have the
+        form "from-through-to" and road keys "from-to":
+        - no_left_turn / no_right_turn / no_u_turn ban that exact turn
+        - only_straight makes "to" the only way on after driving from -> through
+        - blocked_roads closes the road in both directions
+        """
+        self._banned_turns = set()
+        for kind in ('no_left_turn', 'no_right_turn', 'no_u_turn'):
+            for turn_key in self.traffic_restrictions.get(kind, []):
+                self._banned_turns.add(tuple(turn_key.split('-')))
+
+        self._only_straight = {}
+        for turn_key in self.traffic_restrictions.get('only_straight', []):
+            from_intersection, through_intersection, to_intersection = turn_key.split('-')
+            self._only_straight[(from_intersection, through_intersection)] = to_intersection
+
+        self._blocked_roads = set()
+        for road_key in self.traffic_restrictions.get('blocked_roads', []):
+            from_intersection, to_intersection = road_key.split('-')
+            self._blocked_roads.add((from_intersection, to_intersection))
+            self._blocked_roads.add((to_intersection, from_intersection))
+
+    def _changed(self):
+        """Record a change to roads or restrictions"""
+        self.version += 1
+        self._compiled = None
+        self._build_turn_rules()
+
+    def block_road(self, from_intersection, to_intersection):
+        """Close a road in both directions"""
+        self.update_traffic(closed=[f"{from_intersection}-{to_intersection}"])
+
+    def unblock_road(self, from_intersection, to_intersection):
+        """Reopen a road closed by block_road or blocked_roads"""
+        self.update_traffic(reopened=[f"{from_intersection}-{to_intersection}"])
+
+    def update_traffic(self, speed_limits=None, closed=None, reopened=None):
+        """
+        Apply a batch of live traffic updates without reloading the map. The
+        compiled map, if any, is patched in place rather than rebuilt.
+        :param speed_limits: Dict of road key ("from-to", as in road_types) -> new speed limit
+        :param closed: Road keys to add to blocked_roads
+        :param reopened: Road keys to remove from blocked_roads
+        :raises ValueError: If a road is unknown or a speed limit is not a positive number;
+                            nothing is changed in that case
+        :return: TrafficChanges from the compiled map, or None if the map was not compiled yet
+        """
+        # Check the whole batch before changing anything
+        speed_limits = speed_limits or {}
+        for road_key, speed_limit in speed_limits.items():
+            self._split_road_key(road_key)
+            if (isinstance(speed_limit, bool) or not isinstance(speed_limit, numbers.Real) or
+                    not 0 < speed_limit < float('inf')):
+                raise ValueError(f"Speed limit for {road_key} must be a positive number, got {speed_limit!r}")
+        closed, reopened = list(closed or []), list(reopened or [])
+        for road_key in closed + reopened:
+            self._split_road_key(road_key)
+
+        roads = []
+        for road_key, speed_limit in speed_limits.items():
+            from_intersection, to_intersection = self._split_road_key(road_key)
+            road_type = self.get_road_type(from_intersection, to_intersection)
+            if road_type['speed_limit'] != speed_limit:
+                if road_key not in self.road_types and f"{to_intersection}-{from_intersection}" not in self.road_types:
+                    self.road_types[road_key] = road_type
+                road_type['speed_limit'] = speed_limit
+                roads.append((from_intersection, to_intersection))
+        speed_changes = len(roads)
+
+        for road_key in closed:
+            from_intersection, to_intersection = self._split_road_key(road_key)
+            if not self.is_road_blocked(from_intersection, to_intersection):
+                self.traffic_restrictions.setdefault('blocked_roads', []).append(road_key)
+                self._blocked_roads.add((from_intersection, to_intersection))
+                self._blocked_roads.add((to_intersection, from_intersection))
+                roads.append((from_intersection, to_intersection))
+        for road_key in reopened:
+            from_intersection, to_intersection = self._split_road_key(road_key)
+            if self.is_road_blocked(from_intersection, to_intersection):
+                self.traffic_restrictions['blocked_roads'] = [
+                    blocked_key for blocked_key in self.traffic_restrictions['blocked_roads']
+                    if set(blocked_key.split('-')) != {from_intersection, to_intersection}]
+                self._blocked_roads.discard((from_intersection, to_intersection))
+                self._blocked_roads.discard((to_intersection, from_intersection))
+                roads.append((from_intersection, to_intersection))
+
+        if not roads:
+            return None
+        # Speed changes alone cannot change which routes exist
+        if (len(roads) == speed_changes and self._connectivity is not None and
+                self._connectivity.version == self.version):
+            self._connectivity.version = self.version + 1
+        self.version += 1
+        if self._compiled is None:
+            return None
+        return self._compiled.update_roads(self, roads)
+
+    def _split_road_key(self, road_key):
+        """Split "from-to" into intersection IDs, checking that the road exists"""
+        from_intersection, to_intersection = road_key.split('-')
+        if ((from_intersection, to_intersection) not in self._directed_roads and
+                (to_intersection, from_intersection) not in self._directed_roads):
+            raise ValueError(f"Unknown road: {road_key}")
+        return from_intersection, to_intersection
+
+    def add_turn_restriction(self, kind, from_intersection, through_intersection, to_intersection):
+        """
+        Add a turn restriction
+        :param kind: 'no_left_turn', 'no_right_turn', 'no_u_turn' or 'only_straight'
+        """
+        if kind not in ('no_left_turn', 'no_right_turn', 'no_u_turn', 'only_straight'):
+            raise ValueError(f"Unknown turn restriction: {kind}")
+        turn_key = f"{from_intersection}-{through_intersection}-{to_intersection}"
+        restrictions = self.traffic_restrictions.setdefault(kind, [])
+        if turn_key not in restrictions:
+            restrictions.append(turn_key)
+            self._changed()
+
+    def compile(self):
+        """Get the integer-indexed CompiledMap used by the search functions (rebuilt after changes)"""
+        if self._compiled is None:
+            from compiled_map import CompiledMap
+            self._compiled = CompiledMap(self)
+        return self._compiled
+
+    def connectivity(self, rebuild=True):
+        """
+        Get the strongly connected component analysis of the turn-aware road graph (rebuilt after closures or restriction changes)
+        :param rebuild: Rebuild a missing or outdated analysis; if False, return None instead
+        """
+        if self._connectivity is None or self._connectivity.version != self.version:
+            if not rebuild:
+                return None
+            from connectivity import Connectivity
+            self._connectivity = Connectivity(self)
+        return self._connectivity
+
+    def validate(self):
+        """
+        Check that every intersection can be reached from, and can get back to,
+        the main part of the road network under one-way roads, closures and turn rules
+        :return: Connectivity report (see Connectivity.report)
+        """
+        return self.connectivity().report()
+
+    def spatial_index(self):
+        """Get the grid index for nearest-intersection, radius and road snapping queries (built once)"""
+        if self._spatial_index is None:
+            from spatial_index import SpatialIndex
+            self._spatial_index = SpatialIndex(self)
+        return self._spatial_index
 
-        # Load landmarks
-        self.landmarks = map_data.get('landmarks', {})
-                    
     def get_neighbors(self, intersection):
         """Get neighbors of a specified intersection"""
         return self.intersections[intersection]['neighbors']
@@ -73,26 +300,24 @@ class TownMap:
         """Get the coordinates of an intersection"""
         return self.intersections[intersection]['position']
     
+    def is_road_blocked(self, from_intersection, to_intersection):
+        """Check if a road is closed by blocked_roads"""
+        return (from_intersection, to_intersection) in self._blocked_roads
+
     def is_turn_allowed(self, from_intersection, through_intersection, to_intersection):
         """Check if a turn is allowed at a specified intersection"""
-        # Check if the turn is allowed based on the turns definition
-        if through_intersection in self.intersections:
-            turns = self.intersections[through_intersection]['turns']
-            # Check if there's a direct turn from from_intersection to to_intersection
-            for direction, neighbor in turns.items():
-                if neighbor == to_intersection:
-                    # Check if from_intersection is a valid incoming road for this turn
-                    if from_intersection in self.intersections[through_intersection]['neighbors']:
-                        # Check traffic restrictions
-                        turn_key = f"{from_intersection}-{through_intersection}-{to_intersection}"
-                        if turn_key in self.traffic_restrictions.get('no_left_turn', []):
-                            return False
-                        if turn_key in self.traffic_restrictions.get('no_right_turn', []):
-                            return False
-                        if turn_key in self.traffic_restrictions.get('no_u_turn', []):
-                            return False
-                        return True
-        return False
+        # Both roads must exist and be open
+        incoming = (from_intersection, through_intersection)
+        outgoing = (through_intersection, to_intersection)
+        if incoming not in self._directed_roads or outgoing not in self._directed_roads:
+            return False
+        if incoming in self._blocked_roads or outgoing in self._blocked_roads:
+            return False
+        # Check traffic restrictions
+        if (from_intersection, through_intersection, to_intersection) in self._banned_turns:
+            return False
+        only_to = self._only_straight.get(incoming)
+        return only_to is None or only_to == to_intersection
 
     def get_road_type(self, from_intersection, to_intersection):
         """Get road type information for a road"""
@@ -138,19 +363,46 @@ class TownMap:
             total_distance += self.get_road_distance(path[i], path[i+1])
         return total_distance
 
-    def get_path_time(self, path):
-        """Calculate estimated travel time for a path (in minutes)"""
+    def get_road_time(self, from_intersection, to_intersection, depart_at=None):
+        """
+        Calculate travel time (in minutes) for a single road
+        :param depart_at: Optional time the road is entered (minutes after midnight or "HH:MM");
+                          if given, the speed follows the road class's time-of-day profile,
+                          otherwise the road runs at its speed limit
+        """
+        distance = self.get_road_distance(from_intersection, to_intersection)
+        road_type = self.get_road_type(from_intersection, to_intersection)
+        if depart_at is None:
+            return travel_time(distance, road_type['speed_limit'])
+        depart_at = minutes_of_day(depart_at)
+        road_class = self.profiles.class_of(road_type.get('type', 'local_road'))
+        return self.profiles.traverse(road_class, distance, road_type['speed_limit'], depart_at) - depart_at
+
+    def get_max_speed(self):
+        """Get the highest speed limit (km/h) of any road on the map"""
+        speeds = [road_type['speed_limit'] for road_type in self.road_types.values()]
+        return max(speeds) if speeds else 30
+
+    def get_path_time(self, path, depart_at=None):
+        """
+        Calculate estimated travel time for a path (in minutes)
+        :param depart_at: Optional departure time (minutes after midnight or "HH:MM"); if
+                          given, roads follow their time-of-day speed profiles and every
+                          traffic light passed through adds the expected wait
+        """
         if not path or len(path) < 2:
             return 0
+        if depart_at is not None:
+            depart_at = minutes_of_day(depart_at)
+            now = depart_at
+            for i in range(len(path) - 1):
+                if i > 0 and self.has_traffic_light(path[i]):
+                    now += self.profiles.signal_wait
+                now += self.get_road_time(path[i], path[i+1], now)
+            return now - depart_at
         total_time = 0
         for i in range(len(path) - 1):
-            distance = self.get_road_distance(path[i], path[i+1])
-            road_type = self.get_road_type(path[i], path[i+1])
-            speed_limit = road_type['speed_limit']  # km/h
-            # Convert distance to km and calculate time
-            distance_km = distance * 0.1  # assuming 1 unit = 100m
-            time_hours = distance_km / speed_limit
-            total_time += time_hours * 60  # convert to minutes
+            total_time += self.get_road_time(path[i], path[i+1])
         return total_time
 
 # Example usage
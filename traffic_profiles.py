@@ -0,0 +1,114 @@
+import bisect
+from array import array
+
+MINUTES_PER_DAY = 24 * 60
+
+# Expected wait (minutes) when driving through an intersection with a traffic light
+SIGNAL_WAIT = 0.5
+
+# Speed as a fraction of the speed limit over the day, as (hour, factor)
+# breakpoints with linear interpolation in between. Maps can override these
+# or add classes in an optional "speed_profiles" section of the same form.
+DEFAULT_PROFILES = {
+    'highway': [(0, 1.0), (6, 0.95), (8, 0.5), (10, 0.85), (16, 0.85), (18, 0.45), (20, 0.9), (24, 1.0)],
+    'main_road': [(0, 1.0), (6, 0.9), (8, 0.55), (10, 0.8), (16, 0.8), (18, 0.5), (20, 0.85), (24, 1.0)],
+    'secondary_road': [(0, 1.0), (6, 0.9), (8, 0.65), (10, 0.85), (16, 0.85), (18, 0.6), (20, 0.9), (24, 1.0)],
+    'local_road': [(0, 1.0), (7, 0.9), (8, 0.8), (10, 0.9), (17, 0.85), (18, 0.8), (20, 0.95), (24, 1.0)],
+}
+
+# Profile used for road types that have none of their own
+DEFAULT_CLASS = 'local_road'
+
+def minutes_of_day(depart_at):
+    """Convert a departure time given as minutes after midnight or "HH:MM" to minutes"""
+    if isinstance(depart_at, str):
+        hours, minutes = depart_at.split(':')
+        return int(hours) * 60 + int(minutes)
+    return float(depart_at)
+
+class SpeedProfiles:
+    """
+    Time-of-day speed profiles, one per road class.
+
+    Each class is two small arrays of breakpoints (minute of day, speed
+    factor), so memory does not grow with the map: roads only store the index
+    of their class. Travel times integrate the speed along the road as the
+    factor changes, so a later departure never arrives earlier (FIFO), which
+    is what makes time-dependent Dijkstra exact.
+    """
+
+    def __init__(self, profiles=None, signal_wait=SIGNAL_WAIT):
+        """
+        :param profiles: Optional dict of road class -> [(hour, factor), ...] overriding DEFAULT_PROFILES
+        :param signal_wait: Expected wait in minutes at each traffic light passed through
+        """
+        self.signal_wait = signal_wait
+        self.points = {}
+        self.classes = []
+        self.class_index = {}
+        self._minutes = []
+        self._factors = []
+        for name, points in {**DEFAULT_PROFILES, **(profiles or {})}.items():
+            self.add(name, points)
+
+    def add(self, name, points):
+        """Add or replace the profile of a road class"""
+        points = [(float(hour), float(factor)) for hour, factor in points]
+        hours = [hour for hour, _ in points]
+        if hours[0] != 0 or hours[-1] != 24 or any(b <= a for a, b in zip(hours, hours[1:])):
+            raise ValueError(f"Speed profile {name} must have increasing hours from 0 to 24")
+        if any(factor <= 0 for _, factor in points):
+            raise ValueError(f"Speed profile {name} must have positive factors")
+        if name not in self.class_index:
+            self.class_index[name] = len(self.classes)
+            self.classes.append(name)
+            self._minutes.append(None)
+            self._factors.append(None)
+        index = self.class_index[name]
+        self.points[name] = points
+        self._minutes[index] = array('d', (hour * 60 for hour in hours))
+        self._factors[index] = array('d', (factor for _, factor in points))
+
+    def class_of(self, road_type):
+        """
+        Get the class index for a road type name. Types without a profile get
+        their own class with the DEFAULT_CLASS profile, so a class index always
+        identifies the road type.
+        """
+        if road_type not in self.class_index:
+            self.add(road_type, self.points[DEFAULT_CLASS])
+        return self.class_index[road_type]
+
+    def factor(self, road_class, minute):
+        """Get the speed factor of a road class at a time (minutes, any day)"""
+        minutes, factors = self._minutes[road_class], self._factors[road_class]
+        minute %= MINUTES_PER_DAY
+        i = min(bisect.bisect_right(minutes, minute), len(minutes) - 1) - 1
+        return factors[i] + (factors[i + 1] - factors[i]) * (minute - minutes[i]) / (minutes[i + 1] - minutes[i])
+
+    def traverse(self, road_class, distance, speed_limit, depart):
+        """
+        Get the arrival time on a road entered at a given time
+        :param road_class: Class index
+        :param distance: Road length in map units
+        :param speed_limit: Speed limit in km/h
+        :param depart: Time the road is entered, in minutes
+        :return: Arrival time in minutes
+        """
+        minutes, factors = self._minutes[road_class], self._factors[road_class]
+        remaining = distance * 0.1 / (speed_limit / 60)  # minutes needed at the full speed limit
+        now = depart
+        while True:
+            day_start = now - now % MINUTES_PER_DAY
+            minute = now - day_start
+            i = min(bisect.bisect_right(minutes, minute), len(minutes) - 1) - 1
+            slope = (factors[i + 1] - factors[i]) / (minutes[i + 1] - minutes[i])
+            factor = factors[i] + slope * (minute - minutes[i])
+            span = minutes[i + 1] - minute
+            # Distance covered until the next breakpoint, in full-speed minutes
+            covered = factor * span + slope * span * span / 2
+            if covered >= remaining:
+                # Solve factor * x + slope / 2 * x^2 = remaining for the time x spent in this piece
+                return now + 2 * remaining / (factor + max(0.0, factor * factor + 2 * slope * remaining) ** 0.5)
+            remaining -= covered
+            now = day_start + minutes[i + 1]
@@ -40,17 +40,7 @@ class InteractiveMapVisualizer:
         
     def find_nearest_intersection(self, x, y):
         """Find the nearest intersection to the click position"""
-        min_dist = float('inf')
-        nearest_point = None
-        
-        for intersection_id in self.nav_system.town_map.get_all_intersections():
-            pos = self.nav_system.town_map.get_position(intersection_id)
-            dist = (pos[0] - x) ** 2 + (pos[1] - y) ** 2
-            if dist < min_dist:
-                min_dist = dist
-                nearest_point = intersection_id
-                
-        return nearest_point
+        return self.nav_system.town_map.spatial_index().nearest(x, y)
     
     def on_click(self, event):
         """Handle mouse click events"""
@@ -0,0 +1,80 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathfinding import ShortestPathTree, find_path, astar_shortest_path_with_turns
+
+# Route queries sent to a worker per task; amortizes inter-process overhead
+BATCH_CHUNK = 64
+
+# The compiled map (and preprocessed engines) each worker routes on. They are inherited
+# through fork where available, otherwise sent once per worker at start-up, never once
+# per task.
+_graph = None
+_engines = {}
+
+def _init_worker(graph, engines):
+    global _graph, _engines
+    _graph = graph
+    _engines = engines
+
+def open_pool(town_map, workers, engines=None):
+    """
+    Start a process pool whose workers share the map's CompiledMap
+    :param town_map: TownMap or CompiledMap object
+    :param workers: Number of worker processes
+    :param engines: Optional preprocessed engines for the workers to query, as taken by route()
+    :return: ProcessPoolExecutor
+    """
+    graph = town_map.compile()
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                               initializer=_init_worker, initargs=(graph, engines or {}))
+
+def route(town_map, start, goal, cost, engines=None, bidirectional=False, stats=None):
+    """
+    Route one pair with the fastest engine there is for the cost mode: a
+    Contraction Hierarchy, then an overlay, then A* with landmarks, else the
+    default search. NavigationSystem and the pool workers both route here,
+    so they pick the same engine and return the same paths.
+    :param town_map: TownMap or CompiledMap object
+    :param engines: Optional dict with 'hierarchy', 'overlay' and 'landmarks' for this cost
+                    mode, each only if it matches the map's current version
+    :param bidirectional: Use the bidirectional default search (and no landmarks)
+    :param stats: Optional dict, receives the engine's counters
+    :return: Path list, or None if unreachable
+    """
+    engines = engines or {}
+    hierarchy = engines.get('hierarchy')
+    if hierarchy is not None:
+        return hierarchy.query(start, goal, stats)
+    overlay = engines.get('overlay')
+    if overlay is not None:
+        return overlay.query(start, goal, stats)
+    table = engines.get('landmarks')
+    if table is not None and not bidirectional:
+        return astar_shortest_path_with_turns(town_map, start, goal, cost, stats, table)
+    # BFS for hops, A* for weighted costs, both over the turn-aware state space
+    return find_path(town_map, start, goal, cost, bidirectional, stats=stats)
+
+def _route_task(pairs, cost):
+    routes = []
+    for start, goal in pairs:
+        path = route(_graph, start, goal, cost, _engines)
+        routes.append((start, goal, tuple(path) if path is not None else None))
+    return routes
+
+def distance_row(graph, source, targets, cost, return_paths):
+    """
+    Costs (and optionally paths) from one source to every target
+    :return: (list of costs, list of path tuples or None)
+    """
+    tree = ShortestPathTree(graph, source, cost, targets)
+    row = [tree.cost_to(target) for target in targets]
+    paths = None
+    if return_paths:
+        paths = [tuple(path) if path is not None else None
+                 for path in (tree.path_to(target) for target in targets)]
+    return row, paths
+
+def _distance_row_task(source, targets, cost, return_paths):
+    return distance_row(_graph, source, targets, cost, return_paths)